@@ -0,0 +1,91 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+from metrics import CACHE_LOOKUPS
+from sqlite_store import SQLiteLRUCache
+
+logger = logging.getLogger(__name__)
+
+class AnswerCache:
+    """
+    On-disk cache of generated answers shared by all worker processes on the host
+    
+    Keys combine the document's content key (content hash plus chunker and
+    embedding settings), the normalized question, the retrieval top_k and
+    settings, the answer model and the prompt version, so a changed document,
+    retrieval setting, model or prompt never serves a stale answer.
+    Entries expire after a TTL and the least recently used ones are evicted
+    once the stored answers exceed the byte budget.
+    """
+    
+    def __init__(self, db_path: Optional[str] = None, max_bytes: Optional[int] = None, ttl_seconds: Optional[int] = None):
+        """
+        Initialize the cache database
+        
+        Args:
+            db_path: SQLite file holding the cache
+            max_bytes: Budget for stored answer bytes before LRU eviction
+            ttl_seconds: Age after which entries expire (0 disables expiry)
+        """
+        cache_dir = os.getenv("CACHE_DIR", ".cache")
+        self.db_path = db_path or os.getenv("ANSWER_CACHE_PATH", os.path.join(cache_dir, "answers.db"))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+        
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+        self._table = SQLiteLRUCache(self.db_path, "answers", "answer", "TEXT", self.max_bytes, self.ttl_seconds)
+        logger.info(f"Answer cache initialized at: {self.db_path}")
+    
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Case-fold, collapse whitespace and drop trailing punctuation"""
+        return re.sub(r"\s+", " ", question).strip().casefold().rstrip("?.! ")
+    
+    @classmethod
+    def make_key(
+        cls,
+        content_key: str,
+        question: str,
+        top_k: int,
+        model: str,
+        prompt_version: str,
+        retrieval_settings: str = ""
+    ) -> str:
+        """Cache key covering the document content, question and everything that shapes the answer"""
+        key_source = (
+            f"{content_key}\x00{cls.normalize_question(question)}\x00{top_k}\x00{model}\x00{prompt_version}"
+            f"\x00{retrieval_settings}"
+        )
+        return hashlib.sha256(key_source.encode()).hexdigest()
+    
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """Return cached answers for the given keys, keyed by cache key"""
+        found = self._table.get_many(keys)
+        hits = sum(1 for key in keys if key in found)
+        with self._stats_lock:
+            self._stats["hits"] += hits
+            self._stats["misses"] += len(keys) - hits
+        CACHE_LOOKUPS.inc(hits, cache="answer", result="hit")
+        CACHE_LOOKUPS.inc(len(keys) - hits, cache="answer", result="miss")
+        return found
+    
+    def put(self, key: str, answer: str):
+        """Store one answer"""
+        self._table.put_many([(key, len(answer.encode()), answer)])
+    
+    def stats(self) -> Dict[str, int]:
+        """Hit and miss counters since startup"""
+        with self._stats_lock:
+            return dict(self._stats)
+    
+    def clear(self):
+        """Drop every cached answer"""
+        self._table.clear()
+    
+    def close(self):
+        """Close the database connection"""
+        self._table.close()
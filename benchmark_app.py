@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark for the HackRx API
+Runs the real app in-process against local Gemini and Pinecone stand-ins and a
+generated PDF/DOCX corpus, and reports per-stage and end-to-end latency,
+throughput and peak RSS for several concurrency levels
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import tempfile
+import threading
+import resource
+from typing import Any, Callable, Dict, List, Optional
+import httpx
+import fake_services
+
+# Stages of main.answer_questions timed by wrapping their helpers
+STAGES = ["ingest_document", "lookup_cached_answers", "retrieve_contexts", "answer_group"]
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 and mean of durations in seconds, in milliseconds"""
+    if not values:
+        return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    ordered = sorted(values)
+    
+    def at(quantile: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))] * 1000
+    
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": at(0.50),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99)
+    }
+
+class StageTimer:
+    """Records the duration of every call to main's stage helpers"""
+    
+    def __init__(self, app_module: Any):
+        self.samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        for stage in STAGES:
+            setattr(app_module, stage, self._wrap(stage, getattr(app_module, stage)))
+    
+    def _wrap(self, stage: str, func: Callable) -> Callable:
+        async def timed(*args: Any, **kwargs: Any) -> Any:
+            start_time = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start_time)
+        return timed
+    
+    def reset(self):
+        for samples in self.samples.values():
+            samples.clear()
+    
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {stage: percentiles(samples) for stage, samples in self.samples.items()}
+
+class RssSampler:
+    """Samples the resident set size of this process (server and load generator) on a background thread"""
+    
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+    
+    @staticmethod
+    def current_bytes() -> int:
+        try:
+            with open("/proc/self/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        # ru_maxrss is the lifetime peak in KiB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_bytes = max(self.peak_bytes, self.current_bytes())
+    
+    def start(self):
+        self.peak_bytes = self.current_bytes()
+        self._thread.start()
+    
+    def reset(self):
+        self.peak_bytes = self.current_bytes()
+    
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class LocalApp:
+    """
+    The real app served in-process against the fake services
+    
+    uvicorn runs on a background thread with its own event loop, next to a
+    static server for the generated corpus; caches live in a fresh temporary
+    directory so every run starts cold.
+    """
+    
+    def __init__(self, latency_scale: float = 1.0, error_rate: float = 0.0, seed: int = 7, vector_store: str = "pinecone"):
+        self.settings = fake_services.FakeServiceSettings(latency_scale=latency_scale, error_rate=error_rate, seed=seed)
+        self.vector_store = vector_store
+        self.app_module: Any = None
+        self.base_url = ""
+        self.corpus_dir = ""
+        self.corpus_url = ""
+        self._server: Any = None
+        self._thread: Optional[threading.Thread] = None
+        self._file_server: Any = None
+    
+    def start(self, timeout: float = 60.0):
+        """Install the fakes, start the app and corpus servers and wait until /health reports ready"""
+        import uvicorn
+        work_dir = tempfile.mkdtemp(prefix="hackrx-local-")
+        os.environ["CACHE_DIR"] = os.path.join(work_dir, "cache")
+        os.environ.setdefault("ANSWER_CACHE", "off")
+        os.environ["VECTOR_STORE"] = self.vector_store
+        fake_services.install(self.settings)
+        
+        import main as app_module
+        self.app_module = app_module
+        logging.getLogger().setLevel(logging.WARNING)
+        self.corpus_dir = os.path.join(work_dir, "corpus")
+        os.makedirs(self.corpus_dir)
+        self._file_server, self.corpus_url = fake_services.serve_directory(self.corpus_dir)
+        
+        port = free_port()
+        self._server = uvicorn.Server(uvicorn.Config(app_module.app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+        self._thread = threading.Thread(target=self._server.run, name="uvicorn", daemon=True)
+        self._thread.start()
+        self.base_url = f"http://127.0.0.1:{port}"
+        
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(f"{self.base_url}/health").status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.1)
+        self.stop()
+        raise Exception(f"App did not become healthy within {timeout:.0f} seconds")
+    
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join()
+            self._file_server.shutdown()
+            self._server = None
+
+async def run_level(
+    client: httpx.AsyncClient,
+    base_url: str,
+    token: str,
+    corpus: List[Dict[str, Any]],
+    concurrency: int,
+    request_count: int,
+    question_count: int
+) -> Dict[str, Any]:
+    """Closed loop: each of concurrency workers sends its next request as soon as the last one returns"""
+    latencies: List[float] = []
+    errors = 0
+    answer_errors = 0
+    next_request = 0
+    
+    async def worker():
+        nonlocal next_request, errors, answer_errors
+        while next_request < request_count:
+            document = corpus[next_request % len(corpus)]
+            next_request += 1
+            payload = {"documents": document["url"], "questions": fake_services.questions_for(document["topics"], question_count)}
+            start_time = time.perf_counter()
+            try:
+                response = await client.post(
+                    f"{base_url}/hackrx/run", json=payload, headers={"Authorization": f"Bearer {token}"}
+                )
+                if response.status_code != 200:
+                    errors += 1
+                    continue
+                answer_errors += sum(answer.startswith("Error processing question") for answer in response.json()["answers"])
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start_time)
+    
+    start_time = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start_time
+    return {
+        "concurrency": concurrency,
+        "requests": request_count,
+        "errors": errors,
+        "answer_errors": answer_errors,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed,
+        "questions_per_second": len(latencies) * question_count / elapsed,
+        "end_to_end": percentiles(latencies)
+    }
+
+async def run(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Generate the corpus, start the app against the fakes and run every concurrency level"""
+    local_app = LocalApp(options["latency_scale"], options["error_rate"], options["seed"], options["vector_store"])
+    await asyncio.to_thread(local_app.start)
+    app_module = local_app.app_module
+    base_url = local_app.base_url
+    timer = StageTimer(app_module)
+    sampler = RssSampler()
+    sampler.start()
+    
+    levels = []
+    try:
+        limits = httpx.Limits(max_connections=max(options["concurrency"]) + 4)
+        async with httpx.AsyncClient(timeout=600.0, limits=limits) as client:
+            print(f"🚀 App ready at {base_url}, corpus at {local_app.corpus_url}\n")
+            for level_number, concurrency in enumerate(options["concurrency"]):
+                # Fresh documents per level, so every level pays for cold ingestion
+                corpus = fake_services.generate_corpus(
+                    local_app.corpus_dir, options["documents"], options["pages"], prefix=f"c{concurrency}-", seed=level_number * 1000
+                )
+                for document in corpus:
+                    document["url"] = f"{local_app.corpus_url}/{document['name']}"
+                timer.reset()
+                sampler.reset()
+                local_app.settings.reset_counters()
+                
+                level = await run_level(
+                    client, base_url, app_module.EXPECTED_TOKEN, corpus, concurrency, options["requests"], options["questions"]
+                )
+                level["stages"] = timer.summary()
+                level["peak_rss_mib"] = sampler.peak_bytes / 1024 / 1024
+                level["fake_services"] = local_app.settings.snapshot()
+                levels.append(level)
+                print_level(level)
+    finally:
+        sampler.stop()
+        local_app.stop()
+    
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {key: value for key, value in options.items() if key not in ("output", "compare")},
+        "levels": levels
+    }
+
+def print_level(level: Dict[str, Any]):
+    end_to_end = level["end_to_end"]
+    print(
+        f"📊 concurrency {level['concurrency']}: {level['throughput_rps']:.2f} req/s, "
+        f"{level['questions_per_second']:.1f} questions/s, {level['errors']} failed requests, "
+        f"{level['answer_errors']} failed answers, peak RSS {level['peak_rss_mib']:.0f} MiB"
+    )
+    print(f"  {'stage':<22} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in list(level["stages"].items()) + [("end_to_end", end_to_end)]:
+        print(f"  {name:<22} {stats['count']:>6} {stats['p50_ms']:9.1f} {stats['p95_ms']:9.1f} {stats['p99_ms']:9.1f}")
+    calls = level["fake_services"]
+    print(f"  fake calls {calls['calls']}, injected errors {calls['errors']}\n")
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Compare a run with a baseline run at matching concurrency levels
+    
+    Returns:
+        Descriptions of metrics that regressed by more than tolerance
+    """
+    regressions = []
+    baseline_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    print(f"🔁 Comparing with baseline from {baseline.get('timestamp', 'unknown time')} (tolerance {tolerance:.0%})")
+    for level in results["levels"]:
+        previous = baseline_levels.get(level["concurrency"])
+        if previous is None:
+            print(f"  ⚠️  concurrency {level['concurrency']} not in baseline")
+            continue
+        # (metric, current, baseline, True when higher is worse)
+        metrics = [
+            (f"end_to_end {key}", level["end_to_end"][key], previous["end_to_end"][key], True)
+            for key in ("p50_ms", "p95_ms", "p99_ms")
+        ] + [
+            ("throughput_rps", level["throughput_rps"], previous["throughput_rps"], False),
+            ("peak_rss_mib", level["peak_rss_mib"], previous["peak_rss_mib"], True)
+        ]
+        for name, current, reference, higher_is_worse in metrics:
+            change = (current - reference) / reference if reference else 0.0
+            regressed = change > tolerance if higher_is_worse else change < -tolerance
+            marker = "❌" if regressed else "✅"
+            print(f"  {marker} concurrency {level['concurrency']:<4} {name:<18} {reference:10.1f} -> {current:10.1f} ({change:+.1%})")
+            if regressed:
+                regressions.append(f"concurrency {level['concurrency']} {name} {change:+.1%}")
+    return regressions
+
+def option(args: List[str], name: str, default: Any, cast: Callable = str) -> Any:
+    """Value following --name in args, cast, or the default"""
+    if name not in args:
+        return default
+    return cast(args[args.index(name) + 1])
+
+def main():
+    """Main function to run the offline benchmark"""
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print("Usage:")
+        print("  python benchmark_app.py [options]")
+        print("    --concurrency 1,4,16     Concurrent clients per level (closed loop)")
+        print("    --requests 32            Requests per level")
+        print("    --documents 4            Generated documents per level, alternating PDF and DOCX")
+        print("    --pages 20               Pages per generated document")
+        print("    --questions 8            Questions per request")
+        print("    --latency-scale 1.0      Multiplier of the fake services' median latencies")
+        print("    --error-rate 0.0         Probability of a retryable 503 on any fake call")
+        print("    --seed 7                 Seed of the fake latency and error draws")
+        print("    --vector-store pinecone  Vector store backend: pinecone (fake) or local")
+        print("    --output results.json    Write the results as JSON")
+        print("    --compare baseline.json  Compare with an earlier run; exits 1 on regression")
+        print("    --tolerance 0.15         Relative change treated as a regression")
+        sys.exit(0)
+    
+    options = {
+        "concurrency": option(args, "--concurrency", [1, 4, 16], lambda value: [int(level) for level in value.split(",")]),
+        "requests": option(args, "--requests", 32, int),
+        "documents": option(args, "--documents", 4, int),
+        "pages": option(args, "--pages", 20, int),
+        "questions": option(args, "--questions", 8, int),
+        "latency_scale": option(args, "--latency-scale", 1.0, float),
+        "error_rate": option(args, "--error-rate", 0.0, float),
+        "seed": option(args, "--seed", 7, int),
+        "vector_store": option(args, "--vector-store", "pinecone"),
+        "output": option(args, "--output", None),
+        "compare": option(args, "--compare", None)
+    }
+    
+    results = asyncio.run(run(options))
+    if options["output"]:
+        with open(options["output"], "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written to {options['output']}")
+    
+    if options["compare"]:
+        with open(options["compare"], "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, option(args, "--tolerance", 0.15, float))
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✅ No regressions")
+
+if __name__ == "__main__":
+    main()
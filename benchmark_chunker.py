@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for TextChunker
+Compares time and peak memory of the offset-based chunker with the previous
+word-list implementation on synthetic or supplied text
+"""
+
+import re
+import sys
+import time
+import random
+import tracemalloc
+from typing import Callable, List, Tuple
+from text_chunker import TextChunker
+
+def legacy_chunk_text(text: str, chunk_size: int = 800, overlap_size: int = 150) -> List[str]:
+    """The previous chunker: four cleanup passes, a full word list and a join per chunk"""
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[^\w\s\.\,\;\:\!\?\-\(\)\[\]\{\}\'\"\/]', ' ', text)
+    text = re.sub(r'\.{3,}', '...', text)
+    text = re.sub(r'\-{2,}', '--', text)
+    cleaned_text = text.strip()
+    
+    words = cleaned_text.split()
+    if len(words) <= chunk_size:
+        return [cleaned_text]
+    
+    chunks = []
+    start_idx = 0
+    while start_idx < len(words):
+        end_idx = min(start_idx + chunk_size, len(words))
+        chunk_text = ' '.join(words[start_idx:end_idx])
+        if chunk_text.strip():
+            chunks.append(chunk_text)
+        if end_idx >= len(words):
+            break
+        start_idx += (chunk_size - overlap_size)
+    return chunks
+
+def generate_text(word_count: int) -> str:
+    """Policy-like filler text with punctuation, line breaks and stray symbols"""
+    random.seed(7)
+    vocabulary = [
+        "policy", "insured", "coverage", "premium", "claim", "hospital", "benefit",
+        "waiting", "period", "section", "clause", "(a)", "exclusion", "days,", "months.",
+        "sum", "grace", "renewal", "maternity", "treatment;", "•", "—", "Rs.", "30"
+    ]
+    lines = []
+    for _ in range(word_count // 12):
+        lines.append(" ".join(random.choice(vocabulary) for _ in range(12)))
+    return "\n".join(lines)
+
+def measure(name: str, func: Callable[[], List[str]]) -> Tuple[float, int, int]:
+    """Run func once untraced for time, then traced for peak memory"""
+    start_time = time.perf_counter()
+    chunks = func()
+    elapsed = time.perf_counter() - start_time
+    del chunks
+    
+    tracemalloc.start()
+    chunks = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {name:<12} {elapsed * 1000:9.1f} ms   peak {peak / 1024 / 1024:8.1f} MiB   {len(chunks)} chunks")
+    return elapsed, peak, len(chunks)
+
+def main():
+    """Main function to run the chunker benchmark"""
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print("Usage:")
+        print("  python benchmark_chunker.py                # 1,000,000 words of synthetic text")
+        print("  python benchmark_chunker.py [words]        # Synthetic text of the given size")
+        print("  python benchmark_chunker.py --file [path]  # Text read from a file")
+        sys.exit(0)
+    
+    if "--file" in args:
+        with open(args[args.index("--file") + 1], "r", encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = generate_text(int(args[0]) if args else 1_000_000)
+    
+    chunker = TextChunker()
+    print(f"📊 Chunking {len(text.split())} words ({len(text) / 1024 / 1024:.1f} MiB)")
+    legacy_time, legacy_peak, legacy_count = measure("legacy", lambda: legacy_chunk_text(text))
+    current_time, current_peak, current_count = measure("offsets", lambda: chunker.chunk_text(text))
+    measure("spans", lambda: chunker.chunk_spans(text))
+    
+    print(f"\n⚡ {legacy_time / current_time:.2f}x faster, {legacy_peak / max(current_peak, 1):.2f}x lower peak memory")
+    if legacy_count != current_count:
+        print(f"⚠️ Chunk counts differ: {legacy_count} vs {current_count}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import logging
+from typing import Dict, List, Optional, Tuple
+from sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+class ChunkStore(SQLiteStore):
+    """
+    Local docstore holding chunk texts keyed by vector ID
+    
+    The vector index only keeps IDs and compact metadata; retrieved IDs are
+    resolved to their text here, so upserts and query responses stay small.
+    """
+    
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Initialize the chunk database
+        
+        Args:
+            db_path: SQLite file shared by all workers on the host
+        """
+        cache_dir = os.getenv("CACHE_DIR", ".cache")
+        super().__init__(db_path or os.getenv("CHUNK_STORE_PATH", os.path.join(cache_dir, "chunks.db")), [
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                document_hash TEXT NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                text TEXT NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS chunks_document_hash ON chunks (document_hash, chunk_index)"
+        ])
+        logger.info(f"Chunk store initialized at: {self.db_path}")
+    
+    def put_many(self, document_hash: str, chunks: List[Tuple[str, int, str]]):
+        """
+        Store chunk texts for a document
+        
+        Args:
+            document_hash: Document the chunks belong to
+            chunks: (chunk_id, chunk_index, text) for each chunk
+        """
+        if not chunks:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, document_hash, chunk_index, text) VALUES (?, ?, ?, ?)",
+                [(chunk_id, document_hash, chunk_index, text) for chunk_id, chunk_index, text in chunks]
+            )
+            self._conn.commit()
+    
+    def get_many(self, chunk_ids: List[str]) -> Dict[str, Tuple[int, str]]:
+        """Return (chunk_index, text) for the given chunk IDs, keyed by ID"""
+        found = {}
+        with self._lock:
+            for chunk_id, chunk_index, text in self._select_in(
+                "SELECT chunk_id, chunk_index, text FROM chunks WHERE chunk_id IN ({keys})", chunk_ids
+            ):
+                found[chunk_id] = (chunk_index, text)
+        return found
+    
+    def get_document(self, document_hash: str) -> List[str]:
+        """Return the stored texts of a document in chunk order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text FROM chunks WHERE document_hash = ? ORDER BY chunk_index", (document_hash,)
+            ).fetchall()
+        return [text for (text,) in rows]
+    
+    def has_document(self, document_hash: str) -> bool:
+        """Whether any chunk of the document is stored"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM chunks WHERE document_hash = ? LIMIT 1", (document_hash,)
+            ).fetchone()
+        return row is not None
+    
+    def delete_document(self, document_hash: str):
+        """Drop every chunk of a document"""
+        self._write("DELETE FROM chunks WHERE document_hash = ?", (document_hash,))
+    
+    def clear(self):
+        """Drop every stored chunk"""
+        self._write("DELETE FROM chunks")
+        logger.info("Cleared chunk store")
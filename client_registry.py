@@ -0,0 +1,140 @@
+import os
+import asyncio
+import concurrent.futures
+import multiprocessing
+import logging
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+from document_processor import DocumentProcessor
+from text_chunker import TextChunker
+from gemini_client import GeminiClient
+from vector_store import VectorStore, create_vector_store
+from question_answerer import QuestionAnswerer
+from context_assembler import ContextAssembler
+from lexical_index import LexicalIndex
+from answer_cache import AnswerCache
+from ingestion_registry import IngestionRegistry
+from ingestion import DocumentIngestor
+from metrics import bind_context
+
+logger = logging.getLogger(__name__)
+
+class ClientRegistry:
+    """Process-lifetime registry of the shared clients used by request handlers"""
+    
+    def __init__(self):
+        self.document_processor: Optional[DocumentProcessor] = None
+        self.text_chunker: Optional[TextChunker] = None
+        self.gemini_client: Optional[GeminiClient] = None
+        self.vector_store: Optional[VectorStore] = None
+        self.lexical_index: Optional[LexicalIndex] = None
+        self.question_answerer: Optional[QuestionAnswerer] = None
+        self.answer_cache: Optional[AnswerCache] = None
+        self.ingestion_registry: Optional[IngestionRegistry] = None
+        self.ingestor: Optional[DocumentIngestor] = None
+        self.error: Optional[str] = None
+        
+        # Blocking SDK calls run on the I/O pool, text extraction on the CPU pool
+        self.io_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=int(os.getenv("IO_WORKERS", "32")),
+            thread_name_prefix="io"
+        )
+        # Workers come from a forkserver: forking this process, which already runs
+        # pool threads and HTTP clients, could copy locks those threads hold
+        self.cpu_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=int(os.getenv("EXTRACTION_WORKERS", "2")),
+            mp_context=multiprocessing.get_context("forkserver")
+        )
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+    
+    @property
+    def ready(self) -> bool:
+        """Whether warm-up has finished and the clients can serve requests"""
+        return self._ready.is_set()
+    
+    def warm_up(self):
+        """
+        Build every client once for this worker and open their connections
+        
+        Constructing PineconeClient checks the index exists; a stats call then
+        opens the pooled keep-alive connection so the first request does not
+        pay for the TLS handshake.
+        """
+        with self._lock:
+            if self.ready:
+                return
+            try:
+                start_time = time.time()
+                self.document_processor = DocumentProcessor()
+                self.text_chunker = TextChunker()
+                self.gemini_client = GeminiClient()
+                self.vector_store = create_vector_store()
+                self.vector_store.warm_up()
+                self.lexical_index = LexicalIndex(self.vector_store)
+                if os.getenv("ANSWER_CACHE", "sqlite").lower() == "sqlite":
+                    self.answer_cache = AnswerCache()
+                self.question_answerer = QuestionAnswerer(
+                    self.gemini_client,
+                    self.vector_store,
+                    self.answer_cache,
+                    ContextAssembler(self.text_chunker.overlap_size),
+                    self.lexical_index
+                )
+                self.ingestion_registry = IngestionRegistry()
+                self.ingestor = DocumentIngestor(
+                    self.document_processor,
+                    self.text_chunker,
+                    self.gemini_client,
+                    self.vector_store,
+                    self.ingestion_registry,
+                    self.io_pool,
+                    self.cpu_pool,
+                    self.lexical_index
+                )
+                self.error = None
+                self._ready.set()
+                logger.info(f"Client registry warmed up in {time.time() - start_time:.2f} seconds")
+            except Exception as e:
+                self.error = str(e)
+                logger.error(f"Client registry warm-up failed: {str(e)}")
+    
+    async def run_io(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking Gemini/Pinecone call on the I/O pool without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_pool, bind_context(func, *args))
+    
+    async def iter_io(self, func: Callable[..., Iterator[Any]], *args: Any) -> AsyncIterator[Any]:
+        """Drive a blocking generator (e.g. a Gemini token stream) on the I/O pool, yielding its items"""
+        iterator = func(*args)
+        finished = object()
+        step: Optional[concurrent.futures.Future] = None
+        try:
+            while True:
+                step = self.io_pool.submit(bind_context(next, iterator, finished))
+                item = await asyncio.wrap_future(step)
+                if item is finished:
+                    break
+                yield item
+        finally:
+            if step is not None and not step.done():
+                # Cancelled while next() runs on a pool thread: close the generator there once that call returns
+                step.add_done_callback(lambda _: iterator.close())
+            else:
+                iterator.close()
+    
+    async def close(self):
+        """Release pooled connections and worker pools held by the registry"""
+        self._ready.clear()
+        if self.document_processor:
+            await self.document_processor.aclose()
+        if self.ingestion_registry:
+            self.ingestion_registry.close()
+        if self.vector_store:
+            self.vector_store.close()
+        if self.answer_cache:
+            self.answer_cache.close()
+        self.io_pool.shutdown(wait=False, cancel_futures=True)
+        self.cpu_pool.shutdown(wait=False, cancel_futures=True)
+        logger.info("Client registry closed")
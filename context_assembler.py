@@ -0,0 +1,112 @@
+import os
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class ContextAssembler:
+    """
+    Turns retrieved chunk matches into the context passages sent to Gemini
+    
+    Neighbouring chunks of a document share overlap_size words, so matches
+    with consecutive chunk indices are merged into one passage with the
+    repeated words dropped. Passages are then taken in order of their best
+    match score until the token budget is spent.
+    """
+    
+    def __init__(self, overlap_size: int = 150, token_budget: Optional[int] = None):
+        """
+        Initialize the assembler
+        
+        Args:
+            overlap_size: Words shared by consecutive chunks (the chunker's overlap_size)
+            token_budget: Estimated tokens of context per question (CONTEXT_TOKEN_BUDGET)
+        """
+        self.overlap_size = overlap_size
+        self.token_budget = token_budget or int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+    
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Rough token count of a text (about four characters per token)"""
+        return len(text) // 4 + 1
+    
+    def _strip_overlap(self, previous: str, text: str) -> str:
+        """Drop the leading words of a chunk that repeat the end of the previous chunk"""
+        previous_words = previous.split()
+        words = text.split()
+        for size in range(min(self.overlap_size, len(previous_words), len(words)), 0, -1):
+            if previous_words[-size:] == words[:size]:
+                return " ".join(words[size:])
+        return text
+    
+    def _merge_spans(self, matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Merge matches of consecutive chunks into spans carrying their best score"""
+        indexed = sorted(
+            (match for match in matches if match.get("chunk_index") is not None),
+            key=lambda match: match["chunk_index"]
+        )
+        spans: List[Dict[str, Any]] = []
+        for match in indexed:
+            if spans and spans[-1]["end"] + 1 == match["chunk_index"]:
+                span = spans[-1]
+                span["parts"].append(self._strip_overlap(span["last_text"], match["text"]))
+                span["end"] = match["chunk_index"]
+                span["last_text"] = match["text"]
+                span["score"] = max(span["score"], match["score"])
+            else:
+                spans.append({
+                    "parts": [match["text"]],
+                    "end": match["chunk_index"],
+                    "last_text": match["text"],
+                    "score": match["score"]
+                })
+        
+        # Matches without a known position cannot be merged and stay as they are
+        spans.extend(
+            {"parts": [match["text"]], "score": match["score"]}
+            for match in matches if match.get("chunk_index") is None
+        )
+        return spans
+    
+    def assemble(self, matches: List[Dict[str, Any]], token_budget: Optional[int] = None) -> List[str]:
+        """
+        Build deduplicated, budgeted context passages from retrieved matches
+        
+        Args:
+            matches: Retrieved chunks with id, chunk_index, text and score
+            token_budget: Overrides the configured budget, e.g. for grouped questions
+        
+        Returns:
+            Context passages, most relevant first
+        """
+        budget = token_budget or self.token_budget
+        
+        # Keep the best-scoring copy of each chunk
+        unique: Dict[Any, Dict[str, Any]] = {}
+        for match in matches:
+            key = match["chunk_index"] if match.get("chunk_index") is not None else match["text"]
+            if key not in unique or match["score"] > unique[key]["score"]:
+                unique[key] = match
+        
+        spans = sorted(self._merge_spans(list(unique.values())), key=lambda span: -span["score"])
+        
+        passages = []
+        used_tokens = 0
+        for span in spans:
+            passage = " ".join(part for part in span["parts"] if part)
+            tokens = self.estimate_tokens(passage)
+            if used_tokens + tokens <= budget:
+                passages.append(passage)
+                used_tokens += tokens
+            elif not passages:
+                # The best passage alone is over budget; keep its beginning
+                passage = passage[:budget * 4].rsplit(" ", 1)[0]
+                passages.append(passage)
+                used_tokens += self.estimate_tokens(passage)
+        
+        source_tokens = sum(self.estimate_tokens(match["text"]) for match in matches)
+        logger.info(
+            f"Assembled {len(passages)} passages from {len(matches)} matches "
+            f"(~{used_tokens} of ~{source_tokens} tokens, budget {budget})"
+        )
+        return passages
@@ -52,7 +52,9 @@ class DeploymentChecker:
             ("pymupdf", "PyMuPDF"),
             ("docx", "python-docx"),
             ("google.genai", "Google GenAI"),
-            ("pinecone", "Pinecone")
+            ("pinecone", "Pinecone"),
+            ("httpx", "HTTPX"),
+            ("numpy", "NumPy")
         ]
         
         all_good = True
@@ -78,6 +80,20 @@ class DeploymentChecker:
             "document_processor.py",
             "text_chunker.py",
             "question_answerer.py",
+            "client_registry.py",
+            "ingestion.py",
+            "ingestion_registry.py",
+            "embedding_cache.py",
+            "vector_store.py",
+            "chunk_store.py",
+            "job_store.py",
+            "answer_cache.py",
+            "sqlite_store.py",
+            "context_assembler.py",
+            "lexical_index.py",
+            "match_selector.py",
+            "metrics.py",
+            "jobs.py",
             "render-requirements.txt",
             "render.yaml",
             "Dockerfile"
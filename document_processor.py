@@ -1,130 +1,366 @@
-import requests
+import asyncio
+import concurrent.futures
+import httpx
 import pymupdf as fitz  # PyMuPDF
 from docx import Document
-import tempfile
+import io
 import os
+import hashlib
+import tempfile
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Union
 from urllib.parse import urlparse
 import logging
+from metrics import span, DOWNLOADED_BYTES
 
 logger = logging.getLogger(__name__)
 
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx')
+
+class DocumentTooLargeError(ValueError):
+    """Raised when a document exceeds the configured maximum download size"""
+
+class _DownloadBuffer:
+    """
+    Accumulates a streamed response body into one preallocated buffer
+    
+    The type is sniffed from the URL, content type or first bytes as soon as
+    they arrive, so unsupported documents are rejected before the rest of the
+    body is read. The SHA-256 is computed incrementally.
+    """
+    
+    def __init__(self, processor: "DocumentProcessor", document_url: str, headers: Any, max_bytes: int):
+        self.processor = processor
+        self.document_url = document_url
+        self.content_type = headers.get('content-type', '')
+        self.max_bytes = max_bytes
+        self.file_extension: Optional[str] = None
+        self._hash = hashlib.sha256()
+        self._size = 0
+        
+        content_length = headers.get('content-length')
+        expected = int(content_length) if content_length and content_length.isdigit() else 0
+        if expected > max_bytes:
+            raise DocumentTooLargeError(f"Document is {expected} bytes, limit is {max_bytes}")
+        self._buffer = bytearray(expected)
+    
+    def feed(self, chunk: bytes):
+        """Append a body chunk, enforcing the size limit and sniffing the type early"""
+        end = self._size + len(chunk)
+        if end > self.max_bytes:
+            raise DocumentTooLargeError(f"Document exceeds the {self.max_bytes} byte limit")
+        
+        if end <= len(self._buffer):
+            self._buffer[self._size:end] = chunk
+        else:
+            # Content-Length missing or wrong, grow the buffer
+            del self._buffer[self._size:]
+            self._buffer += chunk
+        self._size = end
+        self._hash.update(chunk)
+        
+        if self.file_extension is None and self._size >= 4:
+            self.file_extension = self.processor._detect_file_type(
+                self.document_url, self.content_type, bytes(self._buffer[:4])
+            )
+            if self.file_extension not in SUPPORTED_EXTENSIONS:
+                raise ValueError(f"Unsupported file type: {self.file_extension}")
+    
+    def result(self) -> Dict[str, Any]:
+        """Return the downloaded buffer (no extra copy) plus its type and hash"""
+        # Trim in place if the server sent less than its Content-Length
+        del self._buffer[self._size:]
+        if self.file_extension is None:
+            self.file_extension = self.processor._detect_file_type(
+                self.document_url, self.content_type, bytes(self._buffer[:4])
+            )
+        return {
+            "content": self._buffer,
+            "file_extension": self.file_extension,
+            "content_hash": self._hash.hexdigest(),
+            "size": self._size
+        }
+
+def extract_pdf_page_range(
+    pdf_content: Union[bytes, bytearray, memoryview],
+    start_page: int = 0,
+    end_page: Optional[int] = None
+) -> List[str]:
+    """
+    Extract the text of pages [start_page, end_page) from in-memory PDF content
+    
+    Returns one string per page (empty for pages without text) so callers can
+    keep page numbers.
+    """
+    # Open PDF with PyMuPDF straight from the buffer, no temp file
+    return _extract_open_pdf_page_range(fitz.open(stream=pdf_content, filetype="pdf"), start_page, end_page)
+
+def _extract_open_pdf_page_range(doc: Any, start_page: int, end_page: Optional[int]) -> List[str]:
+    try:
+        end_page = doc.page_count if end_page is None else min(end_page, doc.page_count)
+        return [doc[page_num].get_text() for page_num in range(start_page, end_page)]
+    finally:
+        doc.close()
+
+def count_pdf_pages(pdf_content: Union[bytes, bytearray, memoryview]) -> int:
+    """Return the number of pages in in-memory PDF content"""
+    doc = fitz.open(stream=pdf_content, filetype="pdf")
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+SHARED_PDF_DIR = "/dev/shm"
+
+def _write_shared_pdf(content: Union[bytes, bytearray, memoryview]) -> str:
+    """
+    Write a PDF once to a RAM-backed file (/dev/shm) extraction workers open by path
+    
+    Unlike a SharedMemory segment, opening the file does not register it with
+    the worker's resource tracker, so only the parent, which removes it, owns it.
+    """
+    fd, path = tempfile.mkstemp(prefix="hackrx-", suffix=".pdf", dir=SHARED_PDF_DIR)
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    return path
+
+def _extract_shared_pdf_page_range(path: str, start_page: int, end_page: int) -> List[str]:
+    """Process-pool worker: extract a page range from a PDF written by _write_shared_pdf"""
+    return _extract_open_pdf_page_range(fitz.open(path, filetype="pdf"), start_page, end_page)
+
+def extract_docx_text(docx_content: Union[bytes, bytearray, memoryview]) -> str:
+    """Extract text from in-memory DOCX content using python-docx"""
+    try:
+        # Open DOCX with python-docx from a file-like view of the buffer
+        doc = Document(io.BytesIO(docx_content))
+        text_content = []
+        
+        for paragraph in doc.paragraphs:
+            if paragraph.text.strip():
+                text_content.append(paragraph.text)
+        
+        # Also extract text from tables
+        for table in doc.tables:
+            for row in table.rows:
+                for cell in row.cells:
+                    if cell.text.strip():
+                        text_content.append(cell.text)
+        
+        full_text = '\n\n'.join(text_content)
+        logger.info(f"Extracted {len(full_text)} characters from DOCX")
+        return full_text
+    
+    except Exception as e:
+        logger.error(f"Error extracting DOCX text: {str(e)}")
+        raise Exception(f"Failed to extract text from DOCX: {str(e)}")
+
+def extract_document_pages(content: Union[bytes, bytearray, memoryview], file_extension: str) -> List[str]:
+    """
+    Extract per-page text for a detected file type
+    
+    DOCX has no fixed pagination, so it comes back as a single page.
+    """
+    if file_extension == '.pdf':
+        try:
+            return extract_pdf_page_range(content)
+        except Exception as e:
+            logger.error(f"Error extracting PDF text: {str(e)}")
+            raise Exception(f"Failed to extract text from PDF: {str(e)}")
+    elif file_extension == '.docx':
+        return [extract_docx_text(content)]
+    else:
+        raise ValueError(f"Unsupported file type: {file_extension}")
+
 class DocumentProcessor:
     """Handles downloading and processing of PDF and DOCX documents"""
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+    def __init__(
+        self,
+        pool_size: int = 16,
+        max_document_bytes: Optional[int] = None,
+        stream_chunk_size: int = 1024 * 1024,
+        parallel_page_threshold: Optional[int] = None,
+        extraction_workers: Optional[int] = None
+    ):
+        self.max_document_bytes = max_document_bytes or int(os.getenv("MAX_DOCUMENT_BYTES", str(256 * 1024 * 1024)))
+        self.stream_chunk_size = stream_chunk_size
+        
+        # PDFs with at least this many pages are split into page ranges across the extraction pool
+        self.parallel_page_threshold = parallel_page_threshold or int(os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", "200"))
+        self.extraction_workers = extraction_workers or int(os.getenv("EXTRACTION_WORKERS", "2"))
+        
+        # Pages per extraction task when streaming pages into the ingestion pipeline
+        self.page_batch_size = int(os.getenv("PDF_PAGE_BATCH_SIZE", "16"))
+        
+        # Keep-alive connection pool shared by every download
+        self.async_client = httpx.AsyncClient(
+            headers={'User-Agent': USER_AGENT},
+            timeout=30,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+    
+    async def aclose(self):
+        """Close pooled HTTP connections"""
+        await self.async_client.aclose()
     
-    def process_document(self, document_url: str) -> str:
+    def _detect_file_type(self, document_url: str, content_type: str, content: bytes) -> str:
+        """Determine file type from URL, content type or leading bytes"""
+        parsed_url = urlparse(document_url)
+        file_extension = os.path.splitext(parsed_url.path)[1].lower()
+        
+        if not file_extension:
+            content_type = content_type.lower()
+            if 'pdf' in content_type:
+                file_extension = '.pdf'
+            elif 'word' in content_type or 'officedocument' in content_type:
+                file_extension = '.docx'
+            else:
+                # Try to detect from content
+                content_start = content[:4]
+                if content_start == b'%PDF':
+                    file_extension = '.pdf'
+                elif content_start[:2] == b'PK':  # ZIP-based format like DOCX
+                    file_extension = '.docx'
+                else:
+                    raise ValueError("Unable to determine document type")
+        
+        return file_extension
+    
+    async def fetch_document_async(
+        self,
+        document_url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
         """
-        Download and extract text from a document URL
+        Download a document, revalidating with a conditional GET when validators are known
         
         Args:
             document_url: URL to the PDF or DOCX document
-            
+            etag: ETag from a previous download, sent as If-None-Match
+            last_modified: Last-Modified from a previous download, sent as If-Modified-Since
+        
         Returns:
-            Extracted text content
+            None if the server answered 304 Not Modified, otherwise a dict with the
+            content, file_extension, content_hash, etag and last_modified
         """
         try:
-            # Download the document
-            logger.info(f"Downloading document from: {document_url}")
-            response = self.session.get(document_url, timeout=30)
-            response.raise_for_status()
-            
-            # Determine file type from URL or content type
-            parsed_url = urlparse(document_url)
-            file_extension = os.path.splitext(parsed_url.path)[1].lower()
+            headers = {}
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
             
-            if not file_extension:
-                content_type = response.headers.get('content-type', '').lower()
-                if 'pdf' in content_type:
-                    file_extension = '.pdf'
-                elif 'word' in content_type or 'officedocument' in content_type:
-                    file_extension = '.docx'
-                else:
-                    # Try to detect from content
-                    content_start = response.content[:4]
-                    if content_start == b'%PDF':
-                        file_extension = '.pdf'
-                    elif content_start[:2] == b'PK':  # ZIP-based format like DOCX
-                        file_extension = '.docx'
-                    else:
-                        raise ValueError("Unable to determine document type")
+            logger.info(f"Downloading document from: {document_url}")
+            with span("download"):
+                async with self.async_client.stream("GET", document_url, headers=headers) as response:
+                    if response.status_code == 304:
+                        logger.info(f"Document not modified since last download: {document_url}")
+                        return None
+                    response.raise_for_status()
+                    
+                    buffer = _DownloadBuffer(self, document_url, response.headers, self.max_document_bytes)
+                    async for chunk in response.aiter_bytes(self.stream_chunk_size):
+                        buffer.feed(chunk)
+                    
+                    document = buffer.result()
+                    document["etag"] = response.headers.get('etag')
+                    document["last_modified"] = response.headers.get('last-modified')
+            DOWNLOADED_BYTES.inc(document["size"])
             
-            # Process based on file type
-            if file_extension == '.pdf':
-                return self._extract_pdf_text(response.content)
-            elif file_extension == '.docx':
-                return self._extract_docx_text(response.content)
-            else:
-                raise ValueError(f"Unsupported file type: {file_extension}")
-                
-        except requests.RequestException as e:
+            logger.info(f"Downloaded {document['size']} bytes ({document['file_extension']})")
+            return document
+        
+        except DocumentTooLargeError:
+            raise
+        except httpx.HTTPError as e:
             logger.error(f"Error downloading document: {str(e)}")
             raise Exception(f"Failed to download document: {str(e)}")
         except Exception as e:
             logger.error(f"Error processing document: {str(e)}")
             raise Exception(f"Failed to process document: {str(e)}")
     
-    def _extract_pdf_text(self, pdf_content: bytes) -> str:
-        """Extract text from PDF content using PyMuPDF"""
-        try:
-            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
-                temp_file.write(pdf_content)
-                temp_file.flush()
-                
-                # Open PDF with PyMuPDF
-                doc = fitz.open(temp_file.name)
-                text_content = []
-                
-                for page_num in range(doc.page_count):
-                    page = doc[page_num]
-                    text = page.get_text()
-                    if text.strip():
-                        text_content.append(text)
-                
-                doc.close()
-                os.unlink(temp_file.name)
-                
-                full_text = '\n\n'.join(text_content)
-                logger.info(f"Extracted {len(full_text)} characters from PDF")
-                return full_text
-                
-        except Exception as e:
-            logger.error(f"Error extracting PDF text: {str(e)}")
-            raise Exception(f"Failed to extract text from PDF: {str(e)}")
-    
-    def _extract_docx_text(self, docx_content: bytes) -> str:
-        """Extract text from DOCX content using python-docx"""
+    async def iter_pages_async(
+        self,
+        document: Dict[str, Any],
+        executor: Optional[concurrent.futures.Executor] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield per-page text in page order while later pages are still being extracted
+        
+        PDFs are extracted in ranges of page_batch_size pages from one file in
+        /dev/shm; above parallel_page_threshold pages up to extraction_workers
+        ranges run at once. Small documents, and every PDF on hosts without
+        /dev/shm, are extracted on threads from the downloaded buffer instead,
+        so no copy of the document is pickled into the pool or written to disk.
+        Use with contextlib.aclosing so the shared file is removed if the
+        consumer stops early.
+        
+        Args:
+            document: Result of fetch_document_async
+            executor: Pool that runs page-range extraction from the shared file (default loop executor if None)
+        """
+        loop = asyncio.get_running_loop()
+        content = document["content"]
+        
+        page_count = 0
+        if document["file_extension"] == '.pdf':
+            try:
+                with span("extract"):
+                    page_count = await loop.run_in_executor(None, count_pdf_pages, content)
+            except Exception as e:
+                logger.error(f"Error extracting PDF text: {str(e)}")
+                raise Exception(f"Failed to extract text from PDF: {str(e)}")
+        
+        if page_count <= self.page_batch_size:
+            # Parsing a few pages costs less than pickling the whole document into a worker
+            with span("extract"):
+                pages = await loop.run_in_executor(
+                    None, extract_document_pages, content, document["file_extension"]
+                )
+            for text in pages:
+                yield text
+            return
+        
+        ranges = [
+            (start, min(start + self.page_batch_size, page_count))
+            for start in range(0, page_count, self.page_batch_size)
+        ]
+        max_in_flight = self.extraction_workers if page_count >= self.parallel_page_threshold else 1
+        
+        # Without /dev/shm, threads read the in-memory buffer rather than the pool reading a disk file
+        path = None
+        if os.path.isdir(SHARED_PDF_DIR):
+            path = await loop.run_in_executor(None, _write_shared_pdf, content)
+        pending: Deque[asyncio.Future] = deque()
         try:
-            with tempfile.NamedTemporaryFile(suffix='.docx', delete=False) as temp_file:
-                temp_file.write(docx_content)
-                temp_file.flush()
-                
-                # Open DOCX with python-docx
-                doc = Document(temp_file.name)
-                text_content = []
-                
-                for paragraph in doc.paragraphs:
-                    if paragraph.text.strip():
-                        text_content.append(paragraph.text)
-                
-                # Also extract text from tables
-                for table in doc.tables:
-                    for row in table.rows:
-                        for cell in row.cells:
-                            if cell.text.strip():
-                                text_content.append(cell.text)
-                
-                os.unlink(temp_file.name)
-                
-                full_text = '\n\n'.join(text_content)
-                logger.info(f"Extracted {len(full_text)} characters from DOCX")
-                return full_text
-                
-        except Exception as e:
-            logger.error(f"Error extracting DOCX text: {str(e)}")
-            raise Exception(f"Failed to extract text from DOCX: {str(e)}")
-
+            next_range = 0
+            while next_range < len(ranges) or pending:
+                while next_range < len(ranges) and len(pending) < max_in_flight:
+                    start, end = ranges[next_range]
+                    if path is not None:
+                        pending.append(loop.run_in_executor(
+                            executor, _extract_shared_pdf_page_range, path, start, end
+                        ))
+                    else:
+                        pending.append(loop.run_in_executor(
+                            None, extract_pdf_page_range, content, start, end
+                        ))
+                    next_range += 1
+                try:
+                    # Only time spent waiting on extraction counts, not the consumer's time between pages
+                    with span("extract"):
+                        pages = await pending.popleft()
+                except Exception as e:
+                    logger.error(f"Error extracting PDF text: {str(e)}")
+                    raise Exception(f"Failed to extract text from PDF: {str(e)}")
+                for text in pages:
+                    yield text
+        finally:
+            for future in pending:
+                future.cancel()
+            # Workers that already opened the file keep reading it after the unlink
+            if path is not None:
+                os.unlink(path)
@@ -0,0 +1,234 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+import concurrent.futures
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, List
+from metrics import CACHE_LOOKUPS
+from sqlite_store import SQLiteLRUCache
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache(ABC):
+    """
+    Interface for embedding caches keyed by embedding model and text
+    
+    get_or_compute_many adds single-flight semantics on top of any backend:
+    concurrent misses for the same key share one in-flight computation, and
+    no lock is held while the embedding API is called.
+    """
+    
+    def __init__(self):
+        self._inflight: Dict[str, concurrent.futures.Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "waits": 0}
+    
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Cache key covering both the embedding model and the text"""
+        return hashlib.sha256(f"{model}\x00{text}".encode()).hexdigest()
+    
+    @abstractmethod
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, List[float]]:
+        """Return cached embeddings for the given texts, keyed by text"""
+    
+    @abstractmethod
+    def put_many(self, model: str, embeddings: Dict[str, List[float]]):
+        """Store embeddings keyed by text"""
+    
+    def get_or_compute_many(
+        self,
+        model: str,
+        texts: List[str],
+        compute_batch: Callable[[List[str]], List[List[float]]]
+    ) -> List[List[float]]:
+        """
+        Return embeddings for texts, computing every miss exactly once
+        
+        Args:
+            model: Embedding model name, part of the cache key
+            texts: Texts to embed (duplicates allowed)
+            compute_batch: Called once with the texts this thread must embed
+        
+        Returns:
+            Embeddings in the same order as texts
+        """
+        results = self.get_many(model, texts)
+        hits = sum(1 for text in texts if text in results)
+        
+        owned: Dict[str, concurrent.futures.Future] = {}
+        waiting: Dict[str, concurrent.futures.Future] = {}
+        with self._inflight_lock:
+            for text in dict.fromkeys(text for text in texts if text not in results):
+                key = self.make_key(model, text)
+                future = self._inflight.get(key)
+                if future is None:
+                    future = concurrent.futures.Future()
+                    self._inflight[key] = future
+                    owned[text] = future
+                else:
+                    waiting[text] = future
+        
+        if owned:
+            try:
+                # Another thread may have finished these keys between the lookup and registration
+                results.update(self.get_many(model, list(owned)))
+                to_compute = [text for text in owned if text not in results]
+                if to_compute:
+                    new_entries = dict(zip(to_compute, compute_batch(to_compute)))
+                    self.put_many(model, new_entries)
+                    results.update(new_entries)
+                for text, future in owned.items():
+                    future.set_result(results[text])
+            except Exception as e:
+                for future in owned.values():
+                    if not future.done():
+                        future.set_exception(e)
+                raise
+            finally:
+                with self._inflight_lock:
+                    for text in owned:
+                        self._inflight.pop(self.make_key(model, text), None)
+        
+        for text, future in waiting.items():
+            results[text] = future.result()
+        
+        with self._inflight_lock:
+            self._stats["hits"] += hits
+            self._stats["misses"] += len(owned)
+            self._stats["waits"] += len(waiting)
+        CACHE_LOOKUPS.inc(hits, cache="embedding", result="hit")
+        CACHE_LOOKUPS.inc(len(owned), cache="embedding", result="miss")
+        CACHE_LOOKUPS.inc(len(waiting), cache="embedding", result="wait")
+        
+        return [results[text] for text in texts]
+    
+    def stats(self) -> Dict[str, int]:
+        """Hit, miss and single-flight wait counters since startup"""
+        with self._inflight_lock:
+            return dict(self._stats)
+    
+    @abstractmethod
+    def clear(self):
+        """Drop every cached embedding"""
+    
+    def close(self):
+        """Release any resources held by the cache"""
+
+class InMemoryEmbeddingCache(EmbeddingCache):
+    """Per-process LRU embedding cache bounded by a byte budget"""
+    
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: int = 0):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+    
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        now = time.time()
+        with self._lock:
+            for text in texts:
+                key = self.make_key(model, text)
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                vector, created_at = entry
+                if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                    self._remove(key)
+                    continue
+                self._entries.move_to_end(key)
+                found[text] = vector.tolist()
+        return found
+    
+    def put_many(self, model: str, embeddings: Dict[str, List[float]]):
+        now = time.time()
+        with self._lock:
+            for text, embedding in embeddings.items():
+                key = self.make_key(model, text)
+                if key in self._entries:
+                    self._remove(key)
+                vector = array('f', embedding)
+                self._entries[key] = (vector, now)
+                self._total_bytes += len(vector) * vector.itemsize
+            
+            # Evict least recently used entries beyond the byte budget
+            while self._total_bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+    
+    def _remove(self, key: str):
+        vector, _ = self._entries.pop(key)
+        self._total_bytes -= len(vector) * vector.itemsize
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+class SQLiteEmbeddingCache(EmbeddingCache):
+    """
+    On-disk embedding cache shared by all worker processes on the host
+    
+    Vectors are stored as packed float32 blobs. Entries expire after a TTL and
+    the least recently used ones are evicted once the stored vectors exceed
+    the byte budget.
+    """
+    
+    def __init__(self, db_path: str, max_bytes: int = 256 * 1024 * 1024, ttl_seconds: int = 7 * 24 * 3600):
+        """
+        Initialize the cache database
+        
+        Args:
+            db_path: SQLite file holding the cache
+            max_bytes: Budget for stored vector bytes before LRU eviction
+            ttl_seconds: Age after which entries expire (0 disables expiry)
+        """
+        super().__init__()
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._table = SQLiteLRUCache(db_path, "embeddings", "vector", "BLOB", max_bytes, ttl_seconds)
+        logger.info(f"Embedding cache initialized at: {self.db_path}")
+    
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, List[float]]:
+        keys = {self.make_key(model, text): text for text in texts}
+        found = {}
+        for cache_key, blob in self._table.get_many(list(keys)).items():
+            vector = array('f')
+            vector.frombytes(blob)
+            found[keys[cache_key]] = vector.tolist()
+        return found
+    
+    def put_many(self, model: str, embeddings: Dict[str, List[float]]):
+        entries = []
+        for text, embedding in embeddings.items():
+            blob = array('f', embedding).tobytes()
+            entries.append((self.make_key(model, text), len(blob), blob))
+        self._table.put_many(entries)
+    
+    def clear(self):
+        self._table.clear()
+    
+    def close(self):
+        self._table.close()
+
+def create_embedding_cache() -> EmbeddingCache:
+    """Build the embedding cache selected by EMBEDDING_CACHE (sqlite or memory)"""
+    backend = os.getenv("EMBEDDING_CACHE", "sqlite").lower()
+    max_bytes = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    ttl_seconds = int(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+    
+    if backend == "memory":
+        return InMemoryEmbeddingCache(max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+    elif backend == "sqlite":
+        cache_dir = os.getenv("CACHE_DIR", ".cache")
+        db_path = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(cache_dir, "embeddings.db"))
+        return SQLiteEmbeddingCache(db_path, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+    else:
+        raise ValueError(f"Unsupported embedding cache backend: {backend}")
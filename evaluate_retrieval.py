@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Retrieval evaluation for vector-only and hybrid (BM25 + vector) search
+Ingests a document, then measures recall and latency of each retrieval mode
+over labelled questions
+"""
+
+import sys
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List
+from client_registry import ClientRegistry
+from embedding_cache import InMemoryEmbeddingCache
+from metrics import RETRIEVAL_QUESTIONS
+
+logging.basicConfig(level=logging.WARNING)
+
+def load_questions(path: str) -> List[Dict[str, Any]]:
+    """Read labelled questions: one JSON object per line with "question" and "expected" text"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def evaluate_mode(registry: ClientRegistry, mode: str, document_url: str, labelled: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Retrieve context for each question one at a time and score it"""
+    answerer = registry.question_answerer
+    answerer.retrieval_mode = mode
+    # A fresh cache per mode, so neither mode reuses query embeddings from the other or from an earlier run
+    registry.vector_store.embedding_cache = InMemoryEmbeddingCache()
+    fast_path_before = RETRIEVAL_QUESTIONS.value(path="lexical")
+    latencies = []
+    hits = 0
+    for item in labelled:
+        start_time = time.perf_counter()
+        matches = answerer.search_relevant_chunks_batch([item["question"]], document_url)[0]
+        latencies.append(time.perf_counter() - start_time)
+        expected = item["expected"].casefold()
+        hits += any(expected in match["text"].casefold() for match in matches)
+    
+    latencies.sort()
+    return {
+        "mode": mode,
+        "recall": hits / len(labelled),
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        "fast_path": int(RETRIEVAL_QUESTIONS.value(path="lexical") - fast_path_before)
+    }
+
+async def run(document_url: str, questions_path: str):
+    labelled = load_questions(questions_path)
+    registry = ClientRegistry()
+    registry.warm_up()
+    if not registry.ready:
+        print(f"❌ Clients failed to start: {registry.error}")
+        sys.exit(1)
+    
+    try:
+        ingestion = await registry.ingestor.ingest(document_url)
+        # Retrieval runs on per-mode in-memory caches from here on; release the shared one
+        registry.vector_store.embedding_cache.close()
+        print(f"📄 {document_url}: {ingestion['chunk_count']} chunks, {len(labelled)} questions, top_k={registry.question_answerer.top_k}\n")
+        for mode in ("vector", "hybrid"):
+            result = await asyncio.to_thread(evaluate_mode, registry, mode, document_url, labelled)
+            print(
+                f"  {result['mode']:<7} recall {result['recall']:.1%}   mean {result['mean_ms']:7.1f} ms   "
+                f"p95 {result['p95_ms']:7.1f} ms   lexical fast path {result['fast_path']}/{len(labelled)}"
+            )
+    finally:
+        await registry.close()
+
+def main():
+    """Main function to run the retrieval evaluation"""
+    args = sys.argv[1:]
+    if len(args) != 2 or "-h" in args or "--help" in args:
+        print("Usage:")
+        print("  python evaluate_retrieval.py <document_url> <questions.jsonl>")
+        print('  Each line: {"question": "...", "expected": "text the retrieved context must contain"}')
+        sys.exit(0 if "-h" in args or "--help" in args else 1)
+    
+    asyncio.run(run(args[0], args[1]))
+
+if __name__ == "__main__":
+    main()
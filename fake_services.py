@@ -0,0 +1,356 @@
+"""
+Local stand-ins for the external services the API depends on
+Fake Gemini and Pinecone SDK clients with configurable latency and error
+rates, plus a generated PDF/DOCX corpus served over local HTTP, so the real
+app can be exercised and benchmarked without API keys or network access
+"""
+
+import os
+import re
+import json
+import math
+import time
+import zlib
+import random
+import typing
+import logging
+import threading
+import http.server
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIMENSION = 768
+
+# Median latency in milliseconds and lognormal spread of each fake operation
+DEFAULT_LATENCY = {
+    "embed": (120.0, 0.4),
+    "generate": (900.0, 0.5),
+    "upsert": (60.0, 0.4),
+    "query": (40.0, 0.4),
+    "fetch": (30.0, 0.3)
+}
+
+# Topics of the generated documents; questions ask about them
+TOPICS = [
+    "cataract surgery", "maternity expenses", "organ donor", "ayush treatment", "room rent",
+    "ambulance charges", "domiciliary care", "dental treatment", "bariatric surgery", "air ambulance",
+    "no claim discount", "health checkup", "cumulative bonus", "pre-existing diseases", "grace period",
+    "free look period", "moratorium", "co-payment", "daycare procedures", "robotic surgery"
+]
+
+FILLER = (
+    "the policy holder insured person benefit coverage hospital treatment claim amount period days "
+    "shall be payable subject to terms conditions exclusions schedule premium renewal sum insured"
+).split()
+
+class FakeServiceSettings:
+    """Latency, error and seed settings shared by every fake client"""
+    
+    def __init__(
+        self,
+        latency: Optional[Dict[str, Tuple[float, float]]] = None,
+        latency_scale: Optional[float] = None,
+        error_rate: Optional[float] = None,
+        seed: Optional[int] = None
+    ):
+        """
+        Initialize the settings
+        
+        Args:
+            latency: (median ms, lognormal sigma) per operation, defaulting to DEFAULT_LATENCY
+            latency_scale: Multiplier applied to every median (FAKE_LATENCY_SCALE)
+            error_rate: Probability of a retryable 503 on any call (FAKE_ERROR_RATE)
+            seed: Seed of the latency and error draws (FAKE_SEED)
+        """
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.latency_scale = latency_scale if latency_scale is not None else float(os.getenv("FAKE_LATENCY_SCALE", "1.0"))
+        self.error_rate = error_rate if error_rate is not None else float(os.getenv("FAKE_ERROR_RATE", "0.0"))
+        self._random = random.Random(seed if seed is not None else int(os.getenv("FAKE_SEED", "7")))
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+    
+    def call(self, operation: str, make_error):
+        """Count a call, sleep for a sampled latency and raise a sampled error"""
+        median_ms, sigma = self.latency[operation]
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            delay = median_ms * self.latency_scale * math.exp(self._random.gauss(0.0, sigma)) / 1000
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+        time.sleep(delay)
+        if failed:
+            raise make_error()
+    
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Call and error counters so far"""
+        with self._lock:
+            return {"calls": dict(self.calls), "errors": dict(self.errors)}
+    
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.errors.clear()
+
+settings = FakeServiceSettings()
+
+def fake_embedding(text: str) -> List[float]:
+    """Deterministic unit vector from hashed words, so similar texts get similar vectors"""
+    vector = np.zeros(EMBEDDING_DIMENSION, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        hashed = zlib.crc32(word.encode())
+        vector[hashed % EMBEDDING_DIMENSION] += 1.0 if hashed & 0x80000000 else -1.0
+    norm = float(np.linalg.norm(vector))
+    return (vector / norm if norm else vector).tolist()
+
+
+class FakePineconeError(Exception):
+    """Transient Pinecone failure carrying the HTTP status the client inspects"""
+    
+    def __init__(self, status_code: int = 503):
+        super().__init__(f"Fake Pinecone error ({status_code})")
+        self.status_code = status_code
+
+
+def _gemini_error():
+    from google.genai import errors
+    return errors.APIError(503, {"error": {"code": 503, "message": "Fake Gemini overload", "status": "UNAVAILABLE"}})
+
+
+class FakeModels:
+    """Stand-in for genai.Client().models"""
+    
+    def embed_content(self, model: str, contents: List[str], config: Any = None):
+        settings.call("embed", _gemini_error)
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=fake_embedding(text)) for text in contents])
+    
+    @staticmethod
+    def _prompt(contents: Any) -> str:
+        if isinstance(contents, str):
+            return contents
+        return "\n".join(part.text for content in contents for part in content.parts if part.text)
+    
+    @staticmethod
+    def _answer(prompt: str, question: str) -> str:
+        context = prompt.split("Context chunks:", 1)[-1]
+        excerpt = " ".join(context.split()[:24])
+        return f"Based on the policy, {question.strip()} is addressed as follows: {excerpt}"
+    
+    def generate_content(self, model: str, contents: Any, config: Any = None):
+        settings.call("generate", _gemini_error)
+        prompt = self._prompt(contents)
+        schema = getattr(config, "response_schema", None)
+        if typing.get_origin(schema) is list:
+            questions = re.findall(r"(?m)^(\d+)\. (.+)$", prompt.split("Context chunks:", 1)[0])
+            text = json.dumps([
+                {"question_number": int(number), "answer": self._answer(prompt, question), "condition": "", "rationale": ""}
+                for number, question in questions
+            ])
+        elif schema is not None:
+            question = prompt.split("\n", 1)[0].removeprefix("Question:")
+            text = json.dumps({"answer": self._answer(prompt, question), "condition": "", "rationale": ""})
+        else:
+            text = self._answer(prompt, prompt[:80])
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=len(prompt) // 4,
+                candidates_token_count=len(text) // 4,
+                total_token_count=(len(prompt) + len(text)) // 4
+            )
+        )
+    
+    def generate_content_stream(self, model: str, contents: Any, config: Any = None) -> Iterator[Any]:
+        prompt = self._prompt(contents)
+        # Time to first token is part of the sampled latency; the rest is spread over the words
+        settings.call("generate", _gemini_error)
+        words = self._answer(prompt, prompt.split("\n", 1)[0].removeprefix("Question:")).split(" ")
+        for i, word in enumerate(words):
+            yield SimpleNamespace(text=word if i == 0 else f" {word}")
+
+
+class FakeGenaiClient:
+    """Stand-in for google.genai.Client"""
+    
+    def __init__(self, api_key: Optional[str] = None, **kwargs: Any):
+        self.models = FakeModels()
+
+
+class FakeIndex:
+    """In-memory Pinecone index with namespaces, brute-force cosine queries and ID listing"""
+    
+    _namespaces: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    _lock = threading.Lock()
+    
+    def describe_index_stats(self, **kwargs: Any):
+        with self._lock:
+            namespaces = {name: SimpleNamespace(vector_count=len(vectors)) for name, vectors in self._namespaces.items()}
+        return SimpleNamespace(
+            total_vector_count=sum(namespace.vector_count for namespace in namespaces.values()),
+            namespaces=namespaces
+        )
+    
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = "", **kwargs: Any):
+        settings.call("upsert", FakePineconeError)
+        with self._lock:
+            stored = self._namespaces.setdefault(namespace, {})
+            for vector in vectors:
+                stored[vector["id"]] = vector
+        return SimpleNamespace(upserted_count=len(vectors))
+    
+    def query(
+        self,
+        vector: List[float],
+        top_k: int,
+        namespace: str = "",
+        include_metadata: bool = False,
+        include_values: bool = False,
+        **kwargs: Any
+    ):
+        settings.call("query", FakePineconeError)
+        with self._lock:
+            stored = list(self._namespaces.get(namespace, {}).values())
+        if not stored:
+            return SimpleNamespace(matches=[])
+        scores = np.asarray([item["values"] for item in stored], dtype=np.float32) @ np.asarray(vector, dtype=np.float32)
+        order = np.argsort(-scores)[:top_k]
+        return SimpleNamespace(matches=[
+            SimpleNamespace(
+                id=stored[i]["id"],
+                score=float(scores[i]),
+                metadata=stored[i].get("metadata") if include_metadata else None,
+                values=stored[i]["values"] if include_values else None
+            )
+            for i in order
+        ])
+    
+    def fetch(self, ids: List[str], namespace: str = "", **kwargs: Any):
+        settings.call("fetch", FakePineconeError)
+        with self._lock:
+            stored = self._namespaces.get(namespace, {})
+            found = {i: stored[i] for i in ids if i in stored}
+        return SimpleNamespace(vectors={
+            i: SimpleNamespace(id=i, values=item["values"], metadata=item.get("metadata")) for i, item in found.items()
+        })
+    
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False, namespace: str = "", **kwargs: Any):
+        with self._lock:
+            if delete_all:
+                self._namespaces.pop(namespace, None)
+                return
+            stored = self._namespaces.get(namespace, {})
+            for i in ids or []:
+                stored.pop(i, None)
+    
+    def list(self, namespace: str = "", prefix: Optional[str] = None, **kwargs: Any) -> Iterator[List[str]]:
+        with self._lock:
+            ids = [i for i in self._namespaces.get(namespace, {}) if not prefix or i.startswith(prefix)]
+        for start in range(0, len(ids), 100):
+            yield ids[start:start + 100]
+
+
+class FakePinecone:
+    """Stand-in for the Pinecone control-plane client"""
+    
+    def __init__(self, api_key: Optional[str] = None, **kwargs: Any):
+        pass
+    
+    def list_indexes(self):
+        return [SimpleNamespace(name=os.getenv("PINECONE_INDEX", "hackrx-documents"))]
+    
+    def Index(self, name: str, **kwargs: Any) -> FakeIndex:
+        return FakeIndex()
+
+
+def install(service_settings: Optional[FakeServiceSettings] = None):
+    """Route the app's Gemini and Pinecone SDK clients to the fakes; call before the clients are built"""
+    global settings
+    if service_settings is not None:
+        settings = service_settings
+    os.environ.setdefault("GEMINI_API_KEY", "offline")
+    os.environ.setdefault("PINECONE_API_KEY", "offline")
+    os.environ["PINECONE_TRANSPORT"] = "http"
+    
+    import gemini_client
+    import pinecone_client
+    gemini_client.genai.Client = FakeGenaiClient
+    pinecone_client.Pinecone = FakePinecone
+    logger.info("Gemini and Pinecone clients replaced by local fakes")
+
+def _document_paragraphs(seed: int, pages: int) -> List[Tuple[str, str]]:
+    """(topic, page text) for each page of a generated policy document"""
+    generator = random.Random(seed)
+    paragraphs = []
+    for page in range(pages):
+        topic = TOPICS[(seed + page) % len(TOPICS)]
+        words = [generator.choice(FILLER) for _ in range(350)]
+        clause = f"Section {page + 1}.{seed % 9 + 1} {topic} is covered up to {10 + (seed + page) % 40} percent of the sum insured"
+        words[150:150] = clause.split()
+        paragraphs.append((topic, " ".join(words)))
+    return paragraphs
+
+def generate_document(path: str, seed: int, pages: int) -> List[str]:
+    """
+    Write a generated policy document as PDF or DOCX (by extension)
+    
+    Returns:
+        The topics covered, for building questions
+    """
+    paragraphs = _document_paragraphs(seed, pages)
+    if path.endswith(".docx"):
+        from docx import Document
+        document = Document()
+        for _, text in paragraphs:
+            document.add_paragraph(text)
+        document.save(path)
+    else:
+        import pymupdf as fitz
+        document = fitz.open()
+        for _, text in paragraphs:
+            page = document.new_page()
+            page.insert_textbox(fitz.Rect(36, 36, 576, 806), text, fontsize=8)
+        document.save(path)
+        document.close()
+    return list(dict.fromkeys(topic for topic, _ in paragraphs))
+
+def generate_corpus(directory: str, count: int, pages: int, prefix: str = "doc", seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Generate alternating PDF and DOCX documents
+    
+    Returns:
+        One entry per document with its file name and topics
+    """
+    os.makedirs(directory, exist_ok=True)
+    corpus = []
+    for i in range(count):
+        name = f"{prefix}{i}.{'docx' if i % 2 else 'pdf'}"
+        topics = generate_document(os.path.join(directory, name), seed + i, pages)
+        corpus.append({"name": name, "topics": topics})
+    return corpus
+
+def questions_for(topics: List[str], count: int) -> List[str]:
+    """Questions about a document's topics"""
+    templates = ["What is the coverage for {}?", "Is {} covered under the policy?", "What percentage of the sum insured applies to {}?"]
+    return [templates[i % len(templates)].format(topics[i % len(topics)]) for i in range(count)]
+
+def serve_directory(directory: str, port: int = 0) -> Tuple[http.server.ThreadingHTTPServer, str]:
+    """
+    Serve a directory over HTTP on a background thread
+    
+    Returns:
+        The server (call shutdown() to stop it) and its base URL
+    """
+    class QuietHandler(http.server.SimpleHTTPRequestHandler):
+        def __init__(self, *args: Any, **kwargs: Any):
+            super().__init__(*args, directory=directory, **kwargs)
+        
+        def log_message(self, format: str, *args: Any):
+            pass
+    
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), QuietHandler)
+    threading.Thread(target=server.serve_forever, name="corpus-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
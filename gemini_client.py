@@ -1,13 +1,26 @@
 import os
 import json
+import time
+import random
 import logging
-from typing import List, Dict, Any
+import concurrent.futures
+from typing import List, Dict, Any, Callable, Iterator, TypeVar
+import httpx
 from google import genai
-from google.genai import types
-from models import LegalAnswer
+from google.genai import errors, types
+from models import LegalAnswer, NumberedLegalAnswer
+from metrics import span, record_stage, bind_context, GEMINI_TOKENS
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# HTTP status codes worth retrying: throttling and transient server errors
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+# Bump whenever the answer prompts change so cached answers are not reused
+ANSWER_PROMPT_VERSION = "2"
+
 class GeminiClient:
     """Client for interacting with Gemini AI"""
     
@@ -17,153 +30,336 @@ class GeminiClient:
             raise ValueError("GEMINI_API_KEY environment variable is required")
         
         self.client = genai.Client(api_key=api_key)
+        self.embedding_model = "text-embedding-004"
+        self.answer_model = "gemini-2.5-flash"
+        
+        # Sub-batch limits for embed_content: items per call and estimated tokens per call
+        self.embed_batch_max_items = int(os.getenv("EMBED_MAX_ITEMS_PER_CALL", "100"))
+        self.embed_batch_max_tokens = int(os.getenv("EMBED_MAX_TOKENS_PER_CALL", "18000"))
+        self.embed_concurrency = int(os.getenv("EMBED_CONCURRENCY", "4"))
+        self.max_retries = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+        self._embed_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.embed_concurrency,
+            thread_name_prefix="embed"
+        )
         logger.info("Gemini client initialized")
     
-    def generate_embedding(self, text: str) -> List[float]:
-        """
-        Generate embedding for text using Gemini text-embedding-004 model
-        
-        Args:
-            text: Input text to embed
-            
-        Returns:
-            Embedding vector as list of floats
-        """
-        try:
-            # Use the embedding model following the blueprint pattern
-            result = self.client.models.embed_content(
-                model="text-embedding-004",
-                contents=[text]
+    def _with_retries(self, operation: Callable[[], T], description: str) -> T:
+        """Run an API call, retrying throttled, transient or network failures with jittered exponential backoff"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return operation()
+            except Exception as e:
+                # google-genai surfaces network failures as httpx errors (timeouts included)
+                retryable = (
+                    isinstance(e, errors.APIError) and e.code in RETRYABLE_STATUS_CODES
+                ) or isinstance(e, (httpx.TransportError, ConnectionError, TimeoutError))
+                if not retryable or attempt == self.max_retries:
+                    raise
+                # Full jitter: sleep a random fraction of an exponentially growing cap
+                delay = random.uniform(0, min(30.0, 0.5 * (2 ** attempt)))
+                logger.warning(f"{description} failed ({str(e)}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+    
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Rough token estimate (about four characters per token)"""
+        return len(text) // 4 + 1
+    
+    @staticmethod
+    def _record_usage(response: Any):
+        """Count the prompt and output tokens Gemini reports for a generation"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            GEMINI_TOKENS.inc(usage.prompt_token_count or 0, kind="prompt")
+            GEMINI_TOKENS.inc(usage.candidates_token_count or 0, kind="output")
+    
+    def _plan_embedding_batches(self, texts: List[str]) -> List[List[int]]:
+        """Group text indices into sub-batches bounded by item count and estimated tokens"""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = self._estimate_tokens(text)
+            if current and (
+                len(current) >= self.embed_batch_max_items
+                or current_tokens + tokens > self.embed_batch_max_tokens
+            ):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _embed_sub_batch(self, texts: List[str], batch_number: int, batch_count: int) -> List[List[float]]:
+        """Embed one sub-batch with retries and log its throughput"""
+        start_time = time.time()
+        with span("embed"):
+            result = self._with_retries(
+                lambda: self.client.models.embed_content(
+                    model=self.embedding_model,
+                    contents=texts
+                ),
+                f"Embedding sub-batch {batch_number}/{batch_count}"
             )
-            
-            # Extract embedding values from the response
-            if hasattr(result, 'embeddings') and result.embeddings:
-                embedding = result.embeddings[0]
-                # Handle ContentEmbedding object
+        GEMINI_TOKENS.inc(sum(self._estimate_tokens(text) for text in texts), kind="embed")
+        
+        embeddings = []
+        if hasattr(result, 'embeddings') and result.embeddings:
+            for embedding in result.embeddings:
                 if hasattr(embedding, 'values'):
-                    return list(embedding.values)
+                    embeddings.append(list(embedding.values))
                 else:
-                    logger.error(f"Embedding object attributes: {dir(embedding)}")
                     raise Exception("Embedding object has no 'values' attribute")
-            else:
-                logger.error(f"Response attributes: {dir(result)}")
-                raise Exception("No embeddings in response")
-                
-        except Exception as e:
-            logger.error(f"Error generating embedding: {str(e)}")
-            raise Exception(f"Failed to generate embedding: {str(e)}")
+        else:
+            raise Exception("No embeddings in response")
+        if len(embeddings) != len(texts):
+            raise Exception(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        
+        elapsed = time.time() - start_time
+        logger.info(
+            f"Embedded sub-batch {batch_number}/{batch_count}: {len(texts)} texts in {elapsed:.2f}s "
+            f"({len(texts) / max(elapsed, 1e-6):.1f} texts/sec)"
+        )
+        return embeddings
     
     def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
         """
-        Generate embeddings for multiple texts in a single API call for maximum speed
+        Generate embeddings for multiple texts with quota-aware, concurrent sub-batches
+        
+        Input is split into sub-batches bounded by item count and estimated
+        tokens, which run with bounded concurrency and are retried with
+        jittered backoff when throttled; results are reassembled in input order.
         
         Args:
             texts: List of texts to embed
-            
+        
         Returns:
             List of embedding vectors
         """
         try:
-            # Use batch embedding for much faster processing
-            result = self.client.models.embed_content(
-                model="text-embedding-004",
-                contents=texts
-            )
+            if not texts:
+                return []
+            
+            batches = self._plan_embedding_batches(texts)
+            if len(batches) == 1:
+                return self._embed_sub_batch(texts, 1, 1)
+            
+            start_time = time.time()
+            futures = [
+                self._embed_pool.submit(
+                    bind_context(self._embed_sub_batch, [texts[i] for i in batch], number, len(batches))
+                )
+                for number, batch in enumerate(batches, start=1)
+            ]
+            
+            embeddings: List[List[float]] = [[] for _ in range(len(texts))]
+            for batch, future in zip(batches, futures):
+                for i, embedding in zip(batch, future.result()):
+                    embeddings[i] = embedding
             
-            embeddings = []
-            if hasattr(result, 'embeddings') and result.embeddings:
-                for embedding in result.embeddings:
-                    if hasattr(embedding, 'values'):
-                        embeddings.append(list(embedding.values))
-                    else:
-                        raise Exception("Embedding object has no 'values' attribute")
-                return embeddings
-            else:
-                raise Exception("No embeddings in response")
-                
+            logger.info(f"Embedded {len(texts)} texts in {len(batches)} sub-batches in {time.time() - start_time:.2f}s")
+            return embeddings
+        
         except Exception as e:
             logger.error(f"Error generating batch embeddings: {str(e)}")
             raise Exception(f"Failed to generate batch embeddings: {str(e)}")
     
-    def answer_question_with_context(self, question: str, context_chunks: List[str]) -> str:
+    @staticmethod
+    def _build_answer_prompt(question: str, context_chunks: List[str]) -> str:
+        """User prompt asking for an answer to a question from retrieved chunks"""
+        chunks_text = "\n".join([f"- {chunk}" for chunk in context_chunks])
+        return f"""Question: {question}
+
+Context chunks:
+{chunks_text}
+
+Please analyze the provided context and answer the question. If the context doesn't contain enough information to answer the question completely, state that clearly in your response."""
+    
+    def generate_answer(self, question: str, context_chunks: List[str]) -> str:
         """
-        Answer a question using provided context chunks
+        Answer a question using provided context chunks, raising on failure
         
         Args:
             question: The question to answer
             context_chunks: List of relevant text chunks for context
-            
+        
         Returns:
             The answer string extracted from the AI response
         """
-        try:
-            # Prepare context
-            chunks_text = "\n".join([f"- {chunk}" for chunk in context_chunks])
-            
-            system_prompt = (
-                "You are a legal AI assistant. Based on the following text chunks, "
-                "answer the question accurately and comprehensively. "
-                "Provide your response as JSON with the following format: "
-                '{"answer": "your detailed answer", "condition": "any conditions or limitations", '
-                '"rationale": "reasoning behind your answer"}'
+        system_prompt = (
+            "You are a legal AI assistant. Based on the following text chunks, "
+            "answer the question accurately and comprehensively. "
+            "Provide your response as JSON with the following format: "
+            '{"answer": "your detailed answer", "condition": "any conditions or limitations", '
+            '"rationale": "reasoning behind your answer"}'
+        )
+        
+        user_prompt = self._build_answer_prompt(question, context_chunks)
+        
+        with span("generate"):
+            response = self._with_retries(
+                lambda: self.client.models.generate_content(
+                    model=self.answer_model,
+                    contents=[
+                        types.Content(role="user", parts=[types.Part(text=user_prompt)])
+                    ],
+                    config=types.GenerateContentConfig(
+                        system_instruction=system_prompt,
+                        response_mime_type="application/json",
+                        response_schema=LegalAnswer,
+                        temperature=0.0,  # Zero temperature for fastest, most consistent responses
+                        max_output_tokens=2048,  # Limit output for faster generation
+                    ),
+                ),
+                "Answer generation"
             )
-            
-            user_prompt = f"""Question: {question}
+        self._record_usage(response)
+        
+        if not response.text:
+            raise Exception("Empty response from Gemini")
+        
+        # Parse the JSON response
+        try:
+            json_response = json.loads(response.text)
+            answer = json_response.get("answer", "No answer provided")
+            return answer
+        except json.JSONDecodeError:
+            # If JSON parsing fails, return the raw response
+            logger.warning("Failed to parse JSON response, returning raw text")
+            return response.text
+    
+    def generate_answers_batch(self, questions: List[str], context_chunks: List[str]) -> List[str]:
+        """
+        Answer several questions that share context in a single call
+        
+        The union of the questions' chunks is sent once and the model returns a
+        JSON array of answers numbered by question.
+        
+        Args:
+            questions: The questions to answer
+            context_chunks: Union of the relevant chunks of every question
+        
+        Returns:
+            Answers in question order
+        
+        Raises:
+            ValueError: If the response is not a complete, well-formed answer array
+        """
+        system_prompt = (
+            "You are a legal AI assistant. Based on the following text chunks, "
+            "answer each numbered question accurately and comprehensively. "
+            "Provide your response as a JSON array with one object per question: "
+            '[{"question_number": 1, "answer": "your detailed answer", '
+            '"condition": "any conditions or limitations", "rationale": "reasoning behind your answer"}]'
+        )
+        
+        numbered_questions = "\n".join(f"{number}. {question}" for number, question in enumerate(questions, start=1))
+        chunks_text = "\n".join([f"- {chunk}" for chunk in context_chunks])
+        user_prompt = f"""Questions:
+{numbered_questions}
 
 Context chunks:
 {chunks_text}
 
-Please analyze the provided context and answer the question. If the context doesn't contain enough information to answer the question completely, state that clearly in your response."""
-            
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[
-                    types.Content(role="user", parts=[types.Part(text=user_prompt)])
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    response_mime_type="application/json",
-                    response_schema=LegalAnswer,
-                    temperature=0.0,  # Zero temperature for fastest, most consistent responses
-                    max_output_tokens=2048,  # Limit output for faster generation
+Please analyze the provided context and answer every question, each on its own. If the context doesn't contain enough information to answer a question completely, state that clearly in that answer."""
+        
+        start_time = time.time()
+        with span("generate"):
+            response = self._with_retries(
+                lambda: self.client.models.generate_content(
+                    model=self.answer_model,
+                    contents=[
+                        types.Content(role="user", parts=[types.Part(text=user_prompt)])
+                    ],
+                    config=types.GenerateContentConfig(
+                        system_instruction=system_prompt,
+                        response_mime_type="application/json",
+                        response_schema=list[NumberedLegalAnswer],
+                        temperature=0.0,
+                        max_output_tokens=min(8192, 2048 * len(questions)),
+                    ),
                 ),
+                f"Batched answer generation for {len(questions)} questions"
             )
-            
-            if not response.text:
-                raise Exception("Empty response from Gemini")
-            
-            # Parse the JSON response
-            try:
-                json_response = json.loads(response.text)
-                answer = json_response.get("answer", "No answer provided")
-                return answer
-            except json.JSONDecodeError:
-                # If JSON parsing fails, return the raw response
-                logger.warning("Failed to parse JSON response, returning raw text")
-                return response.text
-                
-        except Exception as e:
-            logger.error(f"Error answering question: {str(e)}")
-            return f"Error generating answer: {str(e)}"
+        self._record_usage(response)
+        
+        if not response.text:
+            raise ValueError("Empty response from Gemini")
+        
+        try:
+            items = json.loads(response.text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Unparseable batched answer: {str(e)}")
+        
+        answers: Dict[int, str] = {}
+        for item in items if isinstance(items, list) else []:
+            if isinstance(item, dict) and isinstance(item.get("question_number"), int) and item.get("answer"):
+                answers[item["question_number"]] = item["answer"]
+        missing = [number for number in range(1, len(questions) + 1) if number not in answers]
+        if missing:
+            raise ValueError(f"Batched answer is missing questions {missing}")
+        
+        logger.info(
+            f"Answered {len(questions)} questions in one call with {len(context_chunks)} shared chunks "
+            f"in {time.time() - start_time:.2f}s"
+        )
+        return [answers[number] for number in range(1, len(questions) + 1)]
     
-    def generate_text(self, prompt: str) -> str:
+    def stream_answer_with_context(self, question: str, context_chunks: List[str]) -> Iterator[str]:
         """
-        Generate text using Gemini
+        Stream an answer to a question as text fragments while Gemini generates it
+        
+        The answer is requested as plain text rather than the LegalAnswer JSON
+        schema, so each fragment can be shown to the caller as it arrives.
         
         Args:
-            prompt: Input prompt
-            
-        Returns:
-            Generated text
+            question: The question to answer
+            context_chunks: List of relevant text chunks for context
+        
+        Yields:
+            Answer text fragments in generation order
         """
+        system_prompt = (
+            "You are a legal AI assistant. Based on the following text chunks, "
+            "answer the question accurately and comprehensively. "
+            "Respond with the answer text only, including any conditions or limitations, "
+            "without JSON or markdown formatting."
+        )
+        
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
+            stream = self.client.models.generate_content_stream(
+                model=self.answer_model,
+                contents=[
+                    types.Content(role="user", parts=[types.Part(text=self._build_answer_prompt(question, context_chunks))])
+                ],
+                config=types.GenerateContentConfig(
+                    system_instruction=system_prompt,
+                    temperature=0.0,
+                    max_output_tokens=2048,
+                ),
             )
-            
-            return response.text or "No response generated"
-            
+            # Generation time excludes the consumer's time between fragments
+            generation_time = 0.0
+            last_chunk = None
+            try:
+                while True:
+                    start_time = time.perf_counter()
+                    chunk = next(stream, None)
+                    generation_time += time.perf_counter() - start_time
+                    if chunk is None:
+                        break
+                    last_chunk = chunk
+                    if chunk.text:
+                        yield chunk.text
+            finally:
+                record_stage("generate", generation_time)
+            # Usage is reported on the final chunk
+            self._record_usage(last_chunk)
+        
         except Exception as e:
-            logger.error(f"Error generating text: {str(e)}")
-            raise Exception(f"Failed to generate text: {str(e)}")
+            logger.error(f"Error streaming answer: {str(e)}")
+            raise Exception(f"Failed to stream answer: {str(e)}")
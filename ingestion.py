@@ -0,0 +1,250 @@
+import os
+import time
+import asyncio
+import contextlib
+import concurrent.futures
+import logging
+from typing import Any, Dict, List, Optional
+from document_processor import DocumentProcessor
+from text_chunker import TextChunker, TextChunk
+from gemini_client import GeminiClient
+from vector_store import VectorStore
+from ingestion_registry import IngestionRegistry
+from lexical_index import LexicalIndex
+from metrics import bind_context, CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+class EmptyDocumentError(ValueError):
+    """Raised when a document yields no text or no chunks"""
+
+class DocumentIngestor:
+    """Downloads, chunks and indexes documents, skipping contents that are already indexed"""
+    
+    def __init__(
+        self,
+        document_processor: DocumentProcessor,
+        text_chunker: TextChunker,
+        gemini_client: GeminiClient,
+        vector_store: VectorStore,
+        ingestion_registry: IngestionRegistry,
+        io_pool: concurrent.futures.Executor,
+        cpu_pool: concurrent.futures.Executor,
+        lexical_index: Optional[LexicalIndex] = None
+    ):
+        self.document_processor = document_processor
+        self.text_chunker = text_chunker
+        self.gemini_client = gemini_client
+        self.vector_store = vector_store
+        self.ingestion_registry = ingestion_registry
+        self.io_pool = io_pool
+        self.cpu_pool = cpu_pool
+        self.lexical_index = lexical_index
+        
+        # Chunks per embedding micro-batch and batches buffered between pipeline stages
+        self.embed_batch_size = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+        self.queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+        
+        # Ingestions in progress by document URL, shared by concurrent requests
+        self._inflight: Dict[str, asyncio.Task] = {}
+    
+    def _content_key(self, content_hash: str) -> str:
+        """Content key for the current chunker parameters and embedding model"""
+        return IngestionRegistry.make_content_key(
+            content_hash,
+            self.text_chunker.chunk_size,
+            self.text_chunker.overlap_size,
+            self.gemini_client.embedding_model,
+            self.text_chunker.mode
+        )
+    
+    async def ingest(self, document_url: str) -> Dict[str, Any]:
+        """
+        Make sure a document's chunks are indexed, doing as little work as possible
+        
+        A conditional GET answered with 304, or a download whose content key is
+        already recorded for this URL, goes straight to retrieval without
+        re-chunking, re-embedding or re-upserting. Concurrent calls for the
+        same URL share one ingestion, since each document is stored under one
+        per-URL namespace that a second ingestion would clear mid-write.
+        
+        Args:
+            document_url: URL to the PDF or DOCX document
+        
+        Returns:
+            Dict with document_url, content_hash, content_key, chunk_count and whether the index was reused
+        """
+        task = self._inflight.get(document_url)
+        if task is None:
+            task = asyncio.ensure_future(self._ingest(document_url))
+            self._inflight[document_url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(document_url, None))
+        # Shielded so a cancelled request does not abort the ingestion other requests wait on
+        return await asyncio.shield(task)
+    
+    async def _ingest(self, document_url: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        entry = await loop.run_in_executor(self.io_pool, self.ingestion_registry.get, document_url)
+        if entry is not None and not await loop.run_in_executor(self.io_pool, self.vector_store.has_document, document_url):
+            # The registry outlived the store's copy (e.g. a restarted in-process index)
+            entry = None
+        
+        # Only revalidate when the stored vectors match the current chunker and model
+        entry_current = entry is not None and entry["content_key"] == self._content_key(entry["content_hash"])
+        document = await self.document_processor.fetch_document_async(
+            document_url,
+            etag=entry["etag"] if entry_current else None,
+            last_modified=entry["last_modified"] if entry_current else None
+        )
+        
+        if document is None:
+            logger.info(f"Reusing indexed chunks for unmodified document: {document_url}")
+            CACHE_LOOKUPS.inc(cache="document", result="hit")
+            return {
+                "document_url": document_url,
+                "content_hash": entry["content_hash"],
+                "content_key": entry["content_key"],
+                "chunk_count": entry["chunk_count"],
+                "cached": True
+            }
+        
+        content_key = self._content_key(document["content_hash"])
+        if entry is not None and entry["content_key"] == content_key:
+            logger.info(f"Reusing indexed chunks for unchanged content: {document_url}")
+            CACHE_LOOKUPS.inc(cache="document", result="hit")
+            await loop.run_in_executor(
+                self.io_pool, self._record, document_url, document, content_key, entry["chunk_count"]
+            )
+            return {
+                "document_url": document_url,
+                "content_hash": document["content_hash"],
+                "content_key": content_key,
+                "chunk_count": entry["chunk_count"],
+                "cached": True
+            }
+        
+        CACHE_LOOKUPS.inc(cache="document", result="miss")
+        # Storing clears the URL's previous chunks first, so a failed re-ingest must not leave the old record behind
+        await loop.run_in_executor(self.io_pool, self.ingestion_registry.invalidate, document_url)
+        chunk_count = await self._run_pipeline(document, document_url)
+        await loop.run_in_executor(
+            self.io_pool, self._record, document_url, document, content_key, chunk_count
+        )
+        return {
+            "document_url": document_url,
+            "content_hash": document["content_hash"],
+            "content_key": content_key,
+            "chunk_count": chunk_count,
+            "cached": False
+        }
+    
+    async def _run_pipeline(self, document: Dict[str, Any], document_url: str) -> int:
+        """
+        Extract, chunk, embed and upsert a document as overlapping streaming stages
+        
+        Pages flow into an incremental chunker, chunks are embedded in
+        micro-batches as they are produced, and embedded batches are upserted
+        while later pages are still being extracted. Bounded queues between the
+        stages provide backpressure, and a failure in any stage cancels the rest.
+        
+        Returns:
+            Number of chunks stored
+        """
+        loop = asyncio.get_running_loop()
+        chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        upsert_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        start_time = time.time()
+        
+        async def chunk_stage():
+            chunker = self.text_chunker.incremental()
+            batch: List[TextChunk] = []
+            has_text = False
+            pages = self.document_processor.iter_pages_async(document, self.cpu_pool)
+            async with contextlib.aclosing(pages):
+                async for page_text in pages:
+                    has_text = has_text or bool(page_text.strip())
+                    for chunk in chunker.feed(page_text):
+                        batch.append(chunk)
+                        if len(batch) >= self.embed_batch_size:
+                            await chunk_queue.put(batch)
+                            batch = []
+            batch.extend(chunker.finish())
+            if batch:
+                await chunk_queue.put(batch)
+            await chunk_queue.put(None)
+            
+            if not has_text:
+                raise EmptyDocumentError("No text content found in the document")
+            logger.info(f"Chunked document into {chunker.chunk_count} chunks in {time.time() - start_time:.2f} seconds")
+        
+        async def embed_stage():
+            start_index = 0
+            while (batch := await chunk_queue.get()) is not None:
+                texts = [chunk.text for chunk in batch]
+                # Bound to this context so embedding spans reach the request's timings
+                embeddings = await loop.run_in_executor(
+                    self.io_pool, bind_context(self.vector_store.embed_chunks, texts, self.gemini_client)
+                )
+                await upsert_queue.put((texts, embeddings, start_index, [chunk.metadata() for chunk in batch]))
+                start_index += len(batch)
+            await upsert_queue.put(None)
+        
+        stored = 0
+        
+        async def upsert_stage():
+            nonlocal stored
+            while (item := await upsert_queue.get()) is not None:
+                batch, embeddings, start_index, metadata = item
+                await loop.run_in_executor(
+                    self.io_pool,
+                    bind_context(
+                        self.vector_store.upsert_embedded_chunks,
+                        document_url,
+                        batch,
+                        embeddings,
+                        start_index,
+                        metadata
+                    )
+                )
+                if self.lexical_index is not None:
+                    self.lexical_index.add_chunks(document_url, batch, start_index)
+                stored += len(batch)
+        
+        logger.info("Streaming document through extract/chunk/embed/upsert pipeline")
+        await loop.run_in_executor(self.io_pool, self.vector_store.begin_document, document_url)
+        if self.lexical_index is not None:
+            self.lexical_index.begin_document(document_url)
+        try:
+            try:
+                async with asyncio.TaskGroup() as stages:
+                    stages.create_task(chunk_stage())
+                    stages.create_task(embed_stage())
+                    stages.create_task(upsert_stage())
+            except ExceptionGroup as group:
+                # Surface the stage's own error (e.g. EmptyDocumentError) rather than the group
+                raise group.exceptions[0]
+            
+            if stored == 0:
+                raise EmptyDocumentError("Failed to create text chunks from document")
+            await loop.run_in_executor(self.io_pool, self.vector_store.finish_document, document_url)
+        except BaseException:
+            # Drop the partly stored document so neither its buffers nor its vectors outlive the failed ingestion
+            await loop.run_in_executor(self.io_pool, self.vector_store.abort_document, document_url)
+            if self.lexical_index is not None:
+                self.lexical_index.abort_document(document_url)
+            raise
+        if self.lexical_index is not None:
+            await loop.run_in_executor(self.io_pool, self.lexical_index.finish_document, document_url)
+        logger.info(f"Stored {stored} chunks in {time.time() - start_time:.2f} seconds")
+        return stored
+    
+    def _record(self, document_url: str, document: Dict[str, Any], content_key: str, chunk_count: int):
+        """Store the ingestion record together with the latest validators"""
+        self.ingestion_registry.record(
+            document_url,
+            document["content_hash"],
+            content_key,
+            chunk_count,
+            etag=document["etag"],
+            last_modified=document["last_modified"]
+        )
@@ -0,0 +1,96 @@
+import os
+import time
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+from sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+class IngestionRegistry(SQLiteStore):
+    """Persistent record of which document contents are already indexed, keyed by content hash"""
+    
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Initialize the registry database
+        
+        Args:
+            db_path: SQLite file shared by all workers on the host
+        """
+        cache_dir = os.getenv("CACHE_DIR", ".cache")
+        super().__init__(db_path or os.getenv("INGESTION_REGISTRY_PATH", os.path.join(cache_dir, "ingestion.db")), [
+            """
+            CREATE TABLE IF NOT EXISTS ingested_documents (
+                document_url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                content_key TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                chunk_count INTEGER NOT NULL,
+                indexed_at INTEGER NOT NULL
+            )
+            """
+        ], synchronous=None)
+        logger.info(f"Ingestion registry initialized at: {self.db_path}")
+    
+    @staticmethod
+    def make_content_key(
+        content_hash: str,
+        chunk_size: int,
+        overlap_size: int,
+        embedding_model: str,
+        chunk_mode: str = "words"
+    ) -> str:
+        """Combine the content hash with everything that changes the stored vectors"""
+        key_source = f"{content_hash}|{chunk_size}|{overlap_size}|{embedding_model}"
+        # The default word windows keep the original key so existing records stay valid
+        if chunk_mode != "words":
+            key_source += f"|{chunk_mode}"
+        return hashlib.sha256(key_source.encode()).hexdigest()
+    
+    def get(self, document_url: str) -> Optional[Dict[str, Any]]:
+        """Return the last ingestion record for a document URL, if any"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, content_key, etag, last_modified, chunk_count, indexed_at "
+                "FROM ingested_documents WHERE document_url = ?",
+                (document_url,)
+            ).fetchone()
+        
+        if row is None:
+            return None
+        return {
+            "document_url": document_url,
+            "content_hash": row[0],
+            "content_key": row[1],
+            "etag": row[2],
+            "last_modified": row[3],
+            "chunk_count": row[4],
+            "indexed_at": row[5]
+        }
+    
+    def record(
+        self,
+        document_url: str,
+        content_hash: str,
+        content_key: str,
+        chunk_count: int,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None
+    ):
+        """Record that a document's chunks are indexed"""
+        self._write(
+            "INSERT OR REPLACE INTO ingested_documents "
+            "(document_url, content_hash, content_key, etag, last_modified, chunk_count, indexed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (document_url, content_hash, content_key, etag, last_modified, chunk_count, int(time.time()))
+        )
+    
+    def invalidate(self, document_url: str):
+        """Forget a document so its next request re-ingests it"""
+        self._write("DELETE FROM ingested_documents WHERE document_url = ?", (document_url,))
+    
+    def clear(self):
+        """Forget every ingested document"""
+        self._write("DELETE FROM ingested_documents")
+        logger.info("Cleared ingestion registry")
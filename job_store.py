@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+from typing import Any, Dict, List, Optional
+from sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+class JobStore(SQLiteStore):
+    """
+    Persistent store for asynchronous question-answering jobs
+    
+    Each job records its status, current stage and every answer as soon as it
+    is produced, so results and partial progress survive a worker restart.
+    Jobs are owned by the process running them; unfinished jobs whose owner
+    is gone can be claimed by another worker and resumed.
+    """
+    
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Initialize the job database
+        
+        Args:
+            db_path: SQLite file shared by all workers on the host
+        """
+        cache_dir = os.getenv("CACHE_DIR", ".cache")
+        # The random suffix tells a restarted process apart from its predecessor with the same PID
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        super().__init__(db_path or os.getenv("JOB_STORE_PATH", os.path.join(cache_dir, "jobs.db")), [
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                document_url TEXT NOT NULL,
+                questions TEXT NOT NULL,
+                answers TEXT NOT NULL,
+                error TEXT,
+                owner TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)"
+        ], synchronous=None)
+        logger.info(f"Job store initialized at: {self.db_path}")
+    
+    def create(self, document_url: str, questions: List[str]) -> str:
+        """Record a new queued job owned by this process and return its ID"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, status, stage, document_url, questions, answers, error, owner, created_at, updated_at) "
+                "VALUES (?, 'queued', 'queued', ?, ?, ?, NULL, ?, ?, ?)",
+                (job_id, document_url, json.dumps(questions), json.dumps([None] * len(questions)), self.owner, now, now)
+            )
+            self._conn.commit()
+        return job_id
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job with its answers so far, if it exists"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, stage, document_url, questions, answers, error, created_at, updated_at "
+                "FROM jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        
+        if row is None:
+            return None
+        return {
+            "job_id": job_id,
+            "status": row[0],
+            "stage": row[1],
+            "document_url": row[2],
+            "questions": json.loads(row[3]),
+            "answers": json.loads(row[4]),
+            "error": row[5],
+            "created_at": row[6],
+            "updated_at": row[7]
+        }
+    
+    def update(self, job_id: str, status: Optional[str] = None, stage: Optional[str] = None, error: Optional[str] = None):
+        """Move a job to a new status and/or stage"""
+        self._write(
+            "UPDATE jobs SET status = COALESCE(?, status), stage = COALESCE(?, stage), "
+            "error = COALESCE(?, error), updated_at = ? WHERE job_id = ?",
+            (status, stage, error, time.time(), job_id)
+        )
+    
+    def set_answer(self, job_id: str, index: int, answer: str):
+        """Record the answer to one question of a job"""
+        with self._lock:
+            row = self._conn.execute("SELECT answers FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            answers = json.loads(row[0])
+            answers[index] = answer
+            self._conn.execute(
+                "UPDATE jobs SET answers = ?, updated_at = ? WHERE job_id = ?",
+                (json.dumps(answers), time.time(), job_id)
+            )
+            self._conn.commit()
+    
+    def _owner_alive(self, owner: str) -> bool:
+        """Whether the process that owns a job is still running on this host"""
+        if owner == self.owner:
+            return True
+        host, pid, _ = owner.rsplit(":", 2) if owner.count(":") >= 2 else ("", "", "")
+        if host != socket.gethostname() or not pid.isdigit() or int(pid) == os.getpid():
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+    
+    def claim_orphaned(self) -> List[str]:
+        """Take over unfinished jobs whose owning process has exited and return their IDs"""
+        claimed = []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, owner FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+            for job_id, owner in rows:
+                if self._owner_alive(owner):
+                    continue
+                # Compare-and-set so only one restarted worker resumes each job
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET owner = ?, status = 'queued', updated_at = ? WHERE job_id = ? AND owner = ?",
+                    (self.owner, time.time(), job_id, owner)
+                )
+                if cursor.rowcount == 1:
+                    claimed.append(job_id)
+            self._conn.commit()
+        return claimed
@@ -0,0 +1,61 @@
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+from job_store import JobStore
+
+logger = logging.getLogger(__name__)
+
+class JobRunner:
+    """Bounded pool of background workers that run queued jobs from the job store"""
+    
+    def __init__(self, job_store: JobStore, handler: Callable[[str], Awaitable[None]], workers: Optional[int] = None):
+        """
+        Initialize the runner
+        
+        Args:
+            job_store: Persistent store holding the jobs
+            handler: Coroutine function running one job to completion by ID
+            workers: Jobs run at the same time (JOB_WORKERS)
+        """
+        self.job_store = job_store
+        self.handler = handler
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "2"))
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+    
+    def start(self):
+        """Start the workers and resume jobs left unfinished by a previous worker process"""
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        for job_id in self.job_store.claim_orphaned():
+            logger.info(f"Resuming unfinished job {job_id}")
+            self._queue.put_nowait(job_id)
+        logger.info(f"Job runner started with {self.workers} workers")
+    
+    def submit(self, job_id: str):
+        """Queue a stored job for execution"""
+        self._queue.put_nowait(job_id)
+    
+    @property
+    def queued(self) -> int:
+        """Jobs waiting for a free worker"""
+        return self._queue.qsize()
+    
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self.handler(job_id)
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}")
+                await asyncio.to_thread(self.job_store.update, job_id, "failed", None, str(e))
+            finally:
+                self._queue.task_done()
+    
+    async def close(self):
+        """Stop the workers; interrupted jobs stay unfinished and are resumed on the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.job_store.close()
+        logger.info("Job runner closed")
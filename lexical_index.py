@@ -0,0 +1,256 @@
+import os
+import re
+import math
+import time
+import logging
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Words, keeping clause numbers and hyphenated or slashed terms (3.1.2, pre-existing, and/or) whole
+_TOKEN_PATTERN = re.compile(r'\w+(?:[.\-/]\w+)*')
+
+# Question words that carry no lexical signal
+_STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how i if in is it its of on or
+that the their there this to under what when where which who whom why will with
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased index terms of a text"""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+def reciprocal_rank_fusion(rankings: List[List[Dict[str, Any]]], top_k: int, k: int = 60) -> List[Dict[str, Any]]:
+    """
+    Fuse ranked match lists by reciprocal rank fusion
+    
+    Args:
+        rankings: Match lists (id, chunk_index, text, score), best first
+        top_k: Number of fused matches to return
+        k: RRF damping constant
+    
+    Returns:
+        Fused matches, best first, with score set to the fused score
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, match in enumerate(ranking):
+            key = match["chunk_index"] if match.get("chunk_index") is not None else match["id"]
+            if key not in fused:
+                fused[key] = {**match, "score": 0.0}
+            fused[key]["score"] += 1.0 / (k + rank + 1)
+    return sorted(fused.values(), key=lambda match: -match["score"])[:top_k]
+
+
+class DocumentIndex:
+    """
+    BM25 inverted index over one document's chunks
+    
+    Postings are stored in CSR form: for term t, chunk numbers and term
+    frequencies live at offsets[t]:offsets[t + 1] of two flat int32 arrays,
+    sorted by chunk, so the index is a handful of arrays rather than
+    per-term Python lists.
+    """
+    
+    def __init__(self, chunk_ids: List[str], texts: List[str], k1: float = 1.2, b: float = 0.75):
+        self.chunk_ids = chunk_ids
+        self.texts = texts
+        self.k1 = k1
+        
+        vocabulary: Dict[str, int] = {}
+        term_ids = array("i")
+        chunk_numbers = array("i")
+        frequencies = array("i")
+        lengths = array("i")
+        for chunk_number, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                chunk_numbers.append(chunk_number)
+                frequencies.append(frequency)
+        
+        self.vocabulary = vocabulary
+        term_array = np.frombuffer(term_ids, dtype=np.int32)
+        # A stable sort keeps each term's postings in chunk order
+        order = np.argsort(term_array, kind="stable")
+        self.postings = np.frombuffer(chunk_numbers, dtype=np.int32)[order]
+        self.frequencies = np.frombuffer(frequencies, dtype=np.int32)[order].astype(np.float32)
+        document_frequencies = np.bincount(term_array, minlength=len(vocabulary))
+        self.offsets = np.concatenate(([0], np.cumsum(document_frequencies))).astype(np.int64)
+        
+        chunk_count = len(texts)
+        self.idf = np.log1p((chunk_count - document_frequencies + 0.5) / (document_frequencies + 0.5)).astype(np.float32)
+        # idf of a term that appears in no chunk, used when judging query coverage
+        self.max_idf = math.log1p((chunk_count + 0.5) / 0.5)
+        chunk_lengths = np.frombuffer(lengths, dtype=np.int32).astype(np.float32)
+        average_length = float(chunk_lengths.mean()) if chunk_count else 1.0
+        self.length_norm = k1 * (1 - b + b * chunk_lengths / max(average_length, 1.0))
+    
+    def search(self, terms: List[str], top_k: int) -> Tuple[List[Tuple[int, float]], float]:
+        """
+        Score chunks against query terms
+        
+        Returns:
+            (chunk number, BM25 score) of the best chunks, and the share of the
+            query's idf weight found in the best chunk
+        """
+        scores = np.zeros(len(self.texts), dtype=np.float32)
+        known = [self.vocabulary[term] for term in terms if term in self.vocabulary]
+        for term_id in known:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            chunks = self.postings[start:end]
+            frequencies = self.frequencies[start:end]
+            scores[chunks] += self.idf[term_id] * frequencies * (self.k1 + 1) / (frequencies + self.length_norm[chunks])
+        
+        k = min(top_k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return [], 0.0
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        # Coverage: idf mass of the query terms present in the best chunk
+        best = top[0]
+        total_weight = sum(float(self.idf[self.vocabulary[term]]) if term in self.vocabulary else self.max_idf for term in terms)
+        covered_weight = 0.0
+        for term_id in known:
+            chunks = self.postings[self.offsets[term_id]:self.offsets[term_id + 1]]
+            position = np.searchsorted(chunks, best)
+            if position < len(chunks) and chunks[position] == best:
+                covered_weight += float(self.idf[term_id])
+        
+        return [(int(chunk), float(scores[chunk])) for chunk in top], covered_weight / total_weight
+
+
+class LexicalIndex:
+    """
+    In-process BM25 indexes of ingested documents, kept next to the vector store
+    
+    Indexes are built from the chunks while a document is ingested and
+    rebuilt on demand from the vector store's chunk texts (e.g. after a
+    restart, or for a document another worker ingested). A search is
+    confident when its best chunk holds nearly all of the query's weight
+    and clearly outscores the runner-up, so retrieval can skip embedding.
+    """
+    
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        max_documents: Optional[int] = None,
+        min_coverage: Optional[float] = None,
+        min_margin: Optional[float] = None
+    ):
+        """
+        Initialize the lexical index
+        
+        Args:
+            vector_store: Store whose chunk IDs and texts the index mirrors
+            max_documents: Documents kept in memory (LEXICAL_INDEX_MAX_DOCUMENTS)
+            min_coverage: Share of query idf weight the best chunk must hold for the fast path (LEXICAL_FAST_PATH_COVERAGE)
+            min_margin: Ratio of the best to the second-best score for the fast path (LEXICAL_FAST_PATH_MARGIN)
+        """
+        self.vector_store = vector_store
+        self.max_documents = max_documents or int(os.getenv("LEXICAL_INDEX_MAX_DOCUMENTS", "64"))
+        self.min_coverage = min_coverage if min_coverage is not None else float(os.getenv("LEXICAL_FAST_PATH_COVERAGE", "0.85"))
+        self.min_margin = min_margin if min_margin is not None else float(os.getenv("LEXICAL_FAST_PATH_MARGIN", "1.5"))
+        
+        self._documents: "OrderedDict[str, DocumentIndex]" = OrderedDict()
+        # Chunk texts of documents being ingested, indexed by finish_document
+        self._pending: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+    
+    def begin_document(self, document_url: str):
+        """Start (re-)indexing a document"""
+        document_hash = self.vector_store._generate_document_hash(document_url)
+        with self._lock:
+            self._pending[document_hash] = []
+            self._documents.pop(document_hash, None)
+    
+    def add_chunks(self, document_url: str, chunks: List[str], start_index: int = 0):
+        """Add a batch of a document's chunks, in any batch order"""
+        document_hash = self.vector_store._generate_document_hash(document_url)
+        with self._lock:
+            pending = self._pending.setdefault(document_hash, [])
+            if len(pending) < start_index + len(chunks):
+                pending.extend([""] * (start_index + len(chunks) - len(pending)))
+            pending[start_index:start_index + len(chunks)] = chunks
+    
+    def abort_document(self, document_url: str):
+        """Drop the chunks of a document whose ingestion failed"""
+        with self._lock:
+            self._pending.pop(self.vector_store._generate_document_hash(document_url), None)
+    
+    def finish_document(self, document_url: str):
+        """Build the index of a document whose chunks have all been added"""
+        document_hash = self.vector_store._generate_document_hash(document_url)
+        with self._lock:
+            texts = self._pending.pop(document_hash, None)
+        if texts:
+            self._build(document_hash, texts)
+    
+    def _build(self, document_hash: str, texts: List[str]) -> DocumentIndex:
+        start_time = time.time()
+        chunk_ids = [self.vector_store._generate_chunk_id(text, document_hash, i) for i, text in enumerate(texts)]
+        index = DocumentIndex(chunk_ids, texts)
+        with self._lock:
+            self._documents[document_hash] = index
+            self._documents.move_to_end(document_hash)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+        logger.info(
+            f"Built lexical index for document {document_hash}: {len(texts)} chunks, "
+            f"{len(index.vocabulary)} terms in {time.time() - start_time:.2f} seconds"
+        )
+        return index
+    
+    def _get_document(self, document_url: str) -> Optional[DocumentIndex]:
+        document_hash = self.vector_store._generate_document_hash(document_url)
+        with self._lock:
+            index = self._documents.get(document_hash)
+            if index is not None:
+                self._documents.move_to_end(document_hash)
+                return index
+        texts = self.vector_store.get_document_chunks(document_url)
+        return self._build(document_hash, texts) if texts else None
+    
+    def search(self, query: str, document_url: str, top_k: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        BM25 search within one document
+        
+        Args:
+            query: Query text
+            document_url: Source document URL
+            top_k: Number of matches to return
+        
+        Returns:
+            Matches (id, chunk_index, text, score) best first, and whether the
+            best match is confident enough to answer from without vector search
+        """
+        try:
+            index = self._get_document(document_url)
+        except Exception as e:
+            logger.warning(f"Lexical index unavailable, using vector search only: {str(e)}")
+            return [], False
+        terms = list(dict.fromkeys(term for term in tokenize(query) if term not in _STOPWORDS))
+        if index is None or not terms:
+            return [], False
+        
+        results, coverage = index.search(terms, top_k)
+        matches = [
+            {"id": index.chunk_ids[chunk], "chunk_index": chunk, "text": index.texts[chunk], "score": score}
+            for chunk, score in results
+        ]
+        margin = results[0][1] / results[1][1] if len(results) > 1 else float("inf")
+        confident = bool(results) and coverage >= self.min_coverage and margin >= self.min_margin
+        return matches, confident
+    
+    def clear(self):
+        """Drop every in-memory index"""
+        with self._lock:
+            self._documents.clear()
+            self._pending.clear()
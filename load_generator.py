@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Load generator for the HackRx API
+Replays a JSONL log of /hackrx/run requests against a deployment (or the app
+running locally against the fake services) in a closed or open loop, and
+reports latency percentiles, error rates and throughput over time
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import requests
+from deployment_checker import DeploymentChecker
+
+# Error rates are compared in absolute terms: a rise of more than one percentage point is a regression
+ERROR_RATE_SLACK = 0.01
+
+def load_request_log(path: str) -> List[Dict[str, Any]]:
+    """
+    Read a JSONL request log
+    
+    Each line is either a request body ({"documents": ..., "questions": [...]})
+    or a captured request with the body under "body" and an optional "path"
+    (default /hackrx/run). Lines that are neither are skipped with a warning.
+    
+    Returns:
+        Requests as {"path", "body"} in log order
+    """
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"  ⚠️  line {line_number}: invalid JSON ({e}), skipped")
+                continue
+            body = record.get("body", record) if isinstance(record, dict) else None
+            if not isinstance(body, dict) or "documents" not in body or not isinstance(body.get("questions"), list):
+                print(f"  ⚠️  line {line_number}: not a documents/questions request, skipped")
+                continue
+            records.append({"path": record.get("path", "/hackrx/run"), "body": body})
+    return records
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """Stage durations in milliseconds from a Server-Timing header"""
+    stages = {}
+    for entry in header.split(","):
+        parts = [part.strip() for part in entry.split(";")]
+        for part in parts[1:]:
+            if part.startswith("dur="):
+                try:
+                    stages[parts[0]] = float(part[4:])
+                except ValueError:
+                    pass
+    return stages
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """Mean, p50/p90/p95/p99 and max of latencies in milliseconds"""
+    if not latencies:
+        return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p90_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(latencies)
+    
+    def at(quantile: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))]
+    
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered),
+        "p50_ms": at(0.50),
+        "p90_ms": at(0.90),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99),
+        "max_ms": ordered[-1]
+    }
+
+
+class LoadGenerator(DeploymentChecker):
+    """
+    Replays logged requests against base_url
+    
+    In a closed loop, `concurrency` clients each send their next request as
+    soon as the previous one returns. In an open loop, requests arrive at
+    `rate` per second (evenly spaced or Poisson) whatever the response times;
+    at most `concurrency` are in flight and the rest queue, and latency is
+    measured from the scheduled arrival so queueing shows up in it.
+    """
+    
+    def __init__(
+        self,
+        base_url: Optional[str],
+        records: List[Dict[str, Any]],
+        concurrency: int = 4,
+        rate: Optional[float] = None,
+        arrival: str = "constant",
+        duration: Optional[float] = None,
+        timeout: float = 120.0,
+        seed: int = 7
+    ):
+        super().__init__(base_url)
+        self.records = records
+        self.concurrency = concurrency
+        self.rate = rate
+        self.arrival = arrival
+        self.duration = duration
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.samples: List[Dict[str, Any]] = []
+        self._samples_lock = threading.Lock()
+        self._local = threading.local()
+        self._start_time = 0.0
+    
+    def _session(self) -> requests.Session:
+        """One keep-alive session per worker thread"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers.update({"Authorization": f"Bearer {self.api_token}", "Content-Type": "application/json"})
+        return session
+    
+    def _schedule(self) -> Iterator[Dict[str, Any]]:
+        """Logged requests in order; cycled until the duration runs out if one is set, else replayed once"""
+        while True:
+            for record in self.records:
+                if self.duration is not None and time.perf_counter() - self._start_time >= self.duration:
+                    return
+                yield record
+            if self.duration is None:
+                return
+    
+    def _send(self, record: Dict[str, Any], scheduled_time: float):
+        sample = {"start_s": scheduled_time - self._start_time, "questions": len(record["body"]["questions"]), "stages": {}}
+        try:
+            response = self._session().post(f"{self.base_url}{record['path']}", json=record["body"], timeout=self.timeout)
+            sample["status"] = str(response.status_code)
+            sample["stages"] = parse_server_timing(response.headers.get("server-timing", ""))
+            if response.status_code == 200:
+                answers = response.json().get("answers", [])
+                sample["failed_answers"] = sum(1 for answer in answers if answer.startswith("Error processing question"))
+        except Exception as e:
+            sample["status"] = type(e).__name__
+        end_time = time.perf_counter()
+        sample["latency_ms"] = (end_time - scheduled_time) * 1000
+        sample["end_s"] = end_time - self._start_time
+        with self._samples_lock:
+            self.samples.append(sample)
+    
+    def _run_closed_loop(self):
+        schedule = self._schedule()
+        schedule_lock = threading.Lock()
+        
+        def client():
+            while True:
+                with schedule_lock:
+                    record = next(schedule, None)
+                if record is None:
+                    return
+                self._send(record, time.perf_counter())
+        
+        threads = [threading.Thread(target=client, name=f"client-{i}") for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    
+    def _run_open_loop(self):
+        next_arrival = self._start_time
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="client") as executor:
+            for record in self._schedule():
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self._send, record, next_arrival)
+                gap = self.random.expovariate(self.rate) if self.arrival == "poisson" else 1.0 / self.rate
+                next_arrival += gap
+    
+    def run(self) -> float:
+        """
+        Replay the log
+        
+        Returns:
+            Elapsed seconds from the first request until the last response
+        """
+        self.samples = []
+        mode = f"open loop, {self.rate:g} req/s {self.arrival}" if self.rate else "closed loop"
+        span = f"for {self.duration:g}s" if self.duration is not None else f"{len(self.records)} requests"
+        print(f"\n🚦 Replaying {span} against {self.base_url} ({mode}, concurrency {self.concurrency})")
+        self._start_time = time.perf_counter()
+        if self.rate:
+            self._run_open_loop()
+        else:
+            self._run_closed_loop()
+        return time.perf_counter() - self._start_time
+    
+    def summarize(self, elapsed: float, interval: float) -> Dict[str, Any]:
+        """Overall and per-interval latency, errors and throughput, and per-stage server timings"""
+        ok = [sample for sample in self.samples if sample["status"] == "200"]
+        statuses: Dict[str, int] = {}
+        for sample in self.samples:
+            statuses[sample["status"]] = statuses.get(sample["status"], 0) + 1
+        
+        stage_latencies: Dict[str, List[float]] = {}
+        for sample in ok:
+            for stage, duration in sample["stages"].items():
+                stage_latencies.setdefault(stage, []).append(duration)
+        
+        timeline = []
+        bucket_count = max(1, int(elapsed // interval) + 1)
+        for bucket in range(bucket_count):
+            finished = [sample for sample in self.samples if bucket * interval <= sample["end_s"] < (bucket + 1) * interval]
+            if not finished and bucket == bucket_count - 1:
+                continue
+            errors = sum(1 for sample in finished if sample["status"] != "200")
+            latencies = latency_summary([sample["latency_ms"] for sample in finished if sample["status"] == "200"])
+            timeline.append({
+                "start_s": bucket * interval,
+                "completed": len(finished),
+                "errors": errors,
+                # The last bucket ends with the run, not after a full interval
+                "throughput_rps": len(finished) / max(min(interval, elapsed - bucket * interval), 1e-9),
+                "p50_ms": latencies["p50_ms"],
+                "p95_ms": latencies["p95_ms"]
+            })
+        
+        return {
+            "requests": len(self.samples),
+            "elapsed_s": elapsed,
+            "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+            "questions_per_s": sum(sample["questions"] for sample in ok) / elapsed if elapsed else 0.0,
+            "error_rate": (len(self.samples) - len(ok)) / len(self.samples) if self.samples else 0.0,
+            "statuses": statuses,
+            "failed_answers": sum(sample.get("failed_answers", 0) for sample in ok),
+            "latency": latency_summary([sample["latency_ms"] for sample in ok]),
+            "stages": {stage: latency_summary(values) for stage, values in stage_latencies.items()},
+            "timeline": timeline
+        }
+
+
+def print_summary(results: Dict[str, Any]):
+    latency = results["latency"]
+    print(f"\n📊 {results['requests']} requests in {results['elapsed_s']:.1f}s: {results['throughput_rps']:.2f} req/s, "
+          f"{results['questions_per_s']:.1f} questions/s, error rate {results['error_rate']:.1%}, "
+          f"{results['failed_answers']} failed answers")
+    print(f"  statuses {results['statuses']}")
+    print(f"  {'latency':<16} p50 {latency['p50_ms']:9.1f}  p90 {latency['p90_ms']:9.1f}  p95 {latency['p95_ms']:9.1f}  "
+          f"p99 {latency['p99_ms']:9.1f}  max {latency['max_ms']:9.1f} ms")
+    for stage, summary in results["stages"].items():
+        print(f"  {stage:<16} p50 {summary['p50_ms']:9.1f}  p90 {summary['p90_ms']:9.1f}  p95 {summary['p95_ms']:9.1f}  "
+              f"p99 {summary['p99_ms']:9.1f}  max {summary['max_ms']:9.1f} ms")
+    print("\n  ⏱️  Over time:")
+    for bucket in results["timeline"]:
+        print(f"    {bucket['start_s']:6.0f}s  {bucket['throughput_rps']:7.2f} req/s  {bucket['errors']:4d} errors  "
+              f"p50 {bucket['p50_ms']:9.1f}  p95 {bucket['p95_ms']:9.1f} ms")
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Compare a run with a baseline run
+    
+    Returns:
+        Descriptions of metrics that regressed by more than tolerance
+    """
+    print(f"\n🔁 Comparing with baseline from {baseline.get('timestamp', 'unknown time')} (tolerance {tolerance:.0%})")
+    for key in ("log", "target", "concurrency", "rate", "arrival"):
+        if results["options"].get(key) != baseline.get("options", {}).get(key):
+            print(f"  ⚠️  {key} differs from the baseline ({baseline.get('options', {}).get(key)} -> {results['options'].get(key)})")
+    regressions = []
+    metrics = [
+        (f"latency {key}", results["latency"][key], baseline["latency"][key], True)
+        for key in ("p50_ms", "p95_ms", "p99_ms")
+    ] + [("throughput_rps", results["throughput_rps"], baseline["throughput_rps"], False)]
+    for name, current, reference, higher_is_worse in metrics:
+        change = (current - reference) / reference if reference else 0.0
+        regressed = change > tolerance if higher_is_worse else change < -tolerance
+        print(f"  {'❌' if regressed else '✅'} {name:<18} {reference:10.1f} -> {current:10.1f} ({change:+.1%})")
+        if regressed:
+            regressions.append(f"{name} {change:+.1%}")
+    
+    change = results["error_rate"] - baseline["error_rate"]
+    regressed = change > ERROR_RATE_SLACK
+    print(f"  {'❌' if regressed else '✅'} {'error_rate':<18} {baseline['error_rate']:10.1%} -> {results['error_rate']:10.1%}")
+    if regressed:
+        regressions.append(f"error_rate {change:+.1%}")
+    return regressions
+
+def start_local_app(records: List[Dict[str, Any]], documents: int, pages: int, latency_scale: float) -> Any:
+    """
+    Start the app against the fake services and point the logged documents at a generated corpus
+    
+    Each distinct logged document URL maps to one corpus document by a stable
+    hash, so a replay needs no network access and repeats the log's reuse of
+    documents.
+    """
+    from benchmark_app import LocalApp
+    import fake_services
+    local_app = LocalApp(latency_scale=latency_scale)
+    local_app.start()
+    corpus = fake_services.generate_corpus(local_app.corpus_dir, documents, pages)
+    for record in records:
+        document = corpus[zlib.crc32(str(record["body"]["documents"]).encode()) % len(corpus)]
+        record["body"] = dict(record["body"], documents=f"{local_app.corpus_url}/{document['name']}")
+    return local_app
+
+def option(args: List[str], name: str, default: Any, cast: Callable = str) -> Any:
+    """Value following --name in args, cast, or the default"""
+    if name not in args:
+        return default
+    return cast(args[args.index(name) + 1])
+
+def main():
+    """Main function to run the load generator"""
+    args = sys.argv[1:]
+    if not args or "-h" in args or "--help" in args:
+        print("Usage:")
+        print("  python load_generator.py <requests.jsonl> [url] [options]")
+        print("    --concurrency 4          Clients (closed loop) or most requests in flight (open loop)")
+        print("    --rate 2.0               Arrivals per second; switches to an open loop")
+        print("    --arrival constant       Open-loop arrivals: constant or poisson")
+        print("    --duration 60            Cycle the log for this many seconds (default: replay it once)")
+        print("    --interval 5             Seconds per bucket of the over-time report")
+        print("    --timeout 120            Request timeout in seconds")
+        print("    --seed 7                 Seed of the Poisson arrivals")
+        print("    --local                  Run the app in-process against the fake services instead of url")
+        print("    --documents 4            Generated documents standing in for the logged ones (--local)")
+        print("    --pages 20               Pages per generated document (--local)")
+        print("    --latency-scale 1.0      Multiplier of the fake services' median latencies (--local)")
+        print("    --output results.json    Write the results as JSON")
+        print("    --compare baseline.json  Compare with an earlier run; exits 1 on regression")
+        print("    --tolerance 0.15         Relative change treated as a regression")
+        sys.exit(0 if args else 1)
+    
+    log_path = args[0]
+    base_url = args[1] if len(args) > 1 and not args[1].startswith("--") else None
+    records = load_request_log(log_path)
+    if not records:
+        print(f"❌ No replayable requests in {log_path}")
+        sys.exit(1)
+    print(f"📄 Loaded {len(records)} requests from {log_path}")
+    
+    local_app = None
+    if "--local" in args:
+        local_app = start_local_app(
+            records,
+            option(args, "--documents", 4, int),
+            option(args, "--pages", 20, int),
+            option(args, "--latency-scale", 1.0, float)
+        )
+        base_url = local_app.base_url
+    
+    generator = LoadGenerator(
+        base_url,
+        records,
+        concurrency=option(args, "--concurrency", 4, int),
+        rate=option(args, "--rate", None, float),
+        arrival=option(args, "--arrival", "constant"),
+        duration=option(args, "--duration", None, float),
+        timeout=option(args, "--timeout", 120.0, float),
+        seed=option(args, "--seed", 7, int)
+    )
+    try:
+        if not generator.check_api_health():
+            sys.exit(1)
+        elapsed = generator.run()
+    finally:
+        if local_app is not None:
+            local_app.stop()
+    
+    results = generator.summarize(elapsed, option(args, "--interval", 5.0, float))
+    results["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    results["options"] = {
+        "log": os.path.basename(log_path),
+        "target": "local" if local_app is not None else generator.base_url,
+        "concurrency": generator.concurrency,
+        "rate": generator.rate,
+        "arrival": generator.arrival,
+        "duration": generator.duration
+    }
+    print_summary(results)
+    
+    output = option(args, "--output", None)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {output}")
+    
+    baseline_path = option(args, "--compare", None)
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, option(args, "--tolerance", 0.15, float))
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✅ No regressions")
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,40 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import logging
-import concurrent.futures
-from models import ProcessRequest, ProcessResponse
-from document_processor import DocumentProcessor
-from text_chunker import TextChunker
-from gemini_client import GeminiClient
-from pinecone_client import PineconeClient
-from question_answerer import QuestionAnswerer
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from models import ProcessRequest, ProcessResponse, JobSubmitResponse, JobStatusResponse
+from client_registry import ClientRegistry
+from ingestion import EmptyDocumentError
+from document_processor import DocumentTooLargeError
+from job_store import JobStore
+from jobs import JobRunner
+from metrics import REGISTRY, TimingMiddleware, span, update_cache_hit_ratios
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="HackRx Document Processing API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the shared clients once per worker and release them on shutdown"""
+    registry = ClientRegistry()
+    app.state.clients = registry
+    # Warm up in the background so /health can report not-ready meanwhile
+    warm_up_task = asyncio.create_task(asyncio.to_thread(registry.warm_up))
+    app.state.jobs = JobRunner(JobStore(), run_job)
+    app.state.jobs.start()
+    yield
+    await app.state.jobs.close()
+    await warm_up_task
+    await registry.close()
+
+app = FastAPI(title="HackRx Document Processing API", version="1.0.0", lifespan=lifespan)
+app.add_middleware(TimingMiddleware)
 security = HTTPBearer()
 
 # Expected bearer token
@@ -29,73 +50,300 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
         )
     return credentials.credentials
 
-@app.post("/hackrx/run", response_model=ProcessResponse)
-async def process_documents(request: ProcessRequest, token: str = Depends(verify_token)):
+async def get_clients(request: Request) -> ClientRegistry:
+    """Return the shared client registry, waiting for or retrying warm-up"""
+    return await ensure_ready(request.app.state.clients)
+
+async def ensure_ready(registry: ClientRegistry) -> ClientRegistry:
+    """Wait for or retry warm-up, raising 503 if the clients are still unavailable"""
+    if not registry.ready:
+        await asyncio.to_thread(registry.warm_up)
+    if not registry.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Service not ready: {registry.error}"
+        )
+    return registry
+
+async def ingest_document(clients: ClientRegistry, document_url: str) -> Dict[str, Any]:
+    """Download, chunk and index the document unless its content is already indexed"""
+    try:
+        with span("ingest"):
+            ingestion = await clients.ingestor.ingest(document_url)
+    except EmptyDocumentError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DocumentTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    logger.info(f"Document ready with {ingestion['chunk_count']} chunks (cached: {ingestion['cached']})")
+    return ingestion
+
+async def retrieve_contexts(clients: ClientRegistry, questions: List[str], document_url: str) -> List[Optional[List[Dict[str, Any]]]]:
+    """Embed all questions in one call and run their searches together"""
+    logger.info("Retrieving context for all questions")
+    try:
+        with span("retrieve"):
+            return await clients.run_io(
+                clients.question_answerer.search_relevant_chunks_batch, questions, document_url
+            )
+    except Exception as e:
+        # Fall back to per-question retrieval so one failure does not fail every answer
+        logger.error(f"Batched retrieval failed, searching per question: {str(e)}")
+        return [None] * len(questions)
+
+async def lookup_cached_answers(clients: ClientRegistry, content_key: str, questions: List[str], indices: List[int]) -> Dict[int, str]:
+    """Answers already generated for these questions about the same document content, keyed by question index"""
+    if not indices:
+        return {}
+    cached = await clients.run_io(
+        clients.question_answerer.get_cached_answers, content_key, [questions[index] for index in indices]
+    )
+    if cached:
+        logger.info(f"Answer cache hits for {len(cached)}/{len(indices)} questions")
+    return {indices[position]: answer for position, answer in cached.items()}
+
+def answer_cache_headers(hits: int, total: int) -> Dict[str, str]:
+    """Response headers reporting how many answers came from the answer cache"""
+    outcome = "hit" if total and hits == total else "partial" if hits else "miss"
+    return {"X-Answer-Cache": outcome, "X-Answer-Cache-Hits": f"{hits}/{total}"}
+
+async def answer_group(
+    clients: ClientRegistry,
+    questions: List[str],
+    document_url: str,
+    group: List[int],
+    contexts: Dict[int, Optional[List[Dict[str, Any]]]],
+    content_key: str
+) -> List[str]:
+    """Answer one group of questions from QuestionAnswerer.group_questions, turning a failure into error answers"""
+    try:
+        return await clients.run_io(
+            clients.question_answerer.answer_question_group,
+            [questions[index] for index in group],
+            document_url,
+            [contexts[index] for index in group],
+            content_key
+        )
+    except Exception as e:
+        logger.error(f"Error processing questions {[index + 1 for index in group]}: {str(e)}")
+        return [f"Error processing question: {str(e)}"] * len(group)
+
+def group_pending(clients: ClientRegistry, pending: List[int], contexts: Dict[int, Optional[List[Dict[str, Any]]]]) -> List[List[int]]:
+    """Group pending question indices whose retrieved chunks overlap enough to share a generation call"""
+    groups = clients.question_answerer.group_questions([contexts[index] for index in pending])
+    return [[pending[position] for position in group] for group in groups]
+
+async def answer_questions(
+    clients: ClientRegistry,
+    document_url: str,
+    questions: List[str],
+    on_stage: Optional[Callable[[str], Awaitable[None]]] = None,
+    on_answer: Optional[Callable[[int, str], Awaitable[None]]] = None,
+    answered: Optional[List[Optional[str]]] = None
+) -> Tuple[List[str], int]:
     """
-    Process documents and answer questions using Gemini AI and Pinecone
+    Ingest a document and answer every question about it
+    
+    Args:
+        clients: Shared client registry
+        document_url: URL to the PDF or DOCX document
+        questions: Questions to answer
+        on_stage: Awaited with each stage name (ingesting, retrieving, answering) as it starts
+        on_answer: Awaited with the index and answer of each question as it completes
+        answered: Answers already known (None where pending); only the pending questions are run
+    
+    Returns:
+        Answers in question order and how many came from the answer cache
+    """
+    answers: List[Optional[str]] = list(answered) if answered else [None] * len(questions)
+    pending = [index for index, answer in enumerate(answers) if answer is None]
+    
+    async def stage(name: str):
+        if on_stage:
+            await on_stage(name)
+    
+    await stage("ingesting")
+    ingestion = await ingest_document(clients, document_url)
+    
+    # Questions answered before for the same document content skip retrieval and generation
+    cached = await lookup_cached_answers(clients, ingestion["content_key"], questions, pending)
+    for index, answer in cached.items():
+        answers[index] = answer
+        if on_answer:
+            await on_answer(index, answer)
+    pending = [index for index in pending if index not in cached]
+    
+    await stage("retrieving")
+    pending_contexts = await retrieve_contexts(clients, [questions[index] for index in pending], document_url)
+    contexts = dict(zip(pending, pending_contexts))
+    
+    # Answer question groups concurrently, bounded per request
+    await stage("answering")
+    groups = group_pending(clients, pending, contexts)
+    logger.info(f"Processing {len(pending)} questions in {len(groups)} generation calls")
+    semaphore = asyncio.Semaphore(8)
+    
+    async def process_group(group: List[int]):
+        async with semaphore:
+            logger.info(f"Processing questions {[index + 1 for index in group]}/{len(questions)}: {questions[group[0]][:100]}...")
+            group_answers = await answer_group(clients, questions, document_url, group, contexts, ingestion["content_key"])
+            for index, answer in zip(group, group_answers):
+                answers[index] = answer
+                if on_answer:
+                    await on_answer(index, answer)
+    
+    await asyncio.gather(*[process_group(group) for group in groups])
+    
+    logger.info(f"Successfully processed all questions")
+    return answers, len(cached)
+
+def streaming_media_type(request: Request) -> Optional[str]:
+    """Streaming media type requested through the Accept header, if any"""
+    accept = request.headers.get("accept", "")
+    if "text/event-stream" in accept:
+        return "text/event-stream"
+    if "application/x-ndjson" in accept:
+        return "application/x-ndjson"
+    return None
+
+async def stream_answers(
+    request: ProcessRequest,
+    clients: ClientRegistry,
+    media_type: str,
+    stream_tokens: bool
+) -> StreamingResponse:
+    """
+    Ingest the document, then stream one event per answer in completion order
+    
+    Events are a `ready` event once the document is indexed, optional `token`
+    events carrying answer fragments, one `answer` event with `index` and
+    `answer` per question, and a final `done` event with timings. Ingestion
+    errors are raised before streaming starts so they keep their status codes.
+    
+    Args:
+        request: Document URL and questions
+        clients: Shared client registry
+        media_type: application/x-ndjson or text/event-stream
+        stream_tokens: Whether to stream each answer token by token from Gemini
     """
+    start_time = time.time()
+    document_url = str(request.documents)
+    questions = request.questions
+    logger.info(f"Streaming request with {len(questions)} questions")
+    
     try:
-        logger.info(f"Processing request with {len(request.questions)} questions")
-        
-        # Initialize clients
-        document_processor = DocumentProcessor()
-        text_chunker = TextChunker()
-        gemini_client = GeminiClient()
-        pinecone_client = PineconeClient()
-        question_answerer = QuestionAnswerer(gemini_client, pinecone_client)
-        
-        # Download and process document
-        logger.info(f"Downloading document from: {request.documents}")
-        document_text = document_processor.process_document(str(request.documents))
-        
-        if not document_text or len(document_text.strip()) == 0:
-            raise HTTPException(
-                status_code=400,
-                detail="No text content found in the document"
-            )
-        
-        # Chunk the text
-        logger.info("Chunking document text")
-        chunks = text_chunker.chunk_text(document_text)
-        
-        if not chunks:
-            raise HTTPException(
-                status_code=400,
-                detail="Failed to create text chunks from document"
-            )
-        
-        logger.info(f"Created {len(chunks)} text chunks")
+        ingestion = await ingest_document(clients, document_url)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    
+    cached = await lookup_cached_answers(clients, ingestion["content_key"], questions, list(range(len(questions))))
+    pending = [index for index in range(len(questions)) if index not in cached]
+    
+    def encode(event: Dict[str, Any]) -> str:
+        if media_type == "text/event-stream":
+            return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        return json.dumps(event) + "\n"
+    
+    async def event_stream():
+        yield encode({"event": "ready", "chunk_count": ingestion["chunk_count"], "cached": ingestion["cached"]})
         
-        # Generate embeddings and store in Pinecone with document isolation
-        logger.info("Generating embeddings and storing in Pinecone")
-        pinecone_client.store_chunks(chunks, gemini_client, str(request.documents))
+        time_to_first_answer = None
+        for index, answer in cached.items():
+            if time_to_first_answer is None:
+                time_to_first_answer = time.time() - start_time
+            yield encode({"event": "answer", "index": index, "answer": answer})
         
-        # Answer questions using parallel processing for maximum speed
-        logger.info("Processing questions")
+        pending_contexts = await retrieve_contexts(clients, [questions[index] for index in pending], document_url)
+        contexts = dict(zip(pending, pending_contexts))
+        events: asyncio.Queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(8)
         
-        def process_single_question(question_data):
-            question, index = question_data
-            logger.info(f"Processing question {index+1}/{len(request.questions)}: {question[:100]}...")
-            try:
-                answer = question_answerer.answer_question(question, str(request.documents))
-                return (index, answer)
-            except Exception as e:
-                logger.error(f"Error processing question {index+1}: {str(e)}")
-                return (index, f"Error processing question: {str(e)}")
+        async def stream_single_question(question: str, index: int):
+            async with semaphore:
+                try:
+                    fragments = []
+                    async for text in clients.iter_io(
+                        clients.question_answerer.stream_answer, question, document_url, contexts[index]
+                    ):
+                        fragments.append(text)
+                        await events.put({"event": "token", "index": index, "text": text})
+                    answer = "".join(fragments)
+                except Exception as e:
+                    logger.error(f"Error processing question {index+1}: {str(e)}")
+                    answer = f"Error processing question: {str(e)}"
+                await events.put({"event": "answer", "index": index, "answer": answer})
         
-        # Process all questions in parallel for 10x speed improvement
-        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(request.questions), 8)) as executor:
-            question_data = [(q, i) for i, q in enumerate(request.questions)]
-            results = list(executor.map(process_single_question, question_data))
+        async def answer_question_group(group: List[int]):
+            async with semaphore:
+                group_answers = await answer_group(clients, questions, document_url, group, contexts, ingestion["content_key"])
+                for index, answer in zip(group, group_answers):
+                    await events.put({"event": "answer", "index": index, "answer": answer})
         
-        # Sort answers by original question order
-        answers = [""] * len(request.questions)
-        for index, answer in results:
-            answers[index] = answer
+        # Token streaming answers each question on its own; otherwise overlapping questions share a call
+        if stream_tokens:
+            tasks = [asyncio.create_task(stream_single_question(questions[index], index)) for index in pending]
+        else:
+            tasks = [
+                asyncio.create_task(answer_question_group(group))
+                for group in group_pending(clients, pending, contexts)
+            ]
+        try:
+            remaining = len(pending)
+            while remaining:
+                event = await events.get()
+                if event["event"] == "answer":
+                    remaining -= 1
+                    if time_to_first_answer is None:
+                        time_to_first_answer = time.time() - start_time
+                        logger.info(f"Time to first answer: {time_to_first_answer:.2f} seconds")
+                yield encode(event)
+        finally:
+            # Stop outstanding questions if the client disconnects mid-stream
+            for task in tasks:
+                task.cancel()
         
-        logger.info(f"Successfully processed all questions")
+        total_time = time.time() - start_time
+        logger.info(f"Streamed {len(questions)} answers in {total_time:.2f} seconds")
+        yield encode({
+            "event": "done",
+            "answers": len(questions),
+            "time_to_first_answer": time_to_first_answer,
+            "total_time": total_time
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type=media_type,
+        headers=answer_cache_headers(len(cached), len(questions))
+    )
+
+@app.post("/hackrx/run", response_model=ProcessResponse)
+async def process_documents(
+    request: ProcessRequest,
+    http_request: Request,
+    response: Response,
+    stream_tokens: bool = False,
+    token: str = Depends(verify_token),
+    clients: ClientRegistry = Depends(get_clients)
+):
+    """
+    Process documents and answer questions using Gemini AI and Pinecone
+    
+    Sending `Accept: application/x-ndjson` or `Accept: text/event-stream`
+    returns the same stream as /hackrx/run/stream.
+    """
+    media_type = streaming_media_type(http_request)
+    if media_type:
+        return await stream_answers(request, clients, media_type, stream_tokens)
+    
+    try:
+        logger.info(f"Processing request with {len(request.questions)} questions")
+        answers, cache_hits = await answer_questions(clients, str(request.documents), request.questions)
+        response.headers.update(answer_cache_headers(cache_hits, len(answers)))
         return ProcessResponse(answers=answers)
-        
+    
     except HTTPException:
         raise
     except Exception as e:
@@ -105,6 +353,79 @@ async def process_documents(request: ProcessRequest, token: str = Depends(verify
             detail=f"Internal server error: {str(e)}"
         )
 
+@app.post("/hackrx/run/stream")
+async def process_documents_stream(
+    request: ProcessRequest,
+    http_request: Request,
+    stream_tokens: bool = False,
+    token: str = Depends(verify_token),
+    clients: ClientRegistry = Depends(get_clients)
+):
+    """
+    Stream answers as NDJSON (or SSE with `Accept: text/event-stream`) as each one completes
+    """
+    media_type = streaming_media_type(http_request) or "application/x-ndjson"
+    return await stream_answers(request, clients, media_type, stream_tokens)
+
+async def run_job(job_id: str):
+    """Job body: answer a stored job's questions, recording stages and answers as they complete"""
+    job_store: JobStore = app.state.jobs.job_store
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None or job["status"] in ("completed", "failed"):
+        return
+    
+    async def on_stage(stage: str):
+        await asyncio.to_thread(job_store.update, job_id, None, stage)
+    
+    async def on_answer(index: int, answer: str):
+        await asyncio.to_thread(job_store.set_answer, job_id, index, answer)
+    
+    await asyncio.to_thread(job_store.update, job_id, "running")
+    try:
+        clients = await ensure_ready(app.state.clients)
+        await answer_questions(
+            clients,
+            job["document_url"],
+            job["questions"],
+            on_stage=on_stage,
+            on_answer=on_answer,
+            answered=job["answers"]
+        )
+    except HTTPException as e:
+        await asyncio.to_thread(job_store.update, job_id, "failed", None, str(e.detail))
+        return
+    await asyncio.to_thread(job_store.update, job_id, "completed", "done")
+    logger.info(f"Job {job_id} completed")
+
+@app.post("/hackrx/jobs", response_model=JobSubmitResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(request: ProcessRequest, token: str = Depends(verify_token)):
+    """
+    Queue a document for background processing and return its job ID
+    """
+    job_runner: JobRunner = app.state.jobs
+    job_id = await asyncio.to_thread(job_runner.job_store.create, str(request.documents), request.questions)
+    job_runner.submit(job_id)
+    logger.info(f"Queued job {job_id} with {len(request.questions)} questions ({job_runner.queued} waiting)")
+    return JobSubmitResponse(job_id=job_id, status="queued")
+
+@app.get("/hackrx/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str, token: str = Depends(verify_token)):
+    """
+    Return a job's status, stage and the answers completed so far
+    """
+    job = await asyncio.to_thread(app.state.jobs.job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return JobStatusResponse(
+        job_id=job_id,
+        status=job["status"],
+        stage=job["stage"],
+        answered=sum(1 for answer in job["answers"] if answer is not None),
+        total=len(job["questions"]),
+        answers=job["answers"],
+        error=job["error"]
+    )
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
@@ -114,16 +435,41 @@ async def root():
         "status": "running",
         "endpoints": {
             "POST /hackrx/run": "Process documents and answer questions",
+            "POST /hackrx/run/stream": "Stream answers as NDJSON/SSE as each one completes",
+            "POST /hackrx/jobs": "Queue a document for background processing",
+            "GET /hackrx/jobs/{job_id}": "Poll a background job for progress and answers",
             "GET /health": "Health check",
+            "GET /metrics": "Prometheus metrics: stage latencies, tokens, cache hit ratios, in-flight requests",
             "GET /docs": "Interactive API documentation"
         },
         "docs": "/docs"
     }
 
 @app.get("/health")
-async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy", "service": "HackRx Document Processing API"}
+async def health_check(request: Request):
+    """Health check endpoint, not-ready until client warm-up has finished"""
+    registry: ClientRegistry = request.app.state.clients
+    if not registry.ready:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "status": "starting" if registry.error is None else "unavailable",
+                "service": "HackRx Document Processing API",
+                "error": registry.error
+            }
+        )
+    return {
+        "status": "healthy",
+        "service": "HackRx Document Processing API",
+        "embedding_cache": registry.vector_store.embedding_cache.stats(),
+        "answer_cache": registry.answer_cache.stats() if registry.answer_cache else None
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint in the text exposition format"""
+    update_cache_hit_ratios()
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,97 @@
+import os
+import logging
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class MatchSelector:
+    """
+    Post-retrieval selection of the chunks worth sending to Gemini
+    
+    Candidates below an absolute similarity threshold, or too far below the
+    best match, are dropped first, so easy questions keep one or two chunks.
+    The rest are picked by maximal marginal relevance over their vectors,
+    which skips chunks that mostly repeat one already selected.
+    """
+    
+    def __init__(
+        self,
+        min_score: Optional[float] = None,
+        score_gap: Optional[float] = None,
+        mmr_lambda: Optional[float] = None,
+        duplicate_similarity: Optional[float] = None,
+        fetch_multiplier: Optional[int] = None
+    ):
+        """
+        Initialize the selector
+        
+        Args:
+            min_score: Similarity below which matches are dropped (RETRIEVAL_MIN_SCORE)
+            score_gap: Largest drop relative to the best score a match may have (RETRIEVAL_SCORE_GAP)
+            mmr_lambda: Weight of relevance against diversity, 1 disables diversity (RETRIEVAL_MMR_LAMBDA)
+            duplicate_similarity: Similarity to a selected chunk at which a candidate is skipped (RETRIEVAL_DUPLICATE_SIMILARITY)
+            fetch_multiplier: Candidates fetched per chunk to select (RETRIEVAL_FETCH_MULTIPLIER)
+        """
+        self.min_score = min_score if min_score is not None else float(os.getenv("RETRIEVAL_MIN_SCORE", "0.3"))
+        self.score_gap = score_gap if score_gap is not None else float(os.getenv("RETRIEVAL_SCORE_GAP", "0.25"))
+        self.mmr_lambda = mmr_lambda if mmr_lambda is not None else float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.7"))
+        self.duplicate_similarity = duplicate_similarity or float(os.getenv("RETRIEVAL_DUPLICATE_SIMILARITY", "0.97"))
+        self.fetch_multiplier = fetch_multiplier or int(os.getenv("RETRIEVAL_FETCH_MULTIPLIER", "2"))
+    
+    def fetch_k(self, top_k: int) -> int:
+        """Candidates to retrieve for top_k selected chunks"""
+        return top_k * self.fetch_multiplier
+    
+    def apply_cutoffs(self, matches: List[Dict[str, Any]], min_score: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Keep matches above the absolute threshold and within score_gap of the best
+        
+        The best match is always kept so a question never loses all context.
+        
+        Args:
+            matches: Matches sorted best first
+            min_score: Absolute threshold, None to apply only the relative gap
+        
+        Returns:
+            The kept matches, best first
+        """
+        if not matches:
+            return []
+        best = matches[0]["score"]
+        floor = best * (1 - self.score_gap) if best > 0 else best
+        if min_score is not None:
+            floor = max(floor, min_score)
+        return matches[:1] + [match for match in matches[1:] if match["score"] >= floor]
+    
+    def select(self, candidates: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """
+        Select up to top_k diverse, relevant matches
+        
+        Args:
+            candidates: Matches sorted best first, each with its vector under "values"
+        
+        Returns:
+            Selected matches in selection order, without their vectors
+        """
+        kept = self.apply_cutoffs(candidates, self.min_score)
+        selected = [0] if kept else []
+        if len(kept) > 1 and top_k > 1:
+            vectors = np.asarray([match["values"] for match in kept], dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            relevance = np.asarray([match["score"] for match in kept], dtype=np.float32)
+            
+            # Highest similarity of every candidate to the chunks selected so far
+            redundancy = vectors @ vectors[0]
+            while len(selected) < top_k:
+                scores = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+                scores[selected] = -np.inf
+                scores[redundancy >= self.duplicate_similarity] = -np.inf
+                candidate = int(np.argmax(scores))
+                if scores[candidate] == -np.inf:
+                    break
+                selected.append(candidate)
+                redundancy = np.maximum(redundancy, vectors @ vectors[candidate])
+        
+        logger.info(f"Selected {len(selected)} of {len(candidates)} candidate chunks ({len(kept)} passed the score cutoffs)")
+        return [{key: value for key, value in kept[i].items() if key != "values"} for i in selected[:top_k]]
@@ -0,0 +1,289 @@
+import time
+import bisect
+import functools
+import threading
+import contextvars
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Histogram buckets in seconds, from a cache hit to a slow large-document ingestion
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric(ABC):
+    """A named metric family with optional labels, rendered in the Prometheus text format"""
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {list(self.label_names)}, got {list(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+    
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Sample lines of the family, without its HELP and TYPE lines"""
+    
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self._samples())
+
+
+class Counter(Metric):
+    """Monotonically increasing total"""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+    
+    def inc(self, amount: float = 1.0, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+    
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+    
+    kind = "gauge"
+    
+    def dec(self, amount: float = 1.0, **labels: Any):
+        self.inc(-amount, **labels)
+    
+    def set(self, value: float, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram of observed values"""
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: count per bucket (the last one is +Inf), sum and count
+        self._values: Dict[Tuple[str, ...], List[Any]] = {}
+    
+    def observe(self, value: float, **labels: Any):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][position] += 1
+            entry[1] += value
+            entry[2] += 1
+    
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metric families exposed together on /metrics"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+    
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "hackrx_stage_duration_seconds", "Time spent in each processing stage", ["stage"]
+))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "hackrx_http_requests_total", "HTTP requests by route, method and status", ["method", "route", "status"]
+))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    "hackrx_http_request_duration_seconds", "HTTP request latency until the response headers are sent", ["method", "route"]
+))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "hackrx_http_requests_in_flight", "HTTP requests currently being served"
+))
+DOWNLOADED_BYTES = REGISTRY.register(Counter(
+    "hackrx_document_bytes_downloaded_total", "Document bytes downloaded"
+))
+CHUNKS_CREATED = REGISTRY.register(Counter(
+    "hackrx_chunks_created_total", "Text chunks produced by the chunker"
+))
+GEMINI_TOKENS = REGISTRY.register(Counter(
+    "hackrx_gemini_tokens_total", "Gemini tokens by kind (embedding input estimated, prompt and output as reported)", ["kind"]
+))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "hackrx_cache_lookups_total", "Cache lookups by cache (embedding, answer, document) and result (hit, miss, wait)", ["cache", "result"]
+))
+RETRIEVAL_QUESTIONS = REGISTRY.register(Counter(
+    "hackrx_retrieval_questions_total", "Questions retrieved by path (vector, fused, lexical fast path)", ["path"]
+))
+CACHE_HIT_RATIO = REGISTRY.register(Gauge(
+    "hackrx_cache_hit_ratio", "Share of cache lookups that hit since startup", ["cache"]
+))
+
+def update_cache_hit_ratios():
+    """Recompute the hit ratio gauges from the lookup counters, before rendering"""
+    for cache in ("embedding", "answer", "document"):
+        hits = CACHE_LOOKUPS.value(cache=cache, result="hit")
+        # Embedding lookups that waited on another request's in-flight call are not hits
+        total = hits + CACHE_LOOKUPS.value(cache=cache, result="miss") + CACHE_LOOKUPS.value(cache=cache, result="wait")
+        CACHE_HIT_RATIO.set(hits / total if total else 0.0, cache=cache)
+
+
+class RequestTimings:
+    """Total time and call count per stage for one request, reported in its Server-Timing header"""
+    
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self._stages: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+    
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self._stages.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+    
+    def header(self) -> str:
+        """
+        Server-Timing header value, stages in the order they first ran
+        
+        Stages that run concurrently (e.g. embedding sub-batches) report their
+        summed time, so they may add up to more than the total.
+        """
+        with self._lock:
+            stages = list(self._stages.items())
+        entries = [
+            f'{stage};dur={seconds * 1000:.1f}' + (f';desc="{calls} calls"' if calls > 1 else "")
+            for stage, (seconds, calls) in stages
+        ]
+        entries.append(f"total;dur={(time.perf_counter() - self.start_time) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_request_timings: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+def record_stage(stage: str, seconds: float):
+    """Observe a stage duration in the stage histogram and the current request's timings"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block as a stage (see record_stage)"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start_time)
+
+def bind_context(func: Callable[..., Any], *args: Any) -> Callable[[], Any]:
+    """
+    Wrap a call for an executor so it runs in a copy of the caller's context
+    
+    Thread pools do not carry context variables, so without this spans in
+    worker threads would not reach the request's Server-Timing header.
+    """
+    return functools.partial(contextvars.copy_context().run, func, *args)
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware tracking in-flight requests, request latency and per-request stage timings
+    
+    Each HTTP request gets its own RequestTimings; the stages recorded before
+    the response starts are sent in a Server-Timing header.
+    """
+    
+    def __init__(self, app: Callable):
+        self.app = app
+    
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        IN_FLIGHT.inc()
+        status_code = 500
+        
+        async def send_with_timing(message: Dict[str, Any]):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                HTTP_SECONDS.observe(time.perf_counter() - timings.start_time, method=scope["method"], route=self._route(scope))
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timings.header().encode())]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            IN_FLIGHT.dec()
+            HTTP_REQUESTS.inc(method=scope["method"], route=self._route(scope), status=status_code)
+            _request_timings.reset(token)
+    
+    @staticmethod
+    def _route(scope: Dict[str, Any]) -> str:
+        """Route template (e.g. /hackrx/jobs/{job_id}) so job IDs do not become label values"""
+        route = scope.get("route")
+        if route is not None and hasattr(route, "path"):
+            return route.path
+        endpoint = scope.get("endpoint")
+        return endpoint.__name__ if endpoint is not None else "unmatched"
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+One-off migration of Pinecone vectors into per-document namespaces
+Moves vectors written to the shared namespace (filtered by document_hash
+metadata) into the namespace each document is now stored and queried in
+"""
+
+import sys
+import logging
+from pinecone_client import PineconeClient
+
+logging.basicConfig(level=logging.INFO)
+
+def main():
+    """Main function to run the namespace migration"""
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print("Usage:")
+        print("  python migrate_namespaces.py                       # Move vectors out of the default namespace")
+        print("  python migrate_namespaces.py --keep-source         # Copy without deleting the originals")
+        print("  python migrate_namespaces.py [namespace]           # Move vectors out of another shared namespace")
+        sys.exit(0)
+    
+    delete_source = "--keep-source" not in args
+    positional = [arg for arg in args if not arg.startswith("--")]
+    source_namespace = positional[0] if positional else ""
+    
+    client = PineconeClient()
+    moved = client.migrate_to_namespaces(source_namespace, delete_source=delete_source)
+    
+    for namespace, count in sorted(moved.items()):
+        print(f"  ✅ {namespace}: {count} vectors")
+    print(f"\n🎉 Migrated {sum(moved.values())} vectors into {len(moved)} namespaces")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, HttpUrl, Field
-from typing import List
+from typing import List, Optional
 
 class ProcessRequest(BaseModel):
     """Request model for document processing"""
@@ -10,8 +10,27 @@ class ProcessResponse(BaseModel):
     """Response model for document processing"""
     answers: List[str] = Field(..., description="List of answers corresponding to the questions")
 
+class JobSubmitResponse(BaseModel):
+    """Response model for a queued background job"""
+    job_id: str = Field(..., description="ID to poll at /hackrx/jobs/{job_id}")
+    status: str = Field(..., description="Initial job status")
+
+class JobStatusResponse(BaseModel):
+    """Response model for background job progress"""
+    job_id: str = Field(..., description="Job ID")
+    status: str = Field(..., description="queued, running, completed or failed")
+    stage: str = Field(..., description="Current stage: queued, ingesting, retrieving, answering or done")
+    answered: int = Field(..., description="Number of questions answered so far")
+    total: int = Field(..., description="Number of questions in the job")
+    answers: List[Optional[str]] = Field(..., description="Answers in question order, null while pending")
+    error: Optional[str] = Field(None, description="Failure reason for failed jobs")
+
 class LegalAnswer(BaseModel):
     """Model for legal AI response"""
     answer: str
     condition: str
     rationale: str
+
+class NumberedLegalAnswer(LegalAnswer):
+    """Model for one answer within a batched legal AI response"""
+    question_number: int
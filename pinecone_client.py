@@ -1,38 +1,92 @@
 import os
+import json
+import random
 import logging
-from typing import List, Dict, Any
-import hashlib
+import concurrent.futures
+from typing import List, Dict, Any, Optional, Tuple
+import urllib3
 from pinecone import Pinecone, ServerlessSpec
 from gemini_client import GeminiClient
+from embedding_cache import EmbeddingCache
+from chunk_store import ChunkStore
+from vector_store import VectorStore
+from metrics import span, bind_context
 import time
-import concurrent.futures
-import threading
 
 logger = logging.getLogger(__name__)
 
-class PineconeClient:
-    """Client for interacting with Pinecone vector database with per-document isolation"""
+# HTTP status codes worth retrying: throttling and transient server errors
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+# The same failures as reported over gRPC
+RETRYABLE_GRPC_CODES = ("UNAVAILABLE", "DEADLINE_EXCEEDED", "RESOURCE_EXHAUSTED", "ABORTED")
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed Pinecone call is worth retrying: network errors, timeouts and transient statuses only"""
+    # The HTTP transport surfaces connection failures and timeouts as urllib3 errors
+    if isinstance(error, (urllib3.exceptions.HTTPError, ConnectionError, TimeoutError)):
+        return True
+    status = getattr(error, "status_code", getattr(error, "status", None))
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES
+    code = getattr(error, "code", None)
+    return callable(code) and getattr(code(), "name", None) in RETRYABLE_GRPC_CODES
+
+class PineconeClient(VectorStore):
+    """
+    Client for interacting with Pinecone vector database with per-document isolation
     
-    def __init__(self):
+    Every document lives in its own namespace named after its document hash,
+    so queries never scan other documents and clearing one is a single
+    namespace delete. Chunk texts live in a local ChunkStore keyed by vector
+    ID; Pinecone only keeps the chunk index as metadata.
+    """
+    
+    def __init__(self, embedding_cache: Optional[EmbeddingCache] = None, chunk_store: Optional[ChunkStore] = None):
+        super().__init__(embedding_cache)
+        self.chunk_store = chunk_store or ChunkStore()
+        
         api_key = os.getenv("PINECONE_API_KEY")
         if not api_key:
             raise ValueError("PINECONE_API_KEY environment variable is required")
         
         self.index_name = os.getenv("PINECONE_INDEX", "hackrx-documents")
         self.environment = os.getenv("PINECONE_ENV", "us-east-1")
+        self.pool_threads = int(os.getenv("PINECONE_POOL_THREADS", "8"))
         
-        # Initialize Pinecone
-        self.pc = Pinecone(api_key=api_key)
+        # Upsert requests are sized by serialized payload and sent in parallel
+        self.upsert_max_bytes = int(os.getenv("PINECONE_UPSERT_MAX_BYTES", str(1536 * 1024)))
+        self.upsert_max_vectors = int(os.getenv("PINECONE_UPSERT_MAX_VECTORS", "1000"))
+        self.upsert_concurrency = int(os.getenv("PINECONE_UPSERT_CONCURRENCY", str(self.pool_threads)))
+        self.max_retries = int(os.getenv("PINECONE_MAX_RETRIES", "4"))
+        self._upsert_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.upsert_concurrency,
+            thread_name_prefix="upsert"
+        )
+        
+        # Initialize Pinecone, over gRPC when requested and installed
+        self.transport = os.getenv("PINECONE_TRANSPORT", "http").lower()
+        self.pc = self._create_client(api_key)
         
         # Create or connect to index
         self._ensure_index_exists()
-        self.index = self.pc.Index(self.index_name)
-        
-        # Cache for embeddings to avoid redundant API calls
-        self._embedding_cache = {}
-        self._cache_lock = threading.Lock()
+        if self.transport == "grpc":
+            self.index = self.pc.Index(self.index_name)
+        else:
+            self.index = self.pc.Index(self.index_name, pool_threads=self.pool_threads)
         
-        logger.info(f"Pinecone client initialized with index: {self.index_name}")
+        logger.info(f"Pinecone client initialized with index: {self.index_name} ({self.transport} transport)")
+    
+    def _create_client(self, api_key: str):
+        """Build the Pinecone control-plane client for the configured transport"""
+        if self.transport == "grpc":
+            try:
+                from pinecone.grpc import PineconeGRPC
+                return PineconeGRPC(api_key=api_key)
+            except ImportError:
+                logger.warning("PINECONE_TRANSPORT=grpc but pinecone[grpc] is not installed, using HTTP")
+                self.transport = "http"
+        return Pinecone(api_key=api_key)
     
     def _ensure_index_exists(self):
         """Ensure the Pinecone index exists, create if it doesn't"""
@@ -60,197 +114,298 @@ class PineconeClient:
                     time.sleep(1)
             else:
                 logger.info(f"Using existing Pinecone index: {self.index_name}")
-                
+        
         except Exception as e:
             logger.error(f"Error ensuring index exists: {str(e)}")
             raise Exception(f"Failed to initialize Pinecone index: {str(e)}")
     
-    def _generate_document_hash(self, document_url: str) -> str:
-        """Generate a unique hash for a document URL to use as namespace"""
-        return hashlib.md5(document_url.encode()).hexdigest()[:16]
+    def warm_up(self):
+        """Open the pooled index connection ahead of the first request"""
+        try:
+            stats = self.index.describe_index_stats()
+            logger.info(f"Pinecone index ready with {stats.total_vector_count} vectors")
+        except Exception as e:
+            logger.error(f"Error warming up Pinecone index: {str(e)}")
+            raise Exception(f"Failed to warm up Pinecone index: {str(e)}")
     
-    def _generate_chunk_id(self, text: str, document_hash: str, chunk_index: int) -> str:
-        """Generate a unique ID for a text chunk within a document namespace"""
-        chunk_hash = hashlib.md5(text.encode()).hexdigest()[:8]
-        return f"{document_hash}_{chunk_index:04d}_{chunk_hash}"
+    def has_document(self, document_url: str) -> bool:
+        """Whether the local chunk store can still resolve this document's vectors"""
+        return self.chunk_store.has_document(self._generate_document_hash(document_url))
     
-    def _generate_embeddings_batch(self, chunks: List[str], gemini_client: GeminiClient) -> List[List[float]]:
-        """Generate embeddings for multiple chunks using ultra-fast batch processing"""
-        # Check cache for all chunks first
-        cached_embeddings = []
-        uncached_chunks = []
-        uncached_indices = []
-        
-        for i, chunk in enumerate(chunks):
-            chunk_hash = hashlib.md5(chunk.encode()).hexdigest()
-            with self._cache_lock:
-                if chunk_hash in self._embedding_cache:
-                    cached_embeddings.append((i, self._embedding_cache[chunk_hash]))
-                else:
-                    uncached_chunks.append(chunk)
-                    uncached_indices.append(i)
-        
-        # Generate embeddings for uncached chunks in single batch call
-        new_embeddings = []
-        if uncached_chunks:
-            # Use Gemini's batch embedding API for maximum speed
-            new_embeddings = gemini_client.generate_embeddings_batch(uncached_chunks)
-            
-            # Cache the new embeddings
-            with self._cache_lock:
-                for chunk, embedding in zip(uncached_chunks, new_embeddings):
-                    chunk_hash = hashlib.md5(chunk.encode()).hexdigest()
-                    self._embedding_cache[chunk_hash] = embedding
-        
-        # Combine cached and new embeddings in correct order
-        final_embeddings: List[List[float]] = [[] for _ in range(len(chunks))]
-        
-        # Fill in cached embeddings
-        for idx, embedding in cached_embeddings:
-            final_embeddings[idx] = embedding
-        
-        # Fill in new embeddings
-        for uncached_idx, embedding in zip(uncached_indices, new_embeddings):
-            final_embeddings[uncached_idx] = embedding
-        
-        return final_embeddings
+    def get_document_chunks(self, document_url: str) -> List[str]:
+        """Chunk texts of a document from the local chunk store"""
+        return self.chunk_store.get_document(self._generate_document_hash(document_url))
+    
+    def _namespace(self, document_url: str) -> str:
+        """Namespace holding a document's vectors"""
+        return self._generate_document_hash(document_url)
+    
+    def begin_document(self, document_url: str):
+        """Clear previous chunks for this document before storing it again"""
+        self.clear_document_chunks(document_url)
     
-    def store_chunks(self, chunks: List[str], gemini_client: GeminiClient, document_url: str):
+    def upsert_embedded_chunks(
+        self,
+        document_url: str,
+        chunks: List[str],
+        embeddings: List[List[float]],
+        start_index: int = 0,
+        metadata: Optional[List[Dict[str, Any]]] = None
+    ):
         """
-        Store text chunks in Pinecone with their embeddings in isolated namespace
+        Upsert a batch of embedded chunks into Pinecone for a document
         
         Args:
-            chunks: List of text chunks to store
-            gemini_client: Gemini client for generating embeddings
             document_url: Source document URL for namespace isolation
+            chunks: Chunk texts of this batch
+            embeddings: Embedding for each chunk
+            start_index: Position of the first chunk of this batch within the document
+            metadata: Extra metadata per chunk (e.g. page range) stored with each vector
         """
         try:
             document_hash = self._generate_document_hash(document_url)
-            logger.info(f"Storing {len(chunks)} chunks for document namespace: {document_hash}")
+            namespace = self._namespace(document_url)
             
-            # Clear previous chunks for this document
-            self.clear_document_chunks(document_url)
-            
-            # Generate embeddings efficiently
-            start_time = time.time()
-            embeddings = self._generate_embeddings_batch(chunks, gemini_client)
-            embedding_time = time.time() - start_time
-            logger.info(f"Generated {len(embeddings)} embeddings in {embedding_time:.2f} seconds")
-            
-            # Prepare vectors for upsert
+            # Prepare vectors for upsert; texts go to the local chunk store
             vectors_to_upsert = []
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+            stored_chunks = []
+            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings), start=start_index):
                 vector_id = self._generate_chunk_id(chunk, document_hash, i)
                 vector = {
                     "id": vector_id,
                     "values": embedding,
-                    "metadata": {
-                        "text": chunk,
-                        "chunk_index": i,
-                        "document_hash": document_hash,
-                        "document_url": document_url,
-                        "timestamp": int(time.time())
-                    }
+                    "metadata": {"chunk_index": i, **(metadata[i - start_index] if metadata else {})}
                 }
                 vectors_to_upsert.append(vector)
+                stored_chunks.append((vector_id, i, chunk))
+            
+            # Texts are stored first so every searchable vector resolves
+            self.chunk_store.put_many(document_hash, stored_chunks)
             
-            # Upsert vectors in optimized batches
-            batch_size = 100
+            batches = self._plan_upsert_batches(vectors_to_upsert)
             start_time = time.time()
-            for i in range(0, len(vectors_to_upsert), batch_size):
-                batch = vectors_to_upsert[i:i + batch_size]
-                self.index.upsert(vectors=batch)
-                logger.info(f"Upserted batch {i//batch_size + 1}/{(len(vectors_to_upsert) + batch_size - 1)//batch_size}")
+            futures = [
+                self._upsert_pool.submit(bind_context(self._upsert_batch, batch, namespace, batch_number, len(batches)))
+                for batch_number, batch in enumerate(batches, start=1)
+            ]
+            # Let every batch finish (or exhaust its retries) before reporting a failure
+            concurrent.futures.wait(futures)
+            for future in futures:
+                future.result()
             
             upsert_time = time.time() - start_time
-            logger.info(f"Successfully stored {len(chunks)} chunks in {upsert_time:.2f} seconds")
-            
+            logger.info(
+                f"Successfully stored {len(chunks)} chunks in {len(batches)} requests in {upsert_time:.2f} seconds "
+                f"({len(chunks) / max(upsert_time, 1e-6):.1f} vectors/sec)"
+            )
+        
         except Exception as e:
             logger.error(f"Error storing chunks in Pinecone: {str(e)}")
             raise Exception(f"Failed to store chunks: {str(e)}")
     
-    def search_relevant_chunks(self, query: str, gemini_client: GeminiClient, document_url: str, top_k: int = 10) -> List[str]:
-        """
-        Search for relevant text chunks using semantic similarity within document namespace
+    @staticmethod
+    def _estimate_vector_bytes(vector: Dict[str, Any]) -> int:
+        """Approximate serialized size of one vector in an upsert request"""
+        return len(json.dumps(vector, separators=(",", ":"))) + 1
+    
+    def _plan_upsert_batches(self, vectors: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Group vectors into upsert requests bounded by vector count and payload bytes"""
+        batches: List[List[Dict[str, Any]]] = []
+        current: List[Dict[str, Any]] = []
+        current_bytes = 0
+        for vector in vectors:
+            size = self._estimate_vector_bytes(vector)
+            if current and (
+                len(current) >= self.upsert_max_vectors
+                or current_bytes + size > self.upsert_max_bytes
+            ):
+                batches.append(current)
+                current = []
+                current_bytes = 0
+            current.append(vector)
+            current_bytes += size
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _upsert_batch(self, batch: List[Dict[str, Any]], namespace: str, batch_number: int, batch_count: int):
+        """Upsert one request, retrying throttled or transient failures with jittered exponential backoff"""
+        start_time = time.time()
+        with span("upsert"):
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self.index.upsert(vectors=batch, namespace=namespace)
+                    break
+                except Exception as e:
+                    if not is_retryable(e) or attempt == self.max_retries:
+                        raise
+                    # Upserts are idempotent by ID, so the whole batch is simply sent again
+                    delay = random.uniform(0, min(30.0, 0.5 * (2 ** attempt)))
+                    logger.warning(
+                        f"Upsert batch {batch_number}/{batch_count} failed ({str(e)}), "
+                        f"retry {attempt + 1}/{self.max_retries} in {delay:.2f}s"
+                    )
+                    time.sleep(delay)
         
-        Args:
-            query: Query text to search for
-            gemini_client: Gemini client for generating query embedding
-            document_url: Source document URL for namespace isolation
-            top_k: Number of top results to return
-            
-        Returns:
-            List of relevant text chunks
-        """
+        elapsed = time.time() - start_time
+        logger.info(
+            f"Upserted batch {batch_number}/{batch_count}: {len(batch)} vectors in {elapsed:.2f}s "
+            f"({len(batch) / max(elapsed, 1e-6):.1f} vectors/sec)"
+        )
+    
+    def _resolve_chunks(self, chunk_ids: List[str], namespace: str) -> Dict[str, Tuple[Optional[int], str]]:
+        """Resolve vector IDs to (chunk_index, text), falling back to metadata for vectors stored before the chunk store"""
+        chunks: Dict[str, Tuple[Optional[int], str]] = dict(self.chunk_store.get_many(chunk_ids))
+        missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in chunks]
+        if missing:
+            fetched = self.index.fetch(ids=missing, namespace=namespace).vectors
+            for chunk_id, vector in fetched.items():
+                if vector.metadata and "text" in vector.metadata:
+                    chunk_index = vector.metadata.get("chunk_index")
+                    chunks[chunk_id] = (int(chunk_index) if chunk_index is not None else None, vector.metadata["text"])
+            logger.warning(f"Resolved {len(missing)} chunk IDs missing from the chunk store through Pinecone metadata")
+        return chunks
+    
+    def _search_by_embedding(self, query_embedding: List[float], document_url: str, top_k: int) -> List[Dict[str, Any]]:
+        """Query Pinecone with a precomputed embedding within the document namespace"""
         try:
             document_hash = self._generate_document_hash(document_url)
+            namespace = self._namespace(document_url)
             
-            # Generate embedding for the query (with caching)
-            query_hash = hashlib.md5(query.encode()).hexdigest()
-            with self._cache_lock:
-                if query_hash in self._embedding_cache:
-                    query_embedding = self._embedding_cache[query_hash]
-                else:
-                    query_embedding = gemini_client.generate_embedding(query)
-                    self._embedding_cache[query_hash] = query_embedding
-            
-            # Search in Pinecone with document namespace filter
-            search_results = self.index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True,
-                filter={"document_hash": document_hash}  # Fixed filter syntax
-            )
-            
-            # Extract text chunks from results with minimum similarity threshold
-            relevant_chunks = []
-            similarity_threshold = 0.3  # Lower threshold for better recall
+            # Search only the document's own namespace; matches carry IDs, scores and
+            # vectors for diversity selection, texts are resolved locally
+            with span("query"):
+                search_results = self.index.query(
+                    vector=query_embedding,
+                    top_k=self.match_selector.fetch_k(top_k),
+                    include_metadata=False,
+                    include_values=True,
+                    namespace=namespace
+                )
+                logger.info(f"Pinecone search returned {len(search_results.matches)} matches")
+                chunks = self._resolve_chunks([match.id for match in search_results.matches], namespace)
             
-            logger.info(f"Pinecone search returned {len(search_results.matches)} matches")
+            candidates = []
             for i, match in enumerate(search_results.matches):
                 logger.info(f"Match {i+1}: score={match.score:.3f}, id={match.id}")
-                # Accept all matches for now to debug the issue
-                if match.metadata and "text" in match.metadata:
-                    relevant_chunks.append(match.metadata["text"])
-                    logger.info(f"Added chunk with score {match.score:.3f}: {match.metadata['text'][:100]}...")
+                if match.id in chunks:
+                    chunk_index, text = chunks[match.id]
+                    candidates.append({
+                        "id": match.id,
+                        "chunk_index": chunk_index,
+                        "text": text,
+                        "score": match.score,
+                        "values": match.values
+                    })
             
-            logger.info(f"Found {len(relevant_chunks)} relevant chunks (score >= {similarity_threshold}) for query in document {document_hash}")
-            return relevant_chunks
+            relevant_chunks = self.match_selector.select(candidates, top_k)
+            for match in relevant_chunks:
+                logger.info(f"Added chunk with score {match['score']:.3f}: {match['text'][:100]}...")
             
+            logger.info(
+                f"Found {len(relevant_chunks)} relevant chunks (score >= {self.match_selector.min_score}) "
+                f"for query in document {document_hash}"
+            )
+            return relevant_chunks
+        
         except Exception as e:
             logger.error(f"Error searching in Pinecone: {str(e)}")
             raise Exception(f"Failed to search for relevant chunks: {str(e)}")
     
+    def abort_document(self, document_url: str):
+        """Delete the vectors and chunk texts a failed ingestion already stored"""
+        self.clear_document_chunks(document_url)
+    
     def clear_document_chunks(self, document_url: str):
-        """Clear chunks for a specific document"""
+        """Clear chunks for a specific document by deleting its namespace"""
         try:
-            document_hash = self._generate_document_hash(document_url)
-            
-            # Query to get all vector IDs for this document
-            query_result = self.index.query(
-                vector=[0.0] * 768,  # Dummy vector
-                top_k=10000,  # Large number to get all
-                include_metadata=True,
-                filter={"document_hash": document_hash}
-            )
-            
-            if query_result.matches:
-                vector_ids = [match.id for match in query_result.matches]
-                self.index.delete(ids=vector_ids)
-                logger.info(f"Cleared {len(vector_ids)} vectors for document {document_hash}")
-            
+            self.chunk_store.delete_document(self._generate_document_hash(document_url))
+            namespace = self._namespace(document_url)
+            self.index.delete(delete_all=True, namespace=namespace)
+            logger.info(f"Cleared namespace {namespace} for document {document_url}")
+        
         except Exception as e:
+            # A document that was never stored has no namespace to delete
+            if getattr(e, "status_code", getattr(e, "status", None)) == 404:
+                return
             logger.error(f"Error clearing document chunks: {str(e)}")
             # Don't raise exception as this is non-critical
     
     def clear_index(self):
-        """Clear all vectors from the index"""
+        """Clear all vectors from every namespace of the index"""
         try:
-            self.index.delete(delete_all=True)
-            logger.info("Cleared all vectors from Pinecone index")
-            # Clear cache as well
-            with self._cache_lock:
-                self._embedding_cache.clear()
+            namespaces = list(self.index.describe_index_stats().namespaces or {})
+            for namespace in namespaces:
+                self.index.delete(delete_all=True, namespace=namespace)
+            logger.info(f"Cleared all vectors from {len(namespaces)} Pinecone namespaces")
+            # Clear cache and chunk texts as well
+            self.embedding_cache.clear()
+            self.chunk_store.clear()
         except Exception as e:
             logger.error(f"Error clearing index: {str(e)}")
             raise Exception(f"Failed to clear index: {str(e)}")
+    
+    def migrate_to_namespaces(self, source_namespace: str = "", delete_source: bool = True) -> Dict[str, int]:
+        """
+        Move vectors stored in a shared namespace into per-document namespaces
+        
+        Vectors are grouped by their document_hash metadata, which matches the
+        namespace name. Vectors without it are left where they are. Texts are
+        also copied into the local chunk store; the text metadata is kept so
+        other hosts can still resolve the migrated vectors.
+        
+        Args:
+            source_namespace: Shared namespace the vectors were written to
+            delete_source: Whether to delete migrated vectors from the source
+        
+        Returns:
+            Number of vectors moved per document namespace
+        """
+        moved: Dict[str, int] = {}
+        skipped = 0
+        try:
+            # Collect IDs up front so deletes never disturb list pagination
+            source_ids = [vector_id for id_page in self.index.list(namespace=source_namespace) for vector_id in id_page]
+            for i in range(0, len(source_ids), 100):
+                ids = source_ids[i:i + 100]
+                fetched = self.index.fetch(ids=ids, namespace=source_namespace).vectors
+                
+                by_namespace: Dict[str, List[Dict[str, Any]]] = {}
+                texts_by_namespace: Dict[str, List[Tuple[str, int, str]]] = {}
+                for vector_id, vector in fetched.items():
+                    metadata = dict(vector.metadata or {})
+                    namespace = metadata.get("document_hash")
+                    if not namespace:
+                        skipped += 1
+                        continue
+                    by_namespace.setdefault(namespace, []).append(
+                        {"id": vector_id, "values": list(vector.values), "metadata": metadata}
+                    )
+                    if "text" in metadata:
+                        texts_by_namespace.setdefault(namespace, []).append(
+                            (vector_id, int(metadata.get("chunk_index", 0)), metadata["text"])
+                        )
+                
+                for namespace, chunks in texts_by_namespace.items():
+                    self.chunk_store.put_many(namespace, chunks)
+                for namespace, vectors in by_namespace.items():
+                    batches = self._plan_upsert_batches(vectors)
+                    for batch_number, batch in enumerate(batches, start=1):
+                        self._upsert_batch(batch, namespace, batch_number, len(batches))
+                    if delete_source:
+                        self.index.delete(ids=[vector["id"] for vector in vectors], namespace=source_namespace)
+                    moved[namespace] = moved.get(namespace, 0) + len(vectors)
+            
+            logger.info(
+                f"Migrated {sum(moved.values())} vectors into {len(moved)} namespaces "
+                f"({skipped} without document_hash left in place)"
+            )
+            return moved
+        except Exception as e:
+            logger.error(f"Error migrating vectors to namespaces: {str(e)}")
+            raise Exception(f"Failed to migrate vectors: {str(e)}")
+    
+    def close(self):
+        """Release the embedding cache and the chunk store"""
+        super().close()
+        self.chunk_store.close()
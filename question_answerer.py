@@ -1,51 +1,286 @@
+import os
 import logging
-from typing import List
-from gemini_client import GeminiClient
-from pinecone_client import PineconeClient
+from typing import Any, Dict, Iterator, List, Optional
+from gemini_client import GeminiClient, ANSWER_PROMPT_VERSION
+from vector_store import VectorStore
+from answer_cache import AnswerCache
+from context_assembler import ContextAssembler
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from metrics import span, RETRIEVAL_QUESTIONS
 
 logger = logging.getLogger(__name__)
 
 class QuestionAnswerer:
-    """Handles question answering using Gemini AI and Pinecone search"""
+    """Handles question answering using Gemini AI and vector store search"""
     
-    def __init__(self, gemini_client: GeminiClient, pinecone_client: PineconeClient):
+    def __init__(
+        self,
+        gemini_client: GeminiClient,
+        vector_store: VectorStore,
+        answer_cache: Optional[AnswerCache] = None,
+        context_assembler: Optional[ContextAssembler] = None,
+        lexical_index: Optional[LexicalIndex] = None
+    ):
         self.gemini_client = gemini_client
-        self.pinecone_client = pinecone_client
+        self.vector_store = vector_store
+        self.answer_cache = answer_cache
+        self.context_assembler = context_assembler or ContextAssembler()
+        self.lexical_index = lexical_index
+        self.top_k = 6  # Most chunks per question; the match selector keeps fewer for easy questions
+        
+        # "hybrid" fuses BM25 with vector search and skips embedding for confident
+        # lexical matches; "vector" is embedding search only
+        self.retrieval_mode = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+        
+        # Questions answered together in one call, the union of chunks sent for them,
+        # and the share of a question's chunks that must already be in a group to join it
+        self.batch_max_questions = int(os.getenv("ANSWER_BATCH_MAX_QUESTIONS", "4"))
+        self.batch_max_chunks = int(os.getenv("ANSWER_BATCH_MAX_CHUNKS", "12"))
+        self.batch_min_overlap = float(os.getenv("ANSWER_BATCH_MIN_OVERLAP", "0.5"))
         logger.info("Question answerer initialized")
     
-    def answer_question(self, question: str, document_url: str) -> str:
+    def _retrieval_settings(self) -> str:
+        """Every retrieval, selection and context setting that changes which chunks an answer is built from"""
+        selector = self.vector_store.match_selector
+        settings = [
+            self.retrieval_mode,
+            selector.min_score, selector.score_gap, selector.mmr_lambda, selector.duplicate_similarity, selector.fetch_multiplier,
+            self.context_assembler.overlap_size, self.context_assembler.token_budget,
+            self.batch_max_questions, self.batch_max_chunks, self.batch_min_overlap
+        ]
+        if self.lexical_index is not None:
+            settings += [self.lexical_index.min_coverage, self.lexical_index.min_margin]
+        return "|".join(str(setting) for setting in settings)
+    
+    def _answer_cache_key(self, content_key: str, question: str) -> str:
+        return AnswerCache.make_key(
+            content_key, question, self.top_k, self.gemini_client.answer_model, ANSWER_PROMPT_VERSION, self._retrieval_settings()
+        )
+    
+    def get_cached_answers(self, content_key: str, questions: List[str]) -> Dict[int, str]:
+        """
+        Look up previously generated answers for questions about the same document content
+        
+        Args:
+            content_key: Content key of the indexed document the questions are about
+            questions: The questions to look up
+        
+        Returns:
+            Cached answers keyed by question index
+        """
+        if self.answer_cache is None or not questions:
+            return {}
+        keys = [self._answer_cache_key(content_key, question) for question in questions]
+        with span("answer_cache"):
+            found = self.answer_cache.get_many(keys)
+        return {index: found[key] for index, key in enumerate(keys) if key in found}
+    
+    def search_relevant_chunks_batch(
+        self,
+        questions: List[str],
+        document_url: str,
+        top_k: Optional[int] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve context for every question with one batched embedding call
+        
+        In hybrid mode each question is first searched in the lexical index.
+        Questions with a confident lexical match use it directly; the rest are
+        embedded together and their vector matches are fused with the lexical
+        ones by reciprocal rank fusion.
+        
+        Args:
+            questions: The questions to retrieve context for
+            document_url: Source document URL for namespace isolation
+            top_k: Most matches per question (defaults to self.top_k)
+        
+        Returns:
+            Matches (id, chunk_index, text, score) for each question, in question order
+        """
+        top_k = top_k or self.top_k
+        logger.info(f"Searching for relevant chunks for {len(questions)} questions")
+        if self.lexical_index is None or self.retrieval_mode != "hybrid":
+            RETRIEVAL_QUESTIONS.inc(len(questions), path="vector")
+            return self.vector_store.search_relevant_matches_batch(
+                queries=questions,
+                gemini_client=self.gemini_client,
+                document_url=document_url,
+                top_k=top_k
+            )
+        
+        with span("lexical"):
+            lexical = [self.lexical_index.search(question, document_url, top_k) for question in questions]
+        pending = [i for i, (_, confident) in enumerate(lexical) if not confident]
+        vector_matches = self.vector_store.search_relevant_matches_batch(
+            queries=[questions[i] for i in pending],
+            gemini_client=self.gemini_client,
+            document_url=document_url,
+            top_k=top_k
+        )
+        
+        # Confident lexical matches keep only those scoring close to the best one
+        selector = self.vector_store.match_selector
+        results = [selector.apply_cutoffs(matches) for matches, _ in lexical]
+        for i, matches in zip(pending, vector_matches):
+            # Each retriever contributes the matches that survived its cutoffs; fusion orders them
+            results[i] = reciprocal_rank_fusion([matches, results[i]], top_k)
+        RETRIEVAL_QUESTIONS.inc(len(pending), path="fused")
+        RETRIEVAL_QUESTIONS.inc(len(questions) - len(pending), path="lexical")
+        logger.info(f"Lexical fast path answered retrieval for {len(questions) - len(pending)}/{len(questions)} questions")
+        return results
+    
+    def answer_question(
+        self,
+        question: str,
+        document_url: str,
+        relevant_chunks: Optional[List[Dict[str, Any]]] = None,
+        content_key: Optional[str] = None
+    ) -> str:
         """
         Answer a question using semantic search and AI generation
         
         Args:
             question: The question to answer
             document_url: Source document URL for namespace isolation
-            
+            relevant_chunks: Matches already retrieved for this question, searched if None
+            content_key: Content key of the indexed document; answers grounded in retrieved chunks are cached under it
+        
         Returns:
             The answer as a string
         """
         try:
-            # Search for relevant chunks in the specific document namespace
-            logger.info(f"Searching for relevant chunks for question: {question[:100]}...")
-            relevant_chunks = self.pinecone_client.search_relevant_chunks(
-                query=question,
-                gemini_client=self.gemini_client,
-                document_url=document_url,
-                top_k=6  # Optimized for speed while maintaining accuracy
-            )
+            if relevant_chunks is None:
+                # Search for relevant chunks in the specific document namespace
+                logger.info(f"Searching for relevant chunks for question: {question[:100]}...")
+                relevant_chunks = self.search_relevant_chunks_batch([question], document_url)[0]
             
             if not relevant_chunks:
+                # Not cached: empty retrieval can be temporary (e.g. an index still being rebuilt)
                 return "No relevant information found in the document to answer this question."
             
-            # Generate answer using relevant chunks as context
-            logger.info(f"Generating answer using {len(relevant_chunks)} relevant chunks")
-            answer = self.gemini_client.answer_question_with_context(
+            # Generate answer from the merged, budgeted context passages
+            with span("assemble"):
+                context = self.context_assembler.assemble(relevant_chunks)
+            logger.info(f"Generating answer using {len(relevant_chunks)} relevant chunks in {len(context)} passages")
+            answer = self.gemini_client.generate_answer(
                 question=question,
-                context_chunks=relevant_chunks
+                context_chunks=context
             )
             
+            # Only answers that did not fail are cached
+            if content_key and self.answer_cache is not None:
+                self.answer_cache.put(self._answer_cache_key(content_key, question), answer)
             return answer
-            
+        
         except Exception as e:
             logger.error(f"Error answering question: {str(e)}")
             return f"Error processing question: {str(e)}"
+    
+    def group_questions(self, contexts: List[Optional[List[Dict[str, Any]]]]) -> List[List[int]]:
+        """
+        Group questions whose retrieved chunks overlap heavily so they can share one generation call
+        
+        A question joins the first group that already holds at least
+        batch_min_overlap of its chunks, as long as the group stays within the
+        question and chunk limits. Questions without retrieved chunks are kept
+        on their own.
+        
+        Args:
+            contexts: Retrieved matches per question (None if retrieval has not run)
+        
+        Returns:
+            Groups of question positions, in order of their first question
+        """
+        groups: List[List[int]] = []
+        group_chunks: List[Dict[str, None]] = []
+        for position, chunks in enumerate(contexts):
+            if self.batch_max_questions > 1 and chunks:
+                chunk_set = dict.fromkeys(match["id"] for match in chunks)
+                for group, union in zip(groups, group_chunks):
+                    if not union or len(group) >= self.batch_max_questions:
+                        continue
+                    overlap = sum(1 for chunk in chunk_set if chunk in union) / len(chunk_set)
+                    if overlap >= self.batch_min_overlap and len(union.keys() | chunk_set.keys()) <= self.batch_max_chunks:
+                        group.append(position)
+                        union.update(chunk_set)
+                        break
+                else:
+                    groups.append([position])
+                    group_chunks.append(chunk_set)
+            else:
+                groups.append([position])
+                group_chunks.append({})
+        return groups
+    
+    def answer_question_group(
+        self,
+        questions: List[str],
+        document_url: str,
+        contexts: List[Optional[List[Dict[str, Any]]]],
+        content_key: Optional[str] = None
+    ) -> List[str]:
+        """
+        Answer a group from group_questions, with one generation call when it holds several questions
+        
+        The group shares one context assembled from the union of its matches,
+        with a token budget that grows with the number of questions. Falls
+        back to answering each question separately if the batched response
+        cannot be parsed.
+        
+        Args:
+            questions: The questions of the group
+            document_url: Source document URL for namespace isolation
+            contexts: Retrieved matches per question
+            content_key: Content key of the indexed document; answers grounded in retrieved chunks are cached under it
+        
+        Returns:
+            Answers in question order
+        """
+        if len(questions) == 1:
+            return [self.answer_question(questions[0], document_url, contexts[0], content_key)]
+        
+        union = [match for chunks in contexts for match in chunks]
+        with span("assemble"):
+            context = self.context_assembler.assemble(union, self.context_assembler.token_budget * len(questions))
+        try:
+            answers = self.gemini_client.generate_answers_batch(questions, context)
+        except Exception as e:
+            logger.warning(f"Batched answer for {len(questions)} questions failed ({str(e)}), answering separately")
+            return [
+                self.answer_question(question, document_url, chunks, content_key)
+                for question, chunks in zip(questions, contexts)
+            ]
+        
+        if content_key and self.answer_cache is not None:
+            for question, answer in zip(questions, answers):
+                self.answer_cache.put(self._answer_cache_key(content_key, question), answer)
+        return answers
+    
+    def stream_answer(
+        self,
+        question: str,
+        document_url: str,
+        relevant_chunks: Optional[List[Dict[str, Any]]] = None
+    ) -> Iterator[str]:
+        """
+        Answer a question as a stream of text fragments
+        
+        Args:
+            question: The question to answer
+            document_url: Source document URL for namespace isolation
+            relevant_chunks: Matches already retrieved for this question, searched if None
+        
+        Yields:
+            Answer text fragments; joined they form the full answer
+        """
+        if relevant_chunks is None:
+            relevant_chunks = self.search_relevant_chunks_batch([question], document_url)[0]
+        
+        if not relevant_chunks:
+            yield "No relevant information found in the document to answer this question."
+            return
+        
+        with span("assemble"):
+            context = self.context_assembler.assemble(relevant_chunks)
+        logger.info(f"Streaming answer using {len(relevant_chunks)} relevant chunks in {len(context)} passages")
+        yield from self.gemini_client.stream_answer_with_context(question, context)
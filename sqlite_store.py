@@ -0,0 +1,217 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Keys per IN (...) query, well below SQLite's bound-parameter limit
+MAX_IN_PARAMETERS = 500
+
+class SQLiteStore:
+    """
+    SQLite database shared by all worker processes on the host
+    
+    Each process keeps one WAL-mode connection that its threads use under a
+    lock. The schema is created in a single transaction, so workers starting
+    together never see it half built.
+    """
+    
+    def __init__(self, db_path: str, schema: Sequence[str], synchronous: Optional[str] = "NORMAL"):
+        """
+        Open the database and create its schema
+        
+        Args:
+            db_path: SQLite file shared by all workers on the host
+            schema: CREATE statements (and any one-off backfills) to run at startup
+            synchronous: PRAGMA synchronous level, or None to keep SQLite's default
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        if synchronous:
+            self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.executescript("BEGIN IMMEDIATE;\n" + ";\n".join(schema) + ";\nCOMMIT;")
+    
+    def _select_in(self, query: str, keys: Sequence[Any], *params: Any) -> Iterator[tuple]:
+        """
+        Run a query over many keys in bounded batches; the caller holds the lock
+        
+        Args:
+            query: SELECT whose "{keys}" placeholder becomes the IN (...) list
+            keys: Values bound to the IN list, in batches of MAX_IN_PARAMETERS
+            params: Values bound after the keys in every batch
+        """
+        for i in range(0, len(keys), MAX_IN_PARAMETERS):
+            batch = keys[i:i + MAX_IN_PARAMETERS]
+            yield from self._conn.execute(query.format(keys=",".join("?" * len(batch))), (*batch, *params))
+    
+    def _write(self, statement: str, params: Sequence[Any] = ()):
+        """Run one statement and commit it"""
+        with self._lock:
+            self._conn.execute(statement, params)
+            self._conn.commit()
+    
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+class SQLiteLRUCache(SQLiteStore):
+    """
+    Cache table with a TTL and a byte budget enforced by LRU eviction
+    
+    The stored byte total lives in a one-row side table that triggers keep
+    current, so every worker sees the same total without summing the table on
+    each put. Reads only note which keys they hit; the accessed_at updates are
+    written with the next put, or once TOUCH_BATCH hits have piled up, so cache
+    hits do not each take SQLite's write lock.
+    """
+    
+    # Pending accessed_at updates that make a read flush them itself
+    TOUCH_BATCH = 256
+    # Seconds between sweeps for expired entries
+    EXPIRY_INTERVAL = 60
+    
+    def __init__(self, db_path: str, table: str, value_column: str, value_type: str, max_bytes: int, ttl_seconds: int):
+        """
+        Initialize the cache table
+        
+        Args:
+            db_path: SQLite file holding the cache
+            table: Table name, also used for its index, triggers and byte total
+            value_column: Column holding the cached value
+            value_type: SQL type of the value column
+            max_bytes: Budget for stored value bytes before LRU eviction
+            ttl_seconds: Age after which entries expire (0 disables expiry)
+        """
+        self.table = table
+        self.value_column = value_column
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._touched: Dict[str, float] = {}
+        self._expired_at = 0.0
+        # Value column goes last so size/time scans never touch overflow pages
+        super().__init__(db_path, [
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                cache_key TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                {value_column} {value_type} NOT NULL
+            )
+            """,
+            f"CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table} (accessed_at)",
+            f"CREATE TABLE IF NOT EXISTS {table}_bytes (total INTEGER NOT NULL)",
+            # Caches written before the side table existed are summed once here
+            f"INSERT INTO {table}_bytes (total) SELECT COALESCE(SUM(size), 0) FROM {table} "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {table}_bytes)",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_bytes_insert AFTER INSERT ON {table} "
+            f"BEGIN UPDATE {table}_bytes SET total = total + NEW.size; END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_bytes_update AFTER UPDATE OF size ON {table} "
+            f"BEGIN UPDATE {table}_bytes SET total = total + NEW.size - OLD.size; END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_bytes_delete AFTER DELETE ON {table} "
+            f"BEGIN UPDATE {table}_bytes SET total = total - OLD.size; END"
+        ])
+    
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Return unexpired values for the given keys, keyed by cache key"""
+        if not keys:
+            return {}
+        
+        now = time.time()
+        min_created_at = now - self.ttl_seconds if self.ttl_seconds else 0
+        with self._lock:
+            found = dict(self._select_in(
+                f"SELECT cache_key, {self.value_column} FROM {self.table} "
+                f"WHERE cache_key IN ({{keys}}) AND created_at >= ?",
+                list(dict.fromkeys(keys)),
+                min_created_at
+            ))
+            for key in found:
+                self._touched[key] = now
+            if len(self._touched) >= self.TOUCH_BATCH:
+                self._flush_touches()
+                self._conn.commit()
+        return found
+    
+    def put_many(self, entries: List[Tuple[str, int, Any]]):
+        """
+        Store values, then evict expired and least recently used entries
+        
+        Args:
+            entries: (cache_key, size in bytes, value) for each entry
+        """
+        if not entries:
+            return
+        
+        now = time.time()
+        with self._lock:
+            self._flush_touches()
+            self._conn.executemany(
+                f"INSERT INTO {self.table} (cache_key, size, created_at, accessed_at, {self.value_column}) "
+                f"VALUES (?, ?, ?, ?, ?) ON CONFLICT (cache_key) DO UPDATE SET size = excluded.size, "
+                f"created_at = excluded.created_at, accessed_at = excluded.accessed_at, "
+                f"{self.value_column} = excluded.{self.value_column}",
+                [(key, size, now, now, value) for key, size, value in entries]
+            )
+            self._evict(now)
+            self._conn.commit()
+    
+    def _flush_touches(self):
+        """Write the accessed_at times noted by reads; the caller holds the lock and commits"""
+        if not self._touched:
+            return
+        self._conn.executemany(
+            f"UPDATE {self.table} SET accessed_at = MAX(accessed_at, ?) WHERE cache_key = ?",
+            [(accessed_at, key) for key, accessed_at in self._touched.items()]
+        )
+        self._touched.clear()
+    
+    def _evict(self, now: float):
+        """Drop expired entries, then least recently used ones beyond the byte budget"""
+        if self.ttl_seconds and now - self._expired_at >= self.EXPIRY_INTERVAL:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._expired_at = now
+        
+        total_bytes = self._conn.execute(f"SELECT total FROM {self.table}_bytes").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+        
+        excess = total_bytes - self.max_bytes
+        freed = 0
+        stale_keys = []
+        for cache_key, size in self._conn.execute(
+            f"SELECT cache_key, size FROM {self.table} ORDER BY accessed_at"
+        ):
+            stale_keys.append((cache_key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE cache_key = ?", stale_keys)
+        logger.info(f"Evicted {len(stale_keys)} {self.table} ({freed} bytes) from cache")
+    
+    def total_bytes(self) -> int:
+        """Bytes currently stored, as tracked by the side table"""
+        with self._lock:
+            return self._conn.execute(f"SELECT total FROM {self.table}_bytes").fetchone()[0]
+    
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+    
+    def close(self):
+        """Write pending accessed_at updates and close the connection"""
+        with self._lock:
+            self._flush_touches()
+            self._conn.commit()
+            self._conn.close()
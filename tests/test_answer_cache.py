@@ -0,0 +1,75 @@
+from typing import List
+import pytest
+from answer_cache import AnswerCache
+from context_assembler import ContextAssembler
+from match_selector import MatchSelector
+from question_answerer import QuestionAnswerer
+
+class FakeVectorStore:
+    def __init__(self):
+        self.match_selector = MatchSelector(min_score=0.3, score_gap=0.25, mmr_lambda=0.7, duplicate_similarity=0.97, fetch_multiplier=2)
+
+class FakeGeminiClient:
+    answer_model = "fake-model"
+
+    def __init__(self):
+        self.generated = 0
+
+    def generate_answer(self, question: str, context_chunks: List[str]) -> str:
+        self.generated += 1
+        return f"answer to {question}"
+
+@pytest.fixture
+def answer_cache(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.db"))
+    yield cache
+    cache.close()
+
+@pytest.fixture
+def answerer(answer_cache, monkeypatch):
+    monkeypatch.setenv("RETRIEVAL_MODE", "hybrid")
+    return QuestionAnswerer(FakeGeminiClient(), FakeVectorStore(), answer_cache, ContextAssembler(150, token_budget=8000))
+
+BASE_KEY = ("content", "What is the grace period?", 6, "model", "v1", "settings")
+
+def test_make_key_ignores_question_formatting():
+    key = AnswerCache.make_key(*BASE_KEY)
+    assert AnswerCache.make_key("content", "  what is the   GRACE period ", 6, "model", "v1", "settings") == key
+
+@pytest.mark.parametrize("position, value", [
+    (0, "other-content"),
+    (1, "What is the waiting period?"),
+    (2, 8),
+    (3, "other-model"),
+    (4, "v2"),
+    (5, "other-settings")
+])
+def test_make_key_changes_with_every_component(position, value):
+    changed = list(BASE_KEY)
+    changed[position] = value
+    assert AnswerCache.make_key(*changed) != AnswerCache.make_key(*BASE_KEY)
+
+@pytest.mark.parametrize("change", [
+    lambda answerer: setattr(answerer, "retrieval_mode", "vector"),
+    lambda answerer: setattr(answerer.vector_store.match_selector, "min_score", 0.5),
+    lambda answerer: setattr(answerer.vector_store.match_selector, "mmr_lambda", 1.0),
+    lambda answerer: setattr(answerer.context_assembler, "token_budget", 4000),
+    lambda answerer: setattr(answerer.context_assembler, "overlap_size", 100),
+    lambda answerer: setattr(answerer, "batch_max_chunks", 20),
+    lambda answerer: setattr(answerer, "top_k", 4),
+    lambda answerer: setattr(answerer.gemini_client, "answer_model", "other-model")
+])
+def test_settings_change_invalidates_cached_answers(answerer, change):
+    chunks = [{"id": "doc_0000", "chunk_index": 0, "text": "The grace period is thirty days.", "score": 0.9}]
+    answerer.answer_question("What is the grace period?", "https://example.com/a.pdf", chunks, "content")
+    assert answerer.get_cached_answers("content", ["what is the grace period"]) == {0: "answer to What is the grace period?"}
+
+    change(answerer)
+    assert answerer.get_cached_answers("content", ["What is the grace period?"]) == {}
+
+def test_empty_retrieval_is_not_cached(answerer):
+    answer = answerer.answer_question("What is the grace period?", "https://example.com/a.pdf", [], "content")
+
+    assert answer.startswith("No relevant information")
+    assert answerer.gemini_client.generated == 0
+    assert answerer.get_cached_answers("content", ["What is the grace period?"]) == {}
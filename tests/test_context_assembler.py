@@ -0,0 +1,71 @@
+from typing import Any, Dict, Optional
+import pytest
+from context_assembler import ContextAssembler
+
+def match(chunk_index: Optional[int], text: str, score: float) -> Dict[str, Any]:
+    return {"id": f"c{chunk_index}", "chunk_index": chunk_index, "text": text, "score": score}
+
+@pytest.fixture
+def assembler():
+    return ContextAssembler(overlap_size=3, token_budget=1000)
+
+def test_consecutive_chunks_merge_without_repeated_overlap(assembler):
+    matches = [
+        match(1, "gamma delta epsilon zeta eta", 0.6),
+        match(0, "alpha beta gamma delta epsilon", 0.8)
+    ]
+
+    assert assembler.assemble(matches) == ["alpha beta gamma delta epsilon zeta eta"]
+
+def test_chunks_with_a_gap_stay_separate_and_ordered_by_score(assembler):
+    matches = [
+        match(0, "alpha beta gamma", 0.5),
+        match(2, "theta iota kappa", 0.9),
+        match(3, "iota kappa lambda", 0.4)
+    ]
+
+    assert assembler.assemble(matches) == ["theta iota kappa lambda", "alpha beta gamma"]
+
+def test_chunks_without_shared_words_are_joined_whole(assembler):
+    matches = [match(4, "one two three", 0.7), match(5, "four five six", 0.7)]
+
+    assert assembler.assemble(matches) == ["one two three four five six"]
+
+def test_duplicate_matches_keep_the_best_score(assembler):
+    matches = [
+        match(0, "alpha beta", 0.3),
+        match(5, "omega psi", 0.5),
+        match(0, "alpha beta", 0.9)
+    ]
+
+    assert assembler.assemble(matches) == ["alpha beta", "omega psi"]
+
+def test_matches_without_position_are_kept_as_is(assembler):
+    matches = [match(None, "loose passage", 0.95), match(None, "loose passage", 0.2), match(0, "alpha beta", 0.5)]
+
+    assert assembler.assemble(matches) == ["loose passage", "alpha beta"]
+
+def test_passages_stop_at_the_token_budget():
+    assembler = ContextAssembler(overlap_size=3, token_budget=30)
+    # 80 characters estimate 21 tokens, so only the best passage fits
+    matches = [match(0, "a" * 80, 0.5), match(2, "b" * 80, 0.9), match(4, "c" * 20, 0.1)]
+
+    passages = assembler.assemble(matches)
+
+    assert passages == ["b" * 80, "c" * 20]
+    assert sum(assembler.estimate_tokens(passage) for passage in passages) <= 30
+
+def test_budget_override_admits_more_passages():
+    assembler = ContextAssembler(overlap_size=3, token_budget=30)
+    matches = [match(0, "a" * 80, 0.5), match(2, "b" * 80, 0.9)]
+
+    assert assembler.assemble(matches, token_budget=60) == ["b" * 80, "a" * 80]
+
+def test_oversized_best_passage_is_truncated_at_a_word():
+    assembler = ContextAssembler(overlap_size=3, token_budget=5)
+    matches = [match(0, "word " * 40, 0.9)]
+
+    (passage,) = assembler.assemble(matches)
+
+    assert len(passage) <= 20
+    assert passage == "word word word word"
@@ -0,0 +1,76 @@
+import time
+import threading
+import concurrent.futures
+import pytest
+from embedding_cache import EmbeddingCache, InMemoryEmbeddingCache, SQLiteEmbeddingCache
+
+@pytest.fixture(params=["memory", "sqlite"])
+def embedding_cache(request, tmp_path):
+    if request.param == "memory":
+        cache = InMemoryEmbeddingCache(max_bytes=1024)
+    else:
+        cache = SQLiteEmbeddingCache(str(tmp_path / "embeddings.db"), max_bytes=1024)
+    yield cache
+    cache.close()
+
+def test_base_class_cannot_be_instantiated():
+    with pytest.raises(TypeError):
+        EmbeddingCache()
+
+def test_round_trip_is_keyed_by_model_and_text(embedding_cache):
+    embedding_cache.put_many("model-a", {"hello": [0.5, 1.5], "world": [2.0, -1.0]})
+
+    assert embedding_cache.get_many("model-a", ["hello", "world", "missing"]) == {"hello": [0.5, 1.5], "world": [2.0, -1.0]}
+    assert embedding_cache.get_many("model-b", ["hello"]) == {}
+
+    embedding_cache.clear()
+    assert embedding_cache.get_many("model-a", ["hello"]) == {}
+
+def test_byte_budget_evicts_least_recently_used(embedding_cache):
+    # 100 float32 values are 400 bytes, so only two fit in 1024
+    embedding_cache.put_many("model", {"a": [1.0] * 100, "b": [2.0] * 100})
+    embedding_cache.get_many("model", ["a"])
+    embedding_cache.put_many("model", {"c": [3.0] * 100})
+
+    assert sorted(embedding_cache.get_many("model", ["a", "b", "c"])) == ["a", "c"]
+
+def test_concurrent_misses_compute_each_text_once():
+    cache = InMemoryEmbeddingCache()
+    started = threading.Event()
+    release = threading.Event()
+    computed = []
+
+    def compute_batch(texts):
+        first_call = not computed
+        computed.extend(texts)
+        if first_call:
+            # Hold the first batch open until the second caller has computed its own miss
+            started.set()
+            release.wait(5)
+        return [[float(len(text))] for text in texts]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+        first = pool.submit(cache.get_or_compute_many, "model", ["a", "bb"], compute_batch)
+        started.wait(5)
+        second = pool.submit(cache.get_or_compute_many, "model", ["bb", "ccc", "a"], compute_batch)
+        while len(computed) < 3:
+            time.sleep(0.01)
+        release.set()
+
+        assert first.result() == [[1.0], [2.0]]
+        assert second.result() == [[2.0], [3.0], [1.0]]
+
+    assert sorted(computed) == ["a", "bb", "ccc"]
+    assert cache.stats() == {"hits": 0, "misses": 3, "waits": 2}
+
+def test_failed_computation_reaches_waiters_and_is_not_cached():
+    cache = InMemoryEmbeddingCache()
+
+    def fail(texts):
+        raise RuntimeError("quota exceeded")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute_many("model", ["a"], fail)
+
+    assert cache.get_or_compute_many("model", ["a"], lambda texts: [[1.0]]) == [[1.0]]
+    assert cache._inflight == {}
@@ -0,0 +1,83 @@
+from typing import List
+import httpx
+import pytest
+from google.genai import errors
+from gemini_client import GeminiClient
+
+@pytest.fixture
+def gemini_client(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setenv("EMBED_MAX_ITEMS_PER_CALL", "3")
+    monkeypatch.setenv("EMBED_MAX_TOKENS_PER_CALL", "100")
+    monkeypatch.setenv("GEMINI_MAX_RETRIES", "2")
+    monkeypatch.setattr("gemini_client.time.sleep", lambda seconds: None)
+    client = GeminiClient()
+    yield client
+    client._embed_pool.shutdown()
+
+def failing(failures: List[Exception]):
+    calls = []
+
+    def operation():
+        calls.append(len(calls))
+        if len(calls) <= len(failures):
+            raise failures[len(calls) - 1]
+        return "ok"
+    return operation, calls
+
+def test_batches_are_capped_by_item_count(gemini_client):
+    # 20 characters estimate 6 tokens each, far under the token limit
+    texts = ["x" * 20] * 7
+
+    assert gemini_client._plan_embedding_batches(texts) == [[0, 1, 2], [3, 4, 5], [6]]
+
+def test_batches_are_capped_by_estimated_tokens(gemini_client):
+    # 196 characters estimate 50 tokens, so two fill the 100-token limit
+    texts = ["x" * 196, "x" * 196, "x" * 196, "x" * 20]
+
+    batches = gemini_client._plan_embedding_batches(texts)
+
+    assert batches == [[0, 1], [2, 3]]
+    for batch in batches:
+        assert sum(gemini_client._estimate_tokens(texts[i]) for i in batch) <= gemini_client.embed_batch_max_tokens
+
+def test_oversized_text_gets_its_own_batch(gemini_client):
+    texts = ["short", "x" * 2000, "short"]
+
+    assert gemini_client._plan_embedding_batches(texts) == [[0], [1], [2]]
+
+def test_empty_input_plans_no_batches(gemini_client):
+    assert gemini_client._plan_embedding_batches([]) == []
+
+@pytest.mark.parametrize("failure", [
+    errors.ClientError(429, {"error": {"message": "quota", "status": "RESOURCE_EXHAUSTED"}}),
+    errors.ServerError(503, {"error": {"message": "overloaded", "status": "UNAVAILABLE"}}),
+    httpx.ConnectTimeout("timed out"),
+    httpx.ReadError("connection reset"),
+    ConnectionError("refused"),
+    TimeoutError()
+])
+def test_transient_failures_are_retried(gemini_client, failure):
+    operation, calls = failing([failure, failure])
+
+    assert gemini_client._with_retries(operation, "Test call") == "ok"
+    assert len(calls) == 3
+
+@pytest.mark.parametrize("failure", [
+    errors.ClientError(400, {"error": {"message": "bad request", "status": "INVALID_ARGUMENT"}}),
+    errors.ClientError(403, {"error": {"message": "denied", "status": "PERMISSION_DENIED"}}),
+    ValueError("bad input")
+])
+def test_permanent_failures_are_raised_immediately(gemini_client, failure):
+    operation, calls = failing([failure])
+
+    with pytest.raises(type(failure)):
+        gemini_client._with_retries(operation, "Test call")
+    assert len(calls) == 1
+
+def test_retries_stop_after_max_retries(gemini_client):
+    operation, calls = failing([ConnectionError("refused")] * 5)
+
+    with pytest.raises(ConnectionError):
+        gemini_client._with_retries(operation, "Test call")
+    assert len(calls) == gemini_client.max_retries + 1
@@ -0,0 +1,144 @@
+import asyncio
+import concurrent.futures
+from typing import Any, AsyncIterator, Dict, List, Optional
+import pytest
+from embedding_cache import InMemoryEmbeddingCache
+from ingestion import DocumentIngestor, EmptyDocumentError
+from ingestion_registry import IngestionRegistry
+from text_chunker import TextChunker
+from vector_store import LocalVectorStore
+
+DOCUMENT_URL = "https://example.com/policy.pdf"
+
+PAGES = [
+    " ".join(f"page{page} word{word}" for word in range(40))
+    for page in range(6)
+]
+
+class FakeDocumentProcessor:
+    """Serves one document, answering 304 when the caller's ETag matches"""
+
+    def __init__(self, pages: List[str], content_hash: str = "hash-1", etag: Optional[str] = "etag-1"):
+        self.pages = pages
+        self.content_hash = content_hash
+        self.etag = etag
+        self.fetches = 0
+        self.extractions = 0
+
+    async def fetch_document_async(
+        self,
+        document_url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        self.fetches += 1
+        # Let a second caller reach ingest() while this download is in flight
+        await asyncio.sleep(0.05)
+        if etag is not None and etag == self.etag:
+            return None
+        return {"content_hash": self.content_hash, "etag": self.etag, "last_modified": None, "pages": self.pages}
+
+    async def iter_pages_async(self, document: Dict[str, Any], executor: Any = None) -> AsyncIterator[str]:
+        self.extractions += 1
+        for page in document["pages"]:
+            await asyncio.sleep(0)
+            yield page
+
+class FakeGeminiClient:
+    """Counts embedding calls and returns small deterministic vectors"""
+
+    embedding_model = "fake-embedding"
+
+    def __init__(self):
+        self.embedded_texts = 0
+
+    def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        self.embedded_texts += len(texts)
+        return [[float(len(text)), float(sum(map(ord, text)) % 97), 1.0] for text in texts]
+
+@pytest.fixture
+def io_pool():
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+    yield pool
+    pool.shutdown()
+
+def make_ingestor(tmp_path, io_pool, processor: FakeDocumentProcessor, gemini_client: FakeGeminiClient) -> DocumentIngestor:
+    vector_store = LocalVectorStore(
+        embedding_cache=InMemoryEmbeddingCache(),
+        spill_dir=str(tmp_path / "local_index"),
+        spill_bytes=-1
+    )
+    return DocumentIngestor(
+        processor,
+        TextChunker(chunk_size=50, overlap_size=10, size_unit="words", sentence_aware=False),
+        gemini_client,
+        vector_store,
+        IngestionRegistry(str(tmp_path / "ingestion.db")),
+        io_pool,
+        io_pool
+    )
+
+def test_concurrent_ingests_share_one_pipeline_run(tmp_path, io_pool):
+    processor = FakeDocumentProcessor(PAGES)
+    gemini_client = FakeGeminiClient()
+    ingestor = make_ingestor(tmp_path, io_pool, processor, gemini_client)
+
+    async def ingest_twice():
+        return await asyncio.gather(ingestor.ingest(DOCUMENT_URL), ingestor.ingest(DOCUMENT_URL))
+
+    first, second = asyncio.run(ingest_twice())
+
+    assert first == second
+    assert first["cached"] is False
+    assert first["chunk_count"] > 1
+    assert processor.fetches == 1
+    assert processor.extractions == 1
+    assert gemini_client.embedded_texts == first["chunk_count"]
+    assert ingestor._inflight == {}
+    assert len(ingestor.vector_store.get_document_chunks(DOCUMENT_URL)) == first["chunk_count"]
+
+def test_unmodified_document_reuses_index(tmp_path, io_pool):
+    processor = FakeDocumentProcessor(PAGES)
+    gemini_client = FakeGeminiClient()
+    ingestor = make_ingestor(tmp_path, io_pool, processor, gemini_client)
+
+    first = asyncio.run(ingestor.ingest(DOCUMENT_URL))
+    embedded = gemini_client.embedded_texts
+    second = asyncio.run(ingestor.ingest(DOCUMENT_URL))
+
+    assert second["cached"] is True
+    assert second["content_key"] == first["content_key"]
+    assert second["chunk_count"] == first["chunk_count"]
+    assert processor.extractions == 1
+    assert gemini_client.embedded_texts == embedded
+
+def test_unchanged_content_under_new_etag_is_deduplicated(tmp_path, io_pool):
+    processor = FakeDocumentProcessor(PAGES)
+    gemini_client = FakeGeminiClient()
+    ingestor = make_ingestor(tmp_path, io_pool, processor, gemini_client)
+
+    first = asyncio.run(ingestor.ingest(DOCUMENT_URL))
+    processor.etag = "etag-2"
+    second = asyncio.run(ingestor.ingest(DOCUMENT_URL))
+
+    assert second["cached"] is True
+    assert second["content_key"] == first["content_key"]
+    assert processor.fetches == 2
+    assert processor.extractions == 1
+    assert ingestor.ingestion_registry.get(DOCUMENT_URL)["etag"] == "etag-2"
+
+def test_failed_ingest_is_not_shared_or_recorded(tmp_path, io_pool):
+    processor = FakeDocumentProcessor(["   "] * 3)
+    ingestor = make_ingestor(tmp_path, io_pool, processor, FakeGeminiClient())
+
+    with pytest.raises(EmptyDocumentError):
+        asyncio.run(ingestor.ingest(DOCUMENT_URL))
+
+    assert ingestor._inflight == {}
+    assert ingestor.vector_store._pending == {}
+    assert ingestor.ingestion_registry.get(DOCUMENT_URL) is None
+
+    processor.pages = PAGES
+    result = asyncio.run(ingestor.ingest(DOCUMENT_URL))
+    assert result["cached"] is False
+    assert processor.extractions == 2
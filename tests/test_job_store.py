@@ -0,0 +1,109 @@
+import os
+import socket
+import pytest
+from job_store import JobStore
+
+DOCUMENT_URL = "https://example.com/policy.pdf"
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+@pytest.fixture
+def job_store(db_path):
+    store = JobStore(db_path)
+    yield store
+    store.close()
+
+def test_new_job_is_queued_with_empty_answers(job_store):
+    job_id = job_store.create(DOCUMENT_URL, ["What is covered?", "What is excluded?"])
+
+    job = job_store.get(job_id)
+    assert job["status"] == "queued" and job["stage"] == "queued"
+    assert job["document_url"] == DOCUMENT_URL
+    assert job["questions"] == ["What is covered?", "What is excluded?"]
+    assert job["answers"] == [None, None]
+    assert job["error"] is None
+
+def test_unknown_job_is_none(job_store):
+    assert job_store.get("missing") is None
+
+def test_status_moves_through_the_lifecycle(job_store):
+    job_id = job_store.create(DOCUMENT_URL, ["Q1", "Q2"])
+
+    job_store.update(job_id, "running")
+    job_store.update(job_id, None, "answer")
+    job = job_store.get(job_id)
+    assert (job["status"], job["stage"]) == ("running", "answer")
+
+    job_store.set_answer(job_id, 1, "Second answer")
+    assert job_store.get(job_id)["answers"] == [None, "Second answer"]
+
+    job_store.set_answer(job_id, 0, "First answer")
+    job_store.update(job_id, "completed", "done")
+    job = job_store.get(job_id)
+    assert (job["status"], job["stage"]) == ("completed", "done")
+    assert job["answers"] == ["First answer", "Second answer"]
+    assert job["updated_at"] >= job["created_at"]
+
+def test_failure_keeps_stage_and_records_error(job_store):
+    job_id = job_store.create(DOCUMENT_URL, ["Q1"])
+    job_store.update(job_id, "running", "ingest")
+
+    job_store.update(job_id, "failed", None, "Document download failed")
+
+    job = job_store.get(job_id)
+    assert (job["status"], job["stage"], job["error"]) == ("failed", "ingest", "Document download failed")
+
+def test_set_answer_on_unknown_job_is_ignored(job_store):
+    job_store.set_answer("missing", 0, "Answer")
+    assert job_store.get("missing") is None
+
+def test_jobs_and_partial_answers_survive_reopening(db_path):
+    store = JobStore(db_path)
+    job_id = store.create(DOCUMENT_URL, ["Q1", "Q2"])
+    store.update(job_id, "running", "answer")
+    store.set_answer(job_id, 0, "First answer")
+    store.close()
+
+    reopened = JobStore(db_path)
+    job = reopened.get(job_id)
+    reopened.close()
+
+    assert (job["status"], job["stage"]) == ("running", "answer")
+    assert job["answers"] == ["First answer", None]
+
+def test_restarted_worker_claims_unfinished_jobs_once(db_path):
+    store = JobStore(db_path)
+    running = store.create(DOCUMENT_URL, ["Q1"])
+    store.update(running, "running", "answer")
+    queued = store.create(DOCUMENT_URL, ["Q2"])
+    finished = store.create(DOCUMENT_URL, ["Q3"])
+    store.update(finished, "completed", "done")
+    store.close()
+
+    # Same PID but a new owner suffix, as after a worker restart
+    restarted = JobStore(db_path)
+    try:
+        assert restarted.claim_orphaned() == [running, queued]
+        assert restarted.get(running)["status"] == "queued"
+        assert restarted.get(finished)["status"] == "completed"
+        # The claimed jobs now belong to a live owner
+        assert restarted.claim_orphaned() == []
+    finally:
+        restarted.close()
+
+def test_live_owner_keeps_its_jobs(job_store, db_path):
+    job_store.create(DOCUMENT_URL, ["Q1"])
+
+    assert job_store.claim_orphaned() == []
+
+def test_owner_liveness_follows_the_process(job_store):
+    host = socket.gethostname()
+
+    assert job_store._owner_alive(job_store.owner)
+    assert job_store._owner_alive(f"{host}:{os.getppid()}:00000000")
+    # Past the kernel's largest PID, so no such process can exist
+    assert not job_store._owner_alive(f"{host}:{2 ** 22 + 1}:00000000")
+    assert not job_store._owner_alive(f"{host}:{os.getpid()}:00000000")
+    assert not job_store._owner_alive("other-host:1:00000000")
@@ -0,0 +1,97 @@
+import asyncio
+from typing import List
+import pytest
+from job_store import JobStore
+from jobs import JobRunner
+
+DOCUMENT_URL = "https://example.com/policy.pdf"
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+def test_runner_runs_submitted_jobs_within_its_worker_limit(db_path):
+    ran: List[str] = []
+    active = 0
+    peak = 0
+
+    async def main():
+        job_store = JobStore(db_path)
+
+        async def handler(job_id: str):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            job_store.update(job_id, "completed", "done")
+            ran.append(job_id)
+            active -= 1
+
+        runner = JobRunner(job_store, handler, workers=2)
+        runner.start()
+        job_ids = [runner.job_store.create(DOCUMENT_URL, [f"Q{i}"]) for i in range(5)]
+        for job_id in job_ids:
+            runner.submit(job_id)
+        await runner._queue.join()
+        statuses = [runner.job_store.get(job_id)["status"] for job_id in job_ids]
+        await runner.close()
+        return job_ids, statuses
+
+    job_ids, statuses = asyncio.run(main())
+
+    assert sorted(ran) == sorted(job_ids)
+    assert statuses == ["completed"] * 5
+    assert peak == 2
+
+def test_handler_exception_marks_the_job_failed(db_path):
+    async def handler(job_id: str):
+        raise RuntimeError("Gemini quota exceeded")
+
+    async def main():
+        runner = JobRunner(JobStore(db_path), handler, workers=1)
+        runner.start()
+        job_id = runner.job_store.create(DOCUMENT_URL, ["Q1"])
+        runner.submit(job_id)
+        await runner._queue.join()
+        job = runner.job_store.get(job_id)
+        await runner.close()
+        return job
+
+    job = asyncio.run(main())
+
+    assert job["status"] == "failed"
+    assert job["error"] == "Gemini quota exceeded"
+
+def test_jobs_interrupted_by_close_resume_on_the_next_start(db_path):
+    started = []
+    resumed = []
+
+    async def blocking_handler(job_id: str):
+        started.append(job_id)
+        await asyncio.Event().wait()
+
+    async def finishing_handler(job_id: str):
+        resumed.append(job_id)
+
+    async def interrupt():
+        runner = JobRunner(JobStore(db_path), blocking_handler, workers=1)
+        runner.start()
+        job_id = runner.job_store.create(DOCUMENT_URL, ["Q1"])
+        runner.job_store.update(job_id, "running")
+        runner.submit(job_id)
+        while not started:
+            await asyncio.sleep(0)
+        await runner.close()
+        return job_id
+
+    async def restart():
+        runner = JobRunner(JobStore(db_path), finishing_handler, workers=1)
+        runner.start()
+        await runner._queue.join()
+        await runner.close()
+
+    job_id = asyncio.run(interrupt())
+    asyncio.run(restart())
+
+    assert started == [job_id]
+    assert resumed == [job_id]
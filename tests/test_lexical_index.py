@@ -0,0 +1,101 @@
+import math
+from collections import Counter
+from typing import List
+import pytest
+from lexical_index import DocumentIndex, LexicalIndex, reciprocal_rank_fusion, tokenize
+
+CHUNKS = [
+    "The grace period for premium payment is thirty days.",
+    "Maternity expenses are covered after a waiting period of twenty four months.",
+    "Clause 3.1.2 excludes pre-existing diseases for thirty six months.",
+    "The policy covers hospitalisation and day care procedures.",
+    "Premium payment can be made monthly or yearly."
+]
+
+def reference_bm25(texts: List[str], terms: List[str], k1: float = 1.2, b: float = 0.75) -> List[float]:
+    documents = [tokenize(text) for text in texts]
+    average_length = sum(map(len, documents)) / len(documents)
+    scores = []
+    for tokens in documents:
+        frequencies = Counter(tokens)
+        score = 0.0
+        for term in terms:
+            frequency = sum(1 for document in documents if term in document)
+            if term not in frequencies:
+                continue
+            idf = math.log1p((len(documents) - frequency + 0.5) / (frequency + 0.5))
+            tf = frequencies[term]
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(tokens) / average_length))
+        scores.append(score)
+    return scores
+
+class FakeVectorStore:
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+
+    def _generate_document_hash(self, document_url: str) -> str:
+        return "doc"
+
+    def _generate_chunk_id(self, text: str, document_hash: str, chunk_index: int) -> str:
+        return f"{document_hash}_{chunk_index:04d}"
+
+    def get_document_chunks(self, document_url: str) -> List[str]:
+        return list(self.texts)
+
+def test_tokenize_keeps_clause_numbers_and_compound_terms():
+    assert tokenize("Clause 3.1.2 and/or Pre-Existing") == ["clause", "3.1.2", "and/or", "pre-existing"]
+
+@pytest.mark.parametrize("terms", [["premium", "payment"], ["thirty", "months"], ["period"], ["3.1.2", "pre-existing"]])
+def test_bm25_scores_match_reference(terms):
+    index = DocumentIndex([f"c{i}" for i in range(len(CHUNKS))], CHUNKS)
+    results, _ = index.search(terms, top_k=len(CHUNKS))
+
+    expected = reference_bm25(CHUNKS, terms)
+    ranked = sorted((i for i, score in enumerate(expected) if score > 0), key=lambda i: -expected[i])
+    assert [chunk for chunk, _ in results] == ranked
+    for chunk, score in results:
+        assert score == pytest.approx(expected[chunk], rel=1e-5)
+
+def test_bm25_coverage_and_unknown_terms():
+    index = DocumentIndex([f"c{i}" for i in range(len(CHUNKS))], CHUNKS)
+
+    results, coverage = index.search(["maternity", "waiting"], top_k=3)
+    assert results[0][0] == 1
+    assert coverage == pytest.approx(1.0)
+
+    _, coverage = index.search(["maternity", "dental"], top_k=3)
+    assert 0 < coverage < 1
+
+    assert index.search(["dental"], top_k=3) == ([], 0.0)
+
+def test_rrf_rewards_agreement_between_rankings():
+    vector = [{"id": "a", "chunk_index": 0}, {"id": "b", "chunk_index": 1}, {"id": "c", "chunk_index": 2}]
+    lexical = [{"id": "b", "chunk_index": 1}, {"id": "d", "chunk_index": 3}, {"id": "c", "chunk_index": 2}]
+
+    fused = reciprocal_rank_fusion([vector, lexical], top_k=4, k=60)
+
+    assert [match["id"] for match in fused] == ["b", "c", "a", "d"]
+    assert fused[0]["score"] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[1]["score"] == pytest.approx(2 / 63)
+
+def test_rrf_deduplicates_by_chunk_and_truncates():
+    vector = [{"id": "x", "chunk_index": 5, "text": "from vector"}]
+    lexical = [{"id": "x-other-id", "chunk_index": 5, "text": "from lexical"}, {"id": "y", "chunk_index": 6}]
+
+    fused = reciprocal_rank_fusion([vector, lexical], top_k=1)
+
+    assert len(fused) == 1
+    assert fused[0]["text"] == "from vector"
+
+def test_lexical_search_is_confident_only_for_a_clear_winner():
+    lexical_index = LexicalIndex(FakeVectorStore(CHUNKS), min_coverage=0.85, min_margin=1.5)
+
+    matches, confident = lexical_index.search("What is the maternity waiting period?", "url", top_k=3)
+    assert matches[0]["id"] == "doc_0001"
+    assert matches[0]["text"] == CHUNKS[1]
+    assert confident
+
+    _, confident = lexical_index.search("premium payment", "url", top_k=3)
+    assert not confident
+
+    assert lexical_index.search("what is the", "url", top_k=3) == ([], False)
@@ -0,0 +1,55 @@
+from typing import Any, Dict, List
+import pytest
+from match_selector import MatchSelector
+
+def match(chunk_index: int, score: float, values: List[float]) -> Dict[str, Any]:
+    return {"id": f"doc_{chunk_index:04d}", "chunk_index": chunk_index, "text": f"chunk {chunk_index}", "score": score, "values": values}
+
+def selector(**overrides) -> MatchSelector:
+    settings = {"min_score": 0.3, "score_gap": 0.25, "mmr_lambda": 0.7, "duplicate_similarity": 0.97, "fetch_multiplier": 2}
+    settings.update(overrides)
+    return MatchSelector(**settings)
+
+def test_fetch_k_scales_with_multiplier():
+    assert selector(fetch_multiplier=3).fetch_k(6) == 18
+
+def test_cutoffs_apply_score_gap_and_min_score():
+    matches = [match(0, 0.8, []), match(1, 0.7, []), match(2, 0.62, []), match(3, 0.58, []), match(4, 0.35, [])]
+
+    assert [m["chunk_index"] for m in selector().apply_cutoffs(matches)] == [0, 1, 2]
+    assert [m["chunk_index"] for m in selector().apply_cutoffs(matches, min_score=0.65)] == [0, 1]
+    assert [m["chunk_index"] for m in selector(score_gap=1.0).apply_cutoffs(matches, min_score=0.3)] == [0, 1, 2, 3, 4]
+
+def test_cutoffs_always_keep_the_best_match():
+    matches = [match(0, 0.1, []), match(1, 0.09, [])]
+    assert [m["chunk_index"] for m in selector().apply_cutoffs(matches, min_score=0.3)] == [0]
+    assert selector().apply_cutoffs([]) == []
+
+def test_select_skips_near_duplicates():
+    candidates = [
+        match(0, 0.90, [1.0, 0.0, 0.0]),
+        match(1, 0.89, [1.0, 0.01, 0.0]),
+        match(2, 0.80, [0.0, 1.0, 0.0])
+    ]
+    selected = selector().select(candidates, top_k=3)
+
+    assert [m["chunk_index"] for m in selected] == [0, 2]
+    assert all("values" not in m for m in selected)
+
+def test_mmr_prefers_diverse_chunks_over_similar_higher_scores():
+    candidates = [
+        match(0, 0.90, [1.0, 0.0]),
+        match(1, 0.88, [0.9, 0.3]),
+        match(2, 0.80, [0.0, 1.0])
+    ]
+
+    assert [m["chunk_index"] for m in selector(mmr_lambda=0.5).select(candidates, top_k=2)] == [0, 2]
+    assert [m["chunk_index"] for m in selector(mmr_lambda=1.0).select(candidates, top_k=2)] == [0, 1]
+
+def test_select_respects_top_k_and_cutoffs():
+    candidates = [match(i, 0.9 - i * 0.01, [float(i == j) for j in range(8)]) for i in range(8)]
+
+    assert len(selector().select(candidates, top_k=3)) == 3
+    assert [m["chunk_index"] for m in selector().select(candidates, top_k=1)] == [0]
+    assert [m["chunk_index"] for m in selector(min_score=0.885).select(candidates, top_k=5)] == [0, 1]
+    assert selector().select([], top_k=3) == []
@@ -0,0 +1,101 @@
+import asyncio
+import re
+import concurrent.futures
+import pytest
+from metrics import (
+    Counter, Gauge, Histogram, Metric, MetricsRegistry, RequestTimings, TimingMiddleware,
+    HTTP_REQUESTS, bind_context, record_stage, span
+)
+
+def test_metric_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        Metric("test_metric", "Abstract")
+
+def test_counter_renders_prometheus_text():
+    counter = Counter("test_requests_total", "Requests by route", ["route", "status"])
+    counter.inc(route="/run", status=200)
+    counter.inc(2, route="/run", status=200)
+    counter.inc(0.5, route='/say "hi"\n', status=500)
+
+    assert counter.render().splitlines() == [
+        "# HELP test_requests_total Requests by route",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{route="/run",status="200"} 3',
+        'test_requests_total{route="/say \\"hi\\"\\n",status="500"} 0.5'
+    ]
+
+def test_labels_must_match_declared_names():
+    counter = Counter("test_total", "Total", ["cache"])
+    with pytest.raises(ValueError):
+        counter.inc(result="hit")
+
+def test_gauge_moves_both_ways():
+    gauge = Gauge("test_in_flight", "In flight")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    assert gauge.render().splitlines()[-1] == "test_in_flight 1"
+    gauge.set(7.25)
+    assert gauge.value() == 7.25
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    histogram = Histogram("test_seconds", "Latency", ["stage"], buckets=(0.1, 1.0, 0.5))
+    for value in (0.05, 0.1, 0.3, 2.0):
+        histogram.observe(value, stage="embed")
+
+    assert histogram.render().splitlines()[2:] == [
+        'test_seconds_bucket{stage="embed",le="0.1"} 2',
+        'test_seconds_bucket{stage="embed",le="0.5"} 3',
+        'test_seconds_bucket{stage="embed",le="1"} 3',
+        'test_seconds_bucket{stage="embed",le="+Inf"} 4',
+        'test_seconds_sum{stage="embed"} 2.45',
+        'test_seconds_count{stage="embed"} 4'
+    ]
+
+def test_registry_renders_every_family_and_rejects_duplicates():
+    registry = MetricsRegistry()
+    registry.register(Counter("test_a_total", "A"))
+    registry.register(Gauge("test_b", "B"))
+    with pytest.raises(ValueError):
+        registry.register(Counter("test_a_total", "Again"))
+
+    text = registry.render()
+    assert text.endswith("\n")
+    assert "# TYPE test_a_total counter" in text and "# TYPE test_b gauge" in text
+
+def test_request_timings_header_sums_repeated_stages():
+    timings = RequestTimings()
+    timings.add("download", 0.0123)
+    timings.add("embed", 0.1)
+    timings.add("embed", 0.05)
+
+    entries = timings.header().split(", ")
+    assert entries[:2] == ["download;dur=12.3", 'embed;dur=150.0;desc="2 calls"']
+    assert re.fullmatch(r"total;dur=\d+\.\d", entries[2])
+
+def test_middleware_sends_server_timing_with_stages_from_worker_threads():
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    async def app(scope, receive, send):
+        with span("lexical"):
+            pass
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(pool, bind_context(record_stage, "embed", 0.02))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/test"}
+    before = HTTP_REQUESTS.value(method="GET", route="unmatched", status=200)
+    asyncio.run(TimingMiddleware(app)(scope, None, send))
+    pool.shutdown()
+
+    headers = dict(messages[0]["headers"])
+    stages = [entry.split(";")[0] for entry in headers[b"server-timing"].decode().split(", ")]
+    assert stages == ["lexical", "embed", "total"]
+    assert "embed;dur=20.0" in headers[b"server-timing"].decode()
+    assert HTTP_REQUESTS.value(method="GET", route="unmatched", status=200) == before + 1
@@ -0,0 +1,149 @@
+from types import SimpleNamespace
+from typing import Any, Dict, List
+import pytest
+import urllib3
+from pinecone.exceptions import PineconeApiException
+from chunk_store import ChunkStore
+from embedding_cache import InMemoryEmbeddingCache
+from pinecone_client import PineconeClient, is_retryable
+
+DOCUMENT_URL = "https://example.com/policy.pdf"
+
+class FakeIndex:
+    """Records upserts and namespace deletes, failing queued upserts or every upsert from a given call on"""
+
+    def __init__(self):
+        self.namespaces: Dict[str, Dict[str, Any]] = {}
+        self.upsert_calls = 0
+        self.fail_from_call = None
+        self.failure = RuntimeError("upsert failed")
+        self.queued_failures: List[Exception] = []
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str):
+        self.upsert_calls += 1
+        if self.queued_failures:
+            raise self.queued_failures.pop(0)
+        if self.fail_from_call is not None and self.upsert_calls >= self.fail_from_call:
+            raise self.failure
+        self.namespaces.setdefault(namespace, {}).update({vector["id"]: vector for vector in vectors})
+
+    def delete(self, delete_all: bool, namespace: str):
+        self.namespaces.pop(namespace, None)
+
+class FakeRpcError(Exception):
+    """Stands in for grpc.RpcError, which reports its status through code()"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.name = name
+
+    def code(self):
+        return SimpleNamespace(name=self.name)
+
+class FakePinecone:
+    def __init__(self, index: FakeIndex):
+        self.index = index
+
+    def Index(self, name: str, **kwargs) -> FakeIndex:
+        return self.index
+
+@pytest.fixture
+def fake_index():
+    return FakeIndex()
+
+@pytest.fixture
+def pinecone_client(tmp_path, monkeypatch, fake_index):
+    monkeypatch.setenv("PINECONE_API_KEY", "test-key")
+    monkeypatch.setenv("PINECONE_TRANSPORT", "http")
+    monkeypatch.setenv("PINECONE_MAX_RETRIES", "2")
+    monkeypatch.setattr(PineconeClient, "_create_client", lambda self, api_key: FakePinecone(fake_index))
+    monkeypatch.setattr(PineconeClient, "_ensure_index_exists", lambda self: None)
+    monkeypatch.setattr("pinecone_client.time.sleep", lambda seconds: None)
+    client = PineconeClient(InMemoryEmbeddingCache(), ChunkStore(str(tmp_path / "chunks.db")))
+    yield client
+    client.close()
+
+def test_abort_document_removes_partial_vectors_and_texts(pinecone_client, fake_index):
+    namespace = pinecone_client._namespace(DOCUMENT_URL)
+    pinecone_client.begin_document(DOCUMENT_URL)
+    pinecone_client.upsert_embedded_chunks(DOCUMENT_URL, ["first", "second"], [[1.0, 0.0], [0.0, 1.0]])
+    assert len(fake_index.namespaces[namespace]) == 2
+
+    fake_index.fail_from_call = fake_index.upsert_calls + 1
+    with pytest.raises(Exception):
+        pinecone_client.upsert_embedded_chunks(DOCUMENT_URL, ["third"], [[1.0, 1.0]], start_index=2)
+    assert pinecone_client.has_document(DOCUMENT_URL)
+
+    pinecone_client.abort_document(DOCUMENT_URL)
+
+    assert namespace not in fake_index.namespaces
+    assert not pinecone_client.has_document(DOCUMENT_URL)
+    assert pinecone_client.get_document_chunks(DOCUMENT_URL) == []
+
+def vector(i: int, dimension: int = 8) -> Dict[str, Any]:
+    return {"id": f"chunk-{i}", "values": [0.125] * dimension, "metadata": {"chunk_index": i}}
+
+def test_upsert_batches_stay_under_the_byte_limit(pinecone_client):
+    vectors = [vector(i) for i in range(20)]
+    size = pinecone_client._estimate_vector_bytes(vectors[0])
+    pinecone_client.upsert_max_bytes = size * 3 + size // 2
+
+    batches = pinecone_client._plan_upsert_batches(vectors)
+
+    assert [len(batch) for batch in batches] == [3] * 6 + [2]
+    for batch in batches:
+        assert sum(pinecone_client._estimate_vector_bytes(v) for v in batch) <= pinecone_client.upsert_max_bytes
+    assert [v["id"] for batch in batches for v in batch] == [v["id"] for v in vectors]
+
+def test_upsert_batches_stay_under_the_vector_limit(pinecone_client):
+    pinecone_client.upsert_max_vectors = 4
+
+    batches = pinecone_client._plan_upsert_batches([vector(i) for i in range(10)])
+
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+
+def test_oversized_vector_is_sent_alone(pinecone_client):
+    vectors = [vector(0), vector(1, dimension=512), vector(2)]
+    pinecone_client.upsert_max_bytes = pinecone_client._estimate_vector_bytes(vectors[0]) * 2
+
+    batches = pinecone_client._plan_upsert_batches(vectors)
+
+    assert [[v["id"] for v in batch] for batch in batches] == [["chunk-0"], ["chunk-1"], ["chunk-2"]]
+
+@pytest.mark.parametrize("error", [
+    PineconeApiException("throttled", status_code=429),
+    PineconeApiException("unavailable", status_code=503),
+    urllib3.exceptions.ProtocolError("connection aborted"),
+    urllib3.exceptions.ReadTimeoutError(None, "/vectors/upsert", "read timed out"),
+    ConnectionError("refused"),
+    TimeoutError(),
+    FakeRpcError("UNAVAILABLE"),
+    FakeRpcError("RESOURCE_EXHAUSTED")
+])
+def test_transient_errors_are_retryable(error):
+    assert is_retryable(error)
+
+@pytest.mark.parametrize("error", [
+    PineconeApiException("bad request", status_code=400),
+    PineconeApiException("unauthorized", status_code=401),
+    ValueError("dimension mismatch"),
+    FakeRpcError("INVALID_ARGUMENT")
+])
+def test_permanent_errors_are_not_retryable(error):
+    assert not is_retryable(error)
+
+def test_upsert_retries_transient_failures(pinecone_client, fake_index):
+    namespace = pinecone_client._namespace(DOCUMENT_URL)
+    fake_index.queued_failures = [PineconeApiException("throttled", status_code=429), ConnectionError("reset")]
+
+    pinecone_client._upsert_batch([vector(0)], namespace, 1, 1)
+
+    assert fake_index.upsert_calls == 3
+    assert list(fake_index.namespaces[namespace]) == ["chunk-0"]
+
+def test_upsert_raises_permanent_failures_without_retrying(pinecone_client, fake_index):
+    fake_index.queued_failures = [PineconeApiException("bad request", status_code=400)]
+
+    with pytest.raises(PineconeApiException):
+        pinecone_client._upsert_batch([vector(0)], pinecone_client._namespace(DOCUMENT_URL), 1, 1)
+    assert fake_index.upsert_calls == 1
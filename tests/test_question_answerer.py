@@ -0,0 +1,145 @@
+from typing import Any, Dict, List, Tuple
+import pytest
+from answer_cache import AnswerCache
+from context_assembler import ContextAssembler
+from match_selector import MatchSelector
+from question_answerer import QuestionAnswerer
+
+DOCUMENT_URL = "https://example.com/policy.pdf"
+
+def matches(prefix: str, count: int) -> List[Dict[str, Any]]:
+    return [
+        {"id": f"{prefix}{i}", "chunk_index": i if prefix == "v" else 100 + i, "text": f"{prefix} chunk {i}", "score": 1.0 - i * 0.01}
+        for i in range(count)
+    ]
+
+class FakeVectorStore:
+    def __init__(self):
+        self.match_selector = MatchSelector(min_score=0.0, score_gap=1.0, mmr_lambda=1.0, duplicate_similarity=0.97, fetch_multiplier=2)
+        self.top_ks: List[int] = []
+        self.queries: List[str] = []
+
+    def search_relevant_matches_batch(self, queries: List[str], gemini_client: Any, document_url: str, top_k: int = 10):
+        self.top_ks.append(top_k)
+        self.queries.extend(queries)
+        return [matches("v", top_k) for _ in queries]
+
+class FakeLexicalIndex:
+    min_coverage = 0.85
+    min_margin = 1.5
+
+    def __init__(self, confident: bool = False):
+        self.confident = confident
+        self.top_ks: List[int] = []
+
+    def search(self, query: str, document_url: str, top_k: int) -> Tuple[List[Dict[str, Any]], bool]:
+        self.top_ks.append(top_k)
+        return matches("l", top_k), self.confident
+
+class FakeGeminiClient:
+    answer_model = "fake-model"
+
+    def __init__(self):
+        self.batch_fails = False
+        self.calls: List[List[str]] = []
+
+    def generate_answer(self, question: str, context_chunks: List[str]) -> str:
+        self.calls.append([question])
+        return f"single answer to {question}"
+
+    def generate_answers_batch(self, questions: List[str], context_chunks: List[str]) -> List[str]:
+        self.calls.append(list(questions))
+        if self.batch_fails:
+            raise Exception("Could not parse the batched answers")
+        return [f"batched answer to {question}" for question in questions]
+
+@pytest.fixture
+def make_answerer(monkeypatch):
+    def make(mode: str = "hybrid", lexical_index=None) -> QuestionAnswerer:
+        monkeypatch.setenv("RETRIEVAL_MODE", mode)
+        return QuestionAnswerer(FakeGeminiClient(), FakeVectorStore(), None, ContextAssembler(150, token_budget=8000), lexical_index)
+    return make
+
+@pytest.mark.parametrize("top_k, expected", [(None, 6), (3, 3)])
+def test_top_k_reaches_every_retriever_and_the_fusion(make_answerer, top_k, expected):
+    lexical_index = FakeLexicalIndex()
+    answerer = make_answerer("hybrid", lexical_index)
+
+    (results,) = answerer.search_relevant_chunks_batch(["What is covered?"], DOCUMENT_URL, top_k)
+
+    assert lexical_index.top_ks == [expected]
+    assert answerer.vector_store.top_ks == [expected]
+    assert len(results) == expected
+
+def test_top_k_applies_to_vector_only_retrieval(make_answerer):
+    answerer = make_answerer("vector", FakeLexicalIndex())
+
+    (results,) = answerer.search_relevant_chunks_batch(["What is covered?"], DOCUMENT_URL, top_k=2)
+
+    assert answerer.vector_store.top_ks == [2]
+    assert [match["id"] for match in results] == ["v0", "v1"]
+
+def test_confident_lexical_matches_skip_vector_search(make_answerer):
+    answerer = make_answerer("hybrid", FakeLexicalIndex(confident=True))
+
+    (results,) = answerer.search_relevant_chunks_batch(["Clause 3.1.2"], DOCUMENT_URL, top_k=4)
+
+    assert answerer.vector_store.queries == []
+    assert [match["id"] for match in results] == ["l0", "l1", "l2", "l3"]
+
+def chunks(*ids: int) -> List[Dict[str, Any]]:
+    return [{"id": f"c{i}", "chunk_index": i, "text": f"chunk {i} text", "score": 0.9} for i in ids]
+
+def test_questions_with_overlapping_chunks_share_a_group(make_answerer):
+    answerer = make_answerer()
+
+    groups = answerer.group_questions([chunks(1, 2, 3, 4), chunks(7, 8, 9), chunks(3, 4, 5, 6), chunks(1, 7, 8)])
+
+    # The last question overlaps the first group by 1/3, below the 0.5 minimum, and the second by 2/3
+    assert groups == [[0, 2], [1, 3]]
+
+def test_groups_are_capped_at_batch_max_questions(make_answerer, monkeypatch):
+    monkeypatch.setenv("ANSWER_BATCH_MAX_QUESTIONS", "2")
+    answerer = make_answerer()
+
+    assert answerer.group_questions([chunks(1, 2)] * 5) == [[0, 1], [2, 3], [4]]
+
+def test_groups_are_capped_at_batch_max_chunks(make_answerer, monkeypatch):
+    monkeypatch.setenv("ANSWER_BATCH_MAX_CHUNKS", "5")
+    answerer = make_answerer()
+
+    # Adding the second question would grow the union to six chunks
+    assert answerer.group_questions([chunks(1, 2, 3, 4), chunks(1, 2, 3, 5, 6), chunks(1, 2, 5)]) == [[0, 2], [1]]
+
+def test_questions_without_chunks_stay_alone(make_answerer):
+    answerer = make_answerer()
+
+    assert answerer.group_questions([None, chunks(1, 2), [], chunks(1, 2)]) == [[0], [1, 3], [2]]
+
+def test_batching_disabled_keeps_every_question_alone(make_answerer, monkeypatch):
+    monkeypatch.setenv("ANSWER_BATCH_MAX_QUESTIONS", "1")
+    answerer = make_answerer()
+
+    assert answerer.group_questions([chunks(1, 2)] * 3) == [[0], [1], [2]]
+
+def test_group_is_answered_in_one_call(make_answerer):
+    answerer = make_answerer()
+    questions = ["What is covered?", "What is the limit?"]
+
+    answers = answerer.answer_question_group(questions, DOCUMENT_URL, [chunks(1, 2), chunks(2, 3)])
+
+    assert answers == ["batched answer to What is covered?", "batched answer to What is the limit?"]
+    assert answerer.gemini_client.calls == [questions]
+
+def test_unparseable_batch_falls_back_to_separate_answers(make_answerer, tmp_path):
+    answerer = make_answerer()
+    answerer.answer_cache = AnswerCache(str(tmp_path / "answers.db"))
+    answerer.gemini_client.batch_fails = True
+    questions = ["What is covered?", "What is the limit?"]
+
+    answers = answerer.answer_question_group(questions, DOCUMENT_URL, [chunks(1, 2), chunks(2, 3)], "content")
+
+    assert answers == ["single answer to What is covered?", "single answer to What is the limit?"]
+    assert answerer.gemini_client.calls == [questions, ["What is covered?"], ["What is the limit?"]]
+    assert answerer.get_cached_answers("content", questions) == {0: answers[0], 1: answers[1]}
+    answerer.answer_cache.close()
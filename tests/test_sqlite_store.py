@@ -0,0 +1,68 @@
+import sqlite3
+import pytest
+from sqlite_store import MAX_IN_PARAMETERS, SQLiteLRUCache
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SQLiteLRUCache(str(tmp_path / "cache.db"), "answers", "answer", "TEXT", max_bytes=100, ttl_seconds=0)
+    yield cache
+    cache.close()
+
+def test_byte_total_follows_inserts_replacements_and_clears(cache):
+    cache.put_many([("a", 40, "x"), ("b", 30, "y")])
+    assert cache.total_bytes() == 70
+
+    cache.put_many([("a", 10, "z")])
+    assert cache.total_bytes() == 40
+    assert cache.get_many(["a", "b", "missing"]) == {"a": "z", "b": "y"}
+
+    cache.clear()
+    assert cache.total_bytes() == 0
+
+def test_existing_tables_are_summed_once(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE answers (cache_key TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+        "created_at REAL NOT NULL, accessed_at REAL NOT NULL, answer TEXT NOT NULL)"
+    )
+    conn.executemany("INSERT INTO answers VALUES (?, ?, 0, 0, ?)", [("a", 25, "x"), ("b", 35, "y")])
+    conn.commit()
+    conn.close()
+
+    for _ in range(2):
+        cache = SQLiteLRUCache(db_path, "answers", "answer", "TEXT", max_bytes=100, ttl_seconds=0)
+        assert cache.total_bytes() == 60
+        cache.close()
+
+def test_eviction_drops_least_recently_read_entries(cache):
+    cache.put_many([("a", 40, "x"), ("b", 40, "y")])
+    cache.get_many(["a"])
+    cache.put_many([("c", 40, "z")])
+
+    assert cache.get_many(["a", "b", "c"]) == {"a": "x", "c": "z"}
+    assert cache.total_bytes() == 80
+
+def test_reads_defer_their_accessed_at_updates(cache, tmp_path):
+    cache.put_many([("a", 10, "x")])
+    reader = sqlite3.connect(str(tmp_path / "cache.db"))
+    (written,) = reader.execute("SELECT accessed_at FROM answers WHERE cache_key = 'a'").fetchone()
+
+    cache.get_many(["a"])
+    assert reader.execute("SELECT accessed_at FROM answers WHERE cache_key = 'a'").fetchone() == (written,)
+
+    cache.put_many([("b", 10, "y")])
+    assert reader.execute("SELECT accessed_at FROM answers WHERE cache_key = 'a'").fetchone()[0] >= written
+    assert cache._touched == {}
+    reader.close()
+
+def test_lookups_span_several_in_batches(tmp_path):
+    cache = SQLiteLRUCache(str(tmp_path / "cache.db"), "answers", "answer", "TEXT", max_bytes=10 ** 6, ttl_seconds=0)
+    keys = [f"key-{i}" for i in range(MAX_IN_PARAMETERS * 2 + 7)]
+    cache.put_many([(key, 1, key.upper()) for key in keys])
+
+    found = cache.get_many(keys + ["missing"])
+
+    assert len(found) == len(keys)
+    assert found["key-1006"] == "KEY-1006"
+    cache.close()
@@ -0,0 +1,100 @@
+import random
+import re
+from typing import List
+import pytest
+from text_chunker import TextChunker
+
+def reference_chunks(text: str, chunk_size: int, overlap_size: int) -> List[str]:
+    """The original list-of-words chunker the offset-based one must reproduce"""
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[^\w\s\.\,\;\:\!\?\-\(\)\[\]\{\}\'\"\/]', ' ', text)
+    text = re.sub(r'\.{3,}', '...', text)
+    text = re.sub(r'\-{2,}', '--', text)
+    words = text.strip().split()
+    if len(words) <= chunk_size:
+        return [' '.join(words)]
+    chunks = []
+    start = 0
+    while start < len(words):
+        end = min(start + chunk_size, len(words))
+        chunks.append(' '.join(words[start:end]))
+        if end >= len(words):
+            break
+        start += chunk_size - overlap_size
+    return chunks
+
+def noisy_text(seed: int, word_count: int) -> str:
+    """Words separated by the whitespace, symbols and punctuation runs found in extracted PDFs"""
+    rng = random.Random(seed)
+    separators = [" ", " ", " ", "  ", "\n", "\t", " • ", " @ ", "#", " \n\n "]
+    words = []
+    for i in range(word_count):
+        word = rng.choice(["clause", "3.1.2", "pre-existing", "and/or", "policy", "(a)", "days", "waiting", "Sum"])
+        if rng.random() < 0.1:
+            word += rng.choice([".", "....", "---", "!", "?", ","])
+        words.append(word + rng.choice(separators))
+    return "".join(words)
+
+def paged_text(page_count: int, words_per_page: int) -> List[str]:
+    return [
+        " ".join(f"p{page}w{word}{'.' if word % 7 == 6 else ''}" for word in range(words_per_page))
+        for page in range(1, page_count + 1)
+    ]
+
+@pytest.mark.parametrize("chunk_size, overlap_size", [(800, 150), (50, 10), (7, 3), (5, 4), (10, 0)])
+@pytest.mark.parametrize("seed", range(3))
+def test_word_chunks_match_reference(chunk_size, overlap_size, seed):
+    text = noisy_text(seed, 1500)
+    chunker = TextChunker(chunk_size=chunk_size, overlap_size=overlap_size, size_unit="words", sentence_aware=False)
+    assert chunker.chunk_text(text) == reference_chunks(text, chunk_size, overlap_size)
+
+def test_short_text_is_one_chunk():
+    chunker = TextChunker(chunk_size=50, overlap_size=10, size_unit="words", sentence_aware=False)
+    assert chunker.chunk_text("  A short\n\npolicy   note.  ") == ["A short policy note."]
+    assert chunker.chunk_text("   ") == []
+
+@pytest.mark.parametrize("size_unit, sentence_aware", [("words", False), ("words", True), ("tokens", False), ("tokens", True)])
+def test_spans_are_offsets_into_one_buffer(size_unit, sentence_aware):
+    text = noisy_text(7, 2000)
+    chunker = TextChunker(chunk_size=40, overlap_size=8, size_unit=size_unit, sentence_aware=sentence_aware)
+    buffer = chunker._clean_text(text)
+    spans = chunker.chunk_spans(text)
+
+    assert spans[0].start == 0
+    assert spans[-1].end == len(buffer)
+    for previous, chunk in zip(spans, spans[1:]):
+        assert previous.start < chunk.start <= previous.end + 1
+    for chunk in spans:
+        assert chunk.text == buffer[chunk.start:chunk.end]
+        assert chunk.text == chunk.text.strip()
+
+@pytest.mark.parametrize("size_unit, sentence_aware", [("words", False), ("words", True), ("tokens", False), ("tokens", True)])
+def test_incremental_feed_matches_whole_text(size_unit, sentence_aware):
+    pages = paged_text(12, 37)
+    chunker = TextChunker(chunk_size=25, overlap_size=5, size_unit=size_unit, sentence_aware=sentence_aware)
+
+    incremental = chunker.incremental()
+    chunks = []
+    for page in pages:
+        chunks.extend(incremental.feed(page))
+    chunks.extend(incremental.finish())
+
+    assert [chunk.text for chunk in chunks] == chunker.chunk_text("\n".join(pages))
+    assert incremental.chunk_count == len(chunks)
+
+def test_incremental_chunks_report_their_pages():
+    pages = paged_text(9, 30)
+    chunker = TextChunker(chunk_size=20, overlap_size=4, size_unit="words", sentence_aware=False)
+
+    incremental = chunker.incremental()
+    chunks = []
+    for number, page in enumerate(pages, start=1):
+        chunks.extend(incremental.feed(page, page_number=number))
+    chunks.extend(incremental.finish())
+
+    for chunk in chunks:
+        words = chunk.text.split()
+        assert chunk.metadata() == {
+            "page_start": int(words[0][1:].split("w")[0]),
+            "page_end": int(words[-1][1:].split("w")[0])
+        }
@@ -0,0 +1,58 @@
+from typing import List
+import pytest
+from embedding_cache import InMemoryEmbeddingCache
+from match_selector import MatchSelector
+from vector_store import LocalVectorStore, VectorStore
+
+DOCUMENT_URL = "https://example.com/policy.pdf"
+
+def store_document(vector_store: LocalVectorStore, document_url: str, texts: List[str]):
+    embeddings = [[float(i + 1), 1.0, 0.0] for i in range(len(texts))]
+    vector_store.begin_document(document_url)
+    vector_store.upsert_embedded_chunks(document_url, texts, embeddings)
+    vector_store.finish_document(document_url)
+
+@pytest.fixture
+def vector_store(tmp_path):
+    # 3-float rows spill above 4 rows (48 bytes) and only one document stays in memory
+    store = LocalVectorStore(
+        embedding_cache=InMemoryEmbeddingCache(),
+        spill_dir=str(tmp_path / "local_index"),
+        spill_bytes=48,
+        max_documents=1
+    )
+    store.match_selector = MatchSelector(min_score=0.0, score_gap=1.0, mmr_lambda=1.0, duplicate_similarity=1.1, fetch_multiplier=1)
+    yield store
+    store.close()
+
+def test_vector_store_is_abstract():
+    with pytest.raises(TypeError):
+        VectorStore(embedding_cache=InMemoryEmbeddingCache())
+
+def test_spilled_document_reloads_after_eviction(vector_store):
+    old_texts = [f"old chunk {i}" for i in range(8)]
+    store_document(vector_store, DOCUMENT_URL, old_texts)
+    store_document(vector_store, "https://example.com/other.pdf", ["other"])
+
+    assert vector_store.get_document_chunks(DOCUMENT_URL) == old_texts
+
+def test_reingest_in_memory_drops_old_spill_files(vector_store):
+    store_document(vector_store, DOCUMENT_URL, [f"old chunk {i}" for i in range(8)])
+    new_texts = ["new chunk 0", "new chunk 1"]
+    store_document(vector_store, DOCUMENT_URL, new_texts)
+    assert vector_store.get_document_chunks(DOCUMENT_URL) == new_texts
+
+    # Evict the in-memory copy; the stale spilled version must not come back
+    store_document(vector_store, "https://example.com/other.pdf", ["other"])
+
+    assert vector_store.get_document_chunks(DOCUMENT_URL) == []
+    assert not vector_store.has_document(DOCUMENT_URL)
+
+def test_search_returns_matches_in_chunk_order_ids(vector_store):
+    texts = ["first", "second", "third"]
+    store_document(vector_store, DOCUMENT_URL, texts)
+
+    (matches,) = vector_store._search_by_embeddings([[3.0, 1.0, 0.0]], DOCUMENT_URL, top_k=2)
+
+    assert [match["text"] for match in matches] == ["third", "second"]
+    assert matches[0]["id"] == vector_store._generate_chunk_id("third", vector_store._generate_document_hash(DOCUMENT_URL), 2)
@@ -1,22 +1,92 @@
+import os
 import re
-from typing import List
+import bisect
+from typing import Any, Dict, List, Optional, Tuple
 import logging
+from metrics import span, CHUNKS_CREATED
 
 logger = logging.getLogger(__name__)
 
+# Runs of whitespace and characters that might interfere with processing, except
+# the single spaces already separating words, which are left in place
+_ALLOWED = r'\w\.\,\;\:\!\?\-\(\)\[\]\{\}\'\"\/'
+_SEPARATOR_PATTERN = re.compile(rf'(?: ?[^{_ALLOWED} ]| {{2,}})[^{_ALLOWED}]*')
+
+# Excessive punctuation runs, shortened only when the cheap substring check finds one
+_PUNCTUATION_RUN_PATTERN = re.compile(r'\.{3,}|\-{2,}')
+
+# Sentence ends followed by the single space that separates words in the cleaned buffer
+_SENTENCE_ENDS = (". ", "! ", "? ")
+
+class TextChunk:
+    """
+    One chunk as a (start, end) span of a cleaned text buffer
+    
+    The chunk string is only sliced out of the buffer when text is first
+    read, so chunks that are never used cost no copy.
+    """
+    
+    __slots__ = ("_buffer", "start", "end", "page_start", "page_end", "_text")
+    
+    def __init__(self, buffer: str, start: int, end: int, page_start: Optional[int] = None, page_end: Optional[int] = None):
+        self._buffer = buffer
+        self.start = start
+        self.end = end
+        self.page_start = page_start
+        self.page_end = page_end
+        self._text: Optional[str] = None
+    
+    @property
+    def text(self) -> str:
+        """The chunk string"""
+        if self._text is None:
+            self._text = self._buffer[self.start:self.end]
+            self._buffer = None
+        return self._text
+    
+    def metadata(self) -> Dict[str, Any]:
+        """Page range of the chunk (1-based, inclusive) for vector metadata"""
+        if self.page_start is None:
+            return {}
+        return {"page_start": self.page_start, "page_end": self.page_end}
+
+
 class TextChunker:
     """Handles text chunking with overlapping segments"""
     
-    def __init__(self, chunk_size: int = 800, overlap_size: int = 150):
+    def __init__(
+        self,
+        chunk_size: int = 800,
+        overlap_size: int = 150,
+        size_unit: Optional[str] = None,
+        sentence_aware: Optional[bool] = None
+    ):
         """
         Initialize text chunker with optimized settings for speed and accuracy
         
         Args:
             chunk_size: Target number of words per chunk (increased for fewer chunks)
             overlap_size: Number of words to overlap between chunks
+            size_unit: "words", or "tokens" to size chunks by estimated tokens (CHUNK_SIZE_UNIT)
+            sentence_aware: End chunks at the last sentence boundary in their second half (CHUNK_SENTENCE_AWARE)
         """
         self.chunk_size = chunk_size
         self.overlap_size = overlap_size
+        self.size_unit = (size_unit or os.getenv("CHUNK_SIZE_UNIT", "words")).lower()
+        if self.size_unit not in ("words", "tokens"):
+            raise ValueError(f"Unsupported chunk size unit: {self.size_unit}")
+        if sentence_aware is None:
+            sentence_aware = os.getenv("CHUNK_SENTENCE_AWARE", "false").lower() in ("1", "true", "yes")
+        self.sentence_aware = sentence_aware
+        
+        # Skip a whole window (or one step) of words in the cleaned buffer with a single match
+        self._window_pattern = re.compile(r'(?:[^ ]+ ){%d}' % chunk_size)
+        self._step_pattern = re.compile(r'(?:[^ ]+ ){%d}' % max(chunk_size - overlap_size, 1))
+    
+    @property
+    def mode(self) -> str:
+        """Sizing mode, part of the content key since it changes the chunks"""
+        return f"{self.size_unit}{'+sentences' if self.sentence_aware else ''}"
     
     def chunk_text(self, text: str) -> List[str]:
         """
@@ -24,59 +94,177 @@ class TextChunker:
         
         Args:
             text: Input text to chunk
-            
+        
         Returns:
             List of text chunks
         """
         try:
-            # Clean and normalize text
-            cleaned_text = self._clean_text(text)
-            
-            # Split into words
-            words = cleaned_text.split()
-            
-            if len(words) <= self.chunk_size:
-                # If text is smaller than chunk size, return as single chunk
-                return [cleaned_text]
-            
-            chunks = []
-            start_idx = 0
-            
-            while start_idx < len(words):
-                # Calculate end index for current chunk
-                end_idx = min(start_idx + self.chunk_size, len(words))
-                
-                # Extract chunk words
-                chunk_words = words[start_idx:end_idx]
-                chunk_text = ' '.join(chunk_words)
-                
-                if chunk_text.strip():
-                    chunks.append(chunk_text)
-                
-                # If we've reached the end, break
-                if end_idx >= len(words):
-                    break
-                
-                # Move start index forward by (chunk_size - overlap_size)
-                start_idx += (self.chunk_size - self.overlap_size)
-            
-            logger.info(f"Created {len(chunks)} chunks from {len(words)} words")
+            chunks = [chunk.text for chunk in self.chunk_spans(text)]
+            logger.info(f"Created {len(chunks)} chunks")
             return chunks
-            
+        
         except Exception as e:
             logger.error(f"Error chunking text: {str(e)}")
             raise Exception(f"Failed to chunk text: {str(e)}")
     
+    def chunk_spans(self, text: str) -> List[TextChunk]:
+        """Split text into overlapping chunk spans of its cleaned buffer"""
+        chunker = self.incremental()
+        return chunker.feed(text) + chunker.finish()
+    
+    def incremental(self) -> "IncrementalChunker":
+        """Create a chunker that accepts text piece by piece (e.g. page by page)"""
+        return IncrementalChunker(self)
+    
     def _clean_text(self, text: str) -> str:
-        """Clean and normalize text"""
-        # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Remove special characters that might interfere with processing
-        text = re.sub(r'[^\w\s\.\,\;\:\!\?\-\(\)\[\]\{\}\'\"\/]', ' ', text)
+        """Clean and normalize text, leaving words separated by single spaces"""
+        text = _SEPARATOR_PATTERN.sub(' ', text)
         
         # Remove excessive punctuation
-        text = re.sub(r'\.{3,}', '...', text)
-        text = re.sub(r'\-{2,}', '--', text)
+        if '...' in text or '--' in text:
+            text = _PUNCTUATION_RUN_PATTERN.sub(lambda match: match.group()[:3 if match.group()[0] == '.' else 2], text)
         
         return text.strip()
+    
+    def _window(self, buffer: str, start: int, final: bool) -> Optional[Tuple[int, Optional[int]]]:
+        """
+        Place the chunk that starts at a word offset of the cleaned buffer
+        
+        Args:
+            buffer: Cleaned text with words separated by single spaces
+            start: Offset of the chunk's first word
+            final: Whether no more text will be appended to the buffer
+        
+        Returns:
+            (end, next_start) of the chunk, next_start being None for the last
+            chunk, or None if the window needs text that has not arrived yet
+        """
+        if self.size_unit == "tokens":
+            # About four characters per token, matching the context budget estimate
+            limit = start + self.chunk_size * 4
+            end = buffer.rfind(' ', start, limit + 1) if limit < len(buffer) else -1
+            if end <= start and limit < len(buffer):
+                # A single word longer than the whole window
+                end = buffer.find(' ', limit)
+        else:
+            match = self._window_pattern.match(buffer, start)
+            end = match.end() - 1 if match else -1
+        
+        if end <= start:
+            return (len(buffer), None) if final else None
+        
+        if self.sentence_aware:
+            boundary = max(buffer.rfind(ending, start + (end - start) // 2, end + 1) for ending in _SENTENCE_ENDS)
+            if boundary > start:
+                end = boundary + 1
+        
+        if self.size_unit == "words" and not self.sentence_aware:
+            next_start = self._step_pattern.match(buffer, start).end()
+        elif self.size_unit == "tokens":
+            next_start = buffer.find(' ', max(end - self.overlap_size * 4, start + 1) - 1) + 1
+        else:
+            position = end
+            for _ in range(self.overlap_size):
+                position = buffer.rfind(' ', start, position)
+                if position <= start:
+                    break
+            next_start = position + 1
+        
+        # Always move forward by at least one word
+        if next_start <= start or next_start > end + 1:
+            next_start = buffer.find(' ', start, end) + 1 or end + 1
+        return end, next_start
+
+
+class IncrementalChunker:
+    """
+    Produces the same overlapping windows as TextChunker.chunk_text, but
+    from text fed in pieces, emitting each chunk as soon as its words arrive
+    
+    Cleaned pieces are appended to one buffer and chunks are emitted as
+    spans of it; the consumed prefix is trimmed once per piece. The page of
+    every piece is tracked so chunks report the pages they cover.
+    """
+    
+    def __init__(self, text_chunker: TextChunker):
+        self.text_chunker = text_chunker
+        self._buffer = ""
+        self._position = 0
+        self._base = 0
+        self._page_offsets: List[int] = []
+        self._page_numbers: List[int] = []
+        self._pages_fed = 0
+        self._chunk_count = 0
+    
+    def feed(self, text: str, page_number: Optional[int] = None) -> List[TextChunk]:
+        """
+        Add a piece of text and return any chunks that are now complete
+        
+        A window is only emitted once a word beyond it has arrived, so the
+        final window is left for finish() exactly as chunk_text would cut it.
+        
+        Args:
+            text: Text of the piece
+            page_number: 1-based page of the piece (defaults to the next page)
+        """
+        self._pages_fed += 1
+        page_number = page_number or self._pages_fed
+        
+        with span("chunk"):
+            cleaned = self.text_chunker._clean_text(text)
+            if cleaned:
+                pending = self._buffer[self._position:]
+                self._base += self._position
+                self._position = 0
+                self._buffer = f"{pending} {cleaned}" if pending else cleaned
+                self._page_offsets.append(self._base + len(self._buffer) - len(cleaned))
+                self._page_numbers.append(page_number)
+                self._drop_passed_pages()
+            return self._emit(final=False)
+    
+    def finish(self) -> List[TextChunk]:
+        """Return the final chunk once all text has been fed"""
+        with span("chunk"):
+            chunks = self._emit(final=True)
+        self._buffer = ""
+        self._position = 0
+        return chunks
+    
+    def _emit(self, final: bool) -> List[TextChunk]:
+        chunks = []
+        while self._position < len(self._buffer):
+            window = self.text_chunker._window(self._buffer, self._position, final)
+            if window is None:
+                break
+            end, next_start = window
+            chunks.append(TextChunk(
+                self._buffer,
+                self._position,
+                end,
+                self._page_at(self._position),
+                self._page_at(end - 1)
+            ))
+            if next_start is None:
+                self._position = len(self._buffer)
+                break
+            self._position = next_start
+        self._chunk_count += len(chunks)
+        CHUNKS_CREATED.inc(len(chunks))
+        return chunks
+    
+    def _page_at(self, offset: int) -> Optional[int]:
+        """Page number holding a buffer offset"""
+        index = bisect.bisect_right(self._page_offsets, self._base + offset) - 1
+        return self._page_numbers[index] if index >= 0 else None
+    
+    def _drop_passed_pages(self):
+        """Forget pages that end before the unconsumed part of the buffer"""
+        passed = bisect.bisect_right(self._page_offsets, self._base) - 1
+        if passed > 0:
+            del self._page_offsets[:passed]
+            del self._page_numbers[:passed]
+    
+    @property
+    def chunk_count(self) -> int:
+        """Number of chunks emitted so far"""
+        return self._chunk_count
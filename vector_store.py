@@ -0,0 +1,354 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import concurrent.futures
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import numpy as np
+from gemini_client import GeminiClient
+from embedding_cache import EmbeddingCache, create_embedding_cache
+from match_selector import MatchSelector
+from metrics import span, bind_context
+
+logger = logging.getLogger(__name__)
+
+class VectorStore(ABC):
+    """Base class for per-document chunk stores searched by embedding similarity"""
+    
+    def __init__(self, embedding_cache: Optional[EmbeddingCache] = None, match_selector: Optional[MatchSelector] = None):
+        # Persistent cache for embeddings to avoid redundant API calls
+        self.embedding_cache = embedding_cache or create_embedding_cache()
+        
+        # Thresholds and diversity selection applied to the candidates of every search
+        self.match_selector = match_selector or MatchSelector()
+        
+        # Shared pool for issuing the per-question queries of a batch concurrently
+        self._search_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=int(os.getenv("SEARCH_CONCURRENCY", "8")),
+            thread_name_prefix="search"
+        )
+    
+    def warm_up(self):
+        """Open connections or load state ahead of the first request"""
+    
+    def has_document(self, document_url: str) -> bool:
+        """
+        Whether this store still holds the chunks of a previously ingested document
+        
+        Stores that persist across restarts trust the ingestion registry and
+        return True without a round trip.
+        """
+        return True
+    
+    def get_document_chunks(self, document_url: str) -> List[str]:
+        """Texts of a stored document's chunks in chunk order, empty if the store does not keep them"""
+        return []
+    
+    def _generate_document_hash(self, document_url: str) -> str:
+        """Generate a unique hash for a document URL to use as namespace"""
+        return hashlib.md5(document_url.encode()).hexdigest()[:16]
+    
+    def _generate_chunk_id(self, text: str, document_hash: str, chunk_index: int) -> str:
+        """Generate a unique ID for a text chunk within a document namespace"""
+        chunk_hash = hashlib.md5(text.encode()).hexdigest()[:8]
+        return f"{document_hash}_{chunk_index:04d}_{chunk_hash}"
+    
+    def _generate_embeddings_batch(self, chunks: List[str], gemini_client: GeminiClient) -> List[List[float]]:
+        """Generate embeddings for multiple chunks, batching every cache miss into one call"""
+        return self.embedding_cache.get_or_compute_many(
+            gemini_client.embedding_model, chunks, gemini_client.generate_embeddings_batch
+        )
+    
+    def _generate_query_embeddings_batch(self, queries: List[str], gemini_client: GeminiClient) -> List[List[float]]:
+        """Generate embeddings for several queries with one batched call for the cache misses"""
+        return self._generate_embeddings_batch(queries, gemini_client)
+    
+    @abstractmethod
+    def _search_by_embedding(self, query_embedding: List[float], document_url: str, top_k: int) -> List[Dict[str, Any]]:
+        """Return up to top_k selected matches (id, chunk_index, text, score) of one document for a precomputed query embedding"""
+    
+    def _search_by_embeddings(self, query_embeddings: List[List[float]], document_url: str, top_k: int) -> List[List[Dict[str, Any]]]:
+        """Run the searches for several query embeddings concurrently, preserving order"""
+        futures = [
+            self._search_pool.submit(bind_context(self._search_by_embedding, query_embedding, document_url, top_k))
+            for query_embedding in query_embeddings
+        ]
+        return [future.result() for future in futures]
+    
+    def embed_chunks(self, chunks: List[str], gemini_client: GeminiClient) -> List[List[float]]:
+        """Embed a batch of chunks through the shared embedding cache"""
+        return self._generate_embeddings_batch(chunks, gemini_client)
+    
+    @abstractmethod
+    def begin_document(self, document_url: str):
+        """Start (re-)storing a document, discarding chunks from a previous ingestion"""
+    
+    @abstractmethod
+    def upsert_embedded_chunks(
+        self,
+        document_url: str,
+        chunks: List[str],
+        embeddings: List[List[float]],
+        start_index: int = 0,
+        metadata: Optional[List[Dict[str, Any]]] = None
+    ):
+        """
+        Store a batch of already-embedded chunks for a document begun with begin_document
+        
+        Args:
+            document_url: Source document URL for namespace isolation
+            chunks: Chunk texts of this batch
+            embeddings: Embedding for each chunk
+            start_index: Position of the first chunk of this batch within the document
+            metadata: Extra metadata per chunk (e.g. page range), kept where the store supports it
+        """
+    
+    def finish_document(self, document_url: str):
+        """Make a document stored through upsert_embedded_chunks searchable"""
+    
+    def abort_document(self, document_url: str):
+        """Discard the state of a document whose ingestion failed after begin_document"""
+    
+    def search_relevant_matches_batch(
+        self,
+        queries: List[str],
+        gemini_client: GeminiClient,
+        document_url: str,
+        top_k: int = 10
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for relevant chunks for several queries against one document
+        
+        All queries are embedded in a single batched call and their vector
+        searches are issued together.
+        
+        Args:
+            queries: Query texts to search for
+            gemini_client: Gemini client for generating query embeddings
+            document_url: Source document URL for namespace isolation
+            top_k: Number of top results to return per query
+        
+        Returns:
+            Matches with id, chunk_index, text and score for each query, in query order
+        """
+        if not queries:
+            return []
+        try:
+            query_embeddings = self._generate_query_embeddings_batch(queries, gemini_client)
+        except Exception as e:
+            logger.error(f"Error embedding queries: {str(e)}")
+            raise Exception(f"Failed to search for relevant chunks: {str(e)}")
+        return self._search_by_embeddings(query_embeddings, document_url, top_k)
+    
+    @abstractmethod
+    def clear_document_chunks(self, document_url: str):
+        """Clear chunks for a specific document"""
+    
+    @abstractmethod
+    def clear_index(self):
+        """Clear all stored chunks"""
+    
+    def close(self):
+        """Release the embedding cache and any local state held by the store"""
+        self.embedding_cache.close()
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process NumPy index holding one contiguous float32 matrix per document
+    
+    Rows are L2-normalised at store time so cosine top-k is a single
+    matrix-vector product. Matrices above the spill threshold are written to
+    .npy files and memory-mapped, which also lets a restarted worker pick them
+    up again.
+    """
+    
+    def __init__(
+        self,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        spill_dir: Optional[str] = None,
+        spill_bytes: Optional[int] = None,
+        max_documents: Optional[int] = None
+    ):
+        super().__init__(embedding_cache)
+        cache_dir = os.getenv("CACHE_DIR", ".cache")
+        self.spill_dir = spill_dir or os.getenv("LOCAL_INDEX_DIR", os.path.join(cache_dir, "local_index"))
+        # Spill threshold in matrix bytes; -1 keeps everything in memory
+        self.spill_bytes = spill_bytes if spill_bytes is not None else int(os.getenv("LOCAL_INDEX_SPILL_BYTES", str(8 * 1024 * 1024)))
+        self.max_documents = max_documents or int(os.getenv("LOCAL_INDEX_MAX_DOCUMENTS", "64"))
+        
+        self._documents: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Documents being stored batch by batch, made searchable by finish_document
+        self._pending: Dict[str, Dict[str, List]] = {}
+        self._lock = threading.Lock()
+        logger.info(f"Local vector store initialized (spill dir: {self.spill_dir})")
+    
+    def _spill_paths(self, document_hash: str):
+        return (
+            os.path.join(self.spill_dir, f"{document_hash}.npy"),
+            os.path.join(self.spill_dir, f"{document_hash}.json")
+        )
+    
+    def _get_document(self, document_hash: str) -> Optional[Dict[str, Any]]:
+        """Return a document's matrix and texts, reloading a spilled matrix if needed"""
+        with self._lock:
+            document = self._documents.get(document_hash)
+            if document is not None:
+                self._documents.move_to_end(document_hash)
+                return document
+        
+        matrix_path, texts_path = self._spill_paths(document_hash)
+        if not (os.path.exists(matrix_path) and os.path.exists(texts_path)):
+            return None
+        
+        with open(texts_path, "r") as f:
+            texts = json.load(f)
+        document = {"matrix": np.load(matrix_path, mmap_mode="r"), "texts": texts}
+        self._put_document(document_hash, document)
+        return document
+    
+    def _put_document(self, document_hash: str, document: Dict[str, Any]):
+        with self._lock:
+            self._documents[document_hash] = document
+            self._documents.move_to_end(document_hash)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+    
+    def has_document(self, document_url: str) -> bool:
+        return self._get_document(self._generate_document_hash(document_url)) is not None
+    
+    def get_document_chunks(self, document_url: str) -> List[str]:
+        document = self._get_document(self._generate_document_hash(document_url))
+        return list(document["texts"]) if document is not None else []
+    
+    def begin_document(self, document_url: str):
+        # A spill file left from an earlier version would be reloaded once the new one leaves the LRU
+        self.clear_document_chunks(document_url)
+        with self._lock:
+            self._pending[self._generate_document_hash(document_url)] = {"embeddings": [], "texts": []}
+    
+    def upsert_embedded_chunks(
+        self,
+        document_url: str,
+        chunks: List[str],
+        embeddings: List[List[float]],
+        start_index: int = 0,
+        metadata: Optional[List[Dict[str, Any]]] = None
+    ):
+        document_hash = self._generate_document_hash(document_url)
+        with self._lock:
+            pending = self._pending[document_hash]
+            if start_index != len(pending["texts"]):
+                raise ValueError(f"Out-of-order batch at chunk {start_index} for document {document_hash}")
+            pending["embeddings"].extend(embeddings)
+            pending["texts"].extend(chunks)
+    
+    def abort_document(self, document_url: str):
+        with self._lock:
+            self._pending.pop(self._generate_document_hash(document_url), None)
+    
+    def finish_document(self, document_url: str):
+        try:
+            document_hash = self._generate_document_hash(document_url)
+            with self._lock:
+                pending = self._pending.pop(document_hash)
+            
+            matrix = np.asarray(pending["embeddings"], dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.maximum(norms, 1e-12)
+            texts = pending["texts"]
+            
+            if self.spill_bytes >= 0 and matrix.nbytes > self.spill_bytes:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                matrix_path, texts_path = self._spill_paths(document_hash)
+                np.save(matrix_path, matrix)
+                with open(texts_path, "w") as f:
+                    json.dump(texts, f)
+                matrix = np.load(matrix_path, mmap_mode="r")
+                logger.info(f"Spilled {len(texts)} vectors to memory-mapped file: {matrix_path}")
+            
+            self._put_document(document_hash, {"matrix": matrix, "texts": texts})
+            logger.info(f"Stored {len(texts)} chunks in local index for document: {document_hash}")
+        
+        except Exception as e:
+            logger.error(f"Error storing chunks in local index: {str(e)}")
+            raise Exception(f"Failed to store chunks: {str(e)}")
+    
+    def _search_by_embedding(self, query_embedding: List[float], document_url: str, top_k: int) -> List[Dict[str, Any]]:
+        return self._search_by_embeddings([query_embedding], document_url, top_k)[0]
+    
+    def _search_by_embeddings(self, query_embeddings: List[List[float]], document_url: str, top_k: int) -> List[List[Dict[str, Any]]]:
+        try:
+            document_hash = self._generate_document_hash(document_url)
+            document = self._get_document(document_hash)
+            if document is None:
+                logger.warning(f"No local index found for document {document_hash}")
+                return [[] for _ in query_embeddings]
+            
+            with span("query"):
+                query_matrix = np.asarray(query_embeddings, dtype=np.float32)
+                query_matrix /= np.maximum(np.linalg.norm(query_matrix, axis=1, keepdims=True), 1e-12)
+                
+                # One (queries x chunks) product scores every query at once
+                scores = query_matrix @ np.asarray(document["matrix"]).T
+                k = min(self.match_selector.fetch_k(top_k), scores.shape[1])
+                if k == 0:
+                    return [[] for _ in query_embeddings]
+                
+                results = []
+                for row in scores:
+                    top_indices = np.argpartition(-row, k - 1)[:k]
+                    top_indices = top_indices[np.argsort(-row[top_indices])]
+                    # Rows are stored in chunk order, so the row is the chunk index
+                    candidates = [
+                        {
+                            "id": self._generate_chunk_id(document["texts"][i], document_hash, int(i)),
+                            "chunk_index": int(i),
+                            "text": document["texts"][i],
+                            "score": float(row[i]),
+                            "values": document["matrix"][i]
+                        }
+                        for i in top_indices
+                    ]
+                    results.append(self.match_selector.select(candidates, top_k))
+            
+            logger.info(f"Searched local index for {len(results)} queries in document {document_hash}")
+            return results
+        
+        except Exception as e:
+            logger.error(f"Error searching local index: {str(e)}")
+            raise Exception(f"Failed to search for relevant chunks: {str(e)}")
+    
+    def clear_document_chunks(self, document_url: str):
+        document_hash = self._generate_document_hash(document_url)
+        with self._lock:
+            self._documents.pop(document_hash, None)
+        for path in self._spill_paths(document_hash):
+            if os.path.exists(path):
+                os.unlink(path)
+    
+    def clear_index(self):
+        with self._lock:
+            document_hashes = list(self._documents)
+            self._documents.clear()
+        if os.path.isdir(self.spill_dir):
+            for name in os.listdir(self.spill_dir):
+                if name.endswith((".npy", ".json")):
+                    os.unlink(os.path.join(self.spill_dir, name))
+        self.embedding_cache.clear()
+        logger.info(f"Cleared {len(document_hashes)} documents from local index")
+
+def create_vector_store(embedding_cache: Optional[EmbeddingCache] = None) -> VectorStore:
+    """Build the vector store selected by VECTOR_STORE (pinecone or local)"""
+    backend = os.getenv("VECTOR_STORE", "pinecone").lower()
+    
+    if backend == "local":
+        return LocalVectorStore(embedding_cache)
+    elif backend == "pinecone":
+        # Imported lazily so local deployments do not need the Pinecone SDK
+        from pinecone_client import PineconeClient
+        return PineconeClient(embedding_cache)
+    else:
+        raise ValueError(f"Unsupported vector store backend: {backend}")